@@ -0,0 +1,301 @@
+"""
+音频文件索引：song_id -> 已解析的本地文件（路径、大小、修改时间、MIME 类型）
+
+- 启动后在后台线程校验一次：先逐条解析库中 audio_path 的几种写法；解析不到的，再到 AUDIO_ROOT
+  下按文件名（库中路径的最后一段）或 track_id（文件名格式 流派-track_id.mp3）找，
+  只采用在根目录下唯一的文件名/track_id，不同目录下的同名文件不会互相顶替
+- 开启 AUDIO_RECONCILE_DB 时与 enhanced_song_features.audio_path 对账：只有库中路径已失效、
+  按唯一文件名找回的才回写新路径；库中路径仍可用的从不改写，找不到文件的只统计不清空
+- 校验完成后音频接口与推荐结果的音频状态都直接查索引；命中的文件每次请求只做一次 os.stat，
+  发现被替换或删除时更新/重新解析
+- 校验完成前（或歌曲被编辑后）按需解析单首歌曲：同样先解析库中路径，再查上次扫描得到的唯一文件名/track_id
+  （未回写库时找回的新路径只在索引中，编辑歌曲后不会因此变成无音频）；找不到文件的短时间内不再重复探测
+"""
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+
+from config import Config
+from song_catalog import SongCatalog, song_catalog
+from utils.audio_stream import AUDIO_MIMETYPES, audio_mimetype
+
+logger = logging.getLogger(__name__)
+
+# 按需解析时找不到文件的歌曲多久后重新探测（秒）
+MISSING_RETRY_SEC = 60
+# 对账回写 audio_path 的批大小
+RECONCILE_BATCH_SIZE = 500
+
+
+class AudioFile(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    mimetype: str
+
+
+def path_variants(raw_path: str):
+    """数据库中的 audio_path 可能来自 Windows 或相对路径，依次尝试几种写法"""
+    path = str(raw_path).strip()
+    seen = set()
+    for candidate in (path, path.replace('\\', '/'), path.replace('/', '\\'),
+                      os.path.normpath(path), os.path.abspath(path)):
+        if candidate not in seen:
+            seen.add(candidate)
+            yield candidate
+
+
+def resolve_audio_file(raw_path: Optional[str]) -> Optional[AudioFile]:
+    if not raw_path or not str(raw_path).strip():
+        return None
+    for candidate in path_variants(raw_path):
+        try:
+            st = os.stat(candidate)
+        except OSError:
+            continue
+        if os.path.isfile(candidate) and os.access(candidate, os.R_OK):
+            return AudioFile(candidate, st.st_size, st.st_mtime, audio_mimetype(candidate))
+    return None
+
+
+def _file_name(raw_path: str) -> str:
+    """路径最后一段（兼容 Windows 分隔符），忽略大小写"""
+    return re.split(r'[\\/]', str(raw_path).strip())[-1].lower()
+
+
+def scan_audio_dir(root: str) -> Tuple[Dict[str, AudioFile], Dict[str, AudioFile], int]:
+    """扫描目录，返回 (文件名 -> 文件, track_id -> 文件, 文件总数)；
+    在多个目录下重复出现的文件名 / track_id 无法确定对应哪首歌，不放入映射"""
+    by_name, by_track = {}, {}
+    dup_names, dup_tracks = set(), set()
+    count = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in AUDIO_MIMETYPES:
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            audio = AudioFile(path, st.st_size, st.st_mtime, audio_mimetype(path))
+            count += 1
+            name = filename.lower()
+            if name in by_name:
+                dup_names.add(name)
+            by_name[name] = audio
+            if '-' in stem:
+                track = stem.split('-', 1)[1]
+                if track in by_track:
+                    dup_tracks.add(track)
+                by_track[track] = audio
+    for name in dup_names:
+        del by_name[name]
+    for track in dup_tracks:
+        del by_track[track]
+    if dup_names:
+        logger.info(f"音频目录中有 {len(dup_names)} 个重名文件，不参与按文件名匹配，例如: {sorted(dup_names)[:5]}")
+    return by_name, by_track, count
+
+
+def relocate_audio_file(by_name: Dict[str, AudioFile], by_track: Dict[str, AudioFile],
+                        raw_path: Optional[str], track_id) -> Optional[AudioFile]:
+    """库中路径失效时，按扫描结果中唯一的文件名或 track_id 找回文件"""
+    audio = None
+    if raw_path:
+        audio = by_name.get(_file_name(raw_path))
+    if audio is None and track_id:
+        audio = by_track.get(str(track_id).strip())
+    return audio
+
+
+class AudioFileIndex:
+    """音频文件位置索引；后台校验一次全量，之后按需增量"""
+
+    def __init__(self, catalog: SongCatalog):
+        self._catalog = catalog
+        self._lock = threading.Lock()
+        self._files: Dict[str, AudioFile] = {}
+        # song_id -> 可重新探测的时间；校验确认无文件的为 inf
+        self._missing: Dict[str, float] = {}
+        # 上次校验扫描 AUDIO_ROOT 得到的 唯一文件名 / track_id -> 文件
+        self._by_name: Dict[str, AudioFile] = {}
+        self._by_track: Dict[str, AudioFile] = {}
+        self._engine = None
+        self._verifying = threading.Lock()
+        self.verified_at: Optional[float] = None
+        self.last_report: Dict = {}
+        catalog.subscribe(self._on_catalog_change)
+
+    @property
+    def is_ready(self) -> bool:
+        return self.verified_at is not None
+
+    def _on_catalog_change(self, event, song_id, record):
+        if event == 'reload':
+            if self._engine is not None:
+                self.start_verify(self._engine)
+            return
+        with self._lock:
+            self._files.pop(song_id, None)
+            self._missing.pop(song_id, None)
+
+    # ---------- 后台校验 ----------
+
+    def start_verify(self, engine):
+        """在后台线程扫描并校验；已有校验在进行时忽略"""
+        self._engine = engine
+        if not self._verifying.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.verify(engine)
+            except Exception as e:
+                logger.error(f"音频文件校验失败: {e}", exc_info=True)
+            finally:
+                self._verifying.release()
+
+        threading.Thread(target=run, name='audio-verify', daemon=True).start()
+
+    def _songs(self, engine) -> List[Dict]:
+        if self._catalog.is_loaded:
+            return self._catalog.songs()
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT song_id, audio_path, track_id FROM enhanced_song_features"))
+            return [{'song_id': str(r.song_id), 'audio_path': r.audio_path, 'track_id': r.track_id}
+                    for r in rows]
+
+    def verify(self, engine, root: str = None, update_db: bool = None) -> Dict:
+        """扫描音频目录，重建索引并与 audio_path 对账，返回统计"""
+        root = Config.AUDIO_ROOT if root is None else root
+        update_db = Config.AUDIO_RECONCILE_DB if update_db is None else update_db
+        start = time.time()
+
+        by_name, by_track, scanned = {}, {}, 0
+        if root and os.path.isdir(root):
+            by_name, by_track, scanned = scan_audio_dir(root)
+        elif root:
+            logger.warning(f"音频根目录不存在，改为逐条校验 audio_path: {root}")
+
+        files, missing, no_audio, fixes = {}, [], [], []
+        for song in self._songs(engine):
+            song_id, raw_path, track_id = song['song_id'], song.get('audio_path'), song.get('track_id')
+            # 库中路径仍可用时以它为准，不做任何改写
+            audio = resolve_audio_file(raw_path)
+            if audio is not None:
+                files[song_id] = audio
+                continue
+            audio = relocate_audio_file(by_name, by_track, raw_path, track_id)
+            if audio is None:
+                (missing if raw_path else no_audio).append(song_id)
+                continue
+            files[song_id] = audio
+            fixes.append({"song_id": song_id, "audio_path": audio.path})
+
+        if update_db and fixes:
+            update = text("UPDATE enhanced_song_features SET audio_path = :audio_path WHERE song_id = :song_id")
+            with engine.begin() as conn:
+                for i in range(0, len(fixes), RECONCILE_BATCH_SIZE):
+                    conn.execute(update, fixes[i:i + RECONCILE_BATCH_SIZE])
+
+        with self._lock:
+            self._files = files
+            self._by_name, self._by_track = by_name, by_track
+            # 校验确认无文件的歌曲不再按需探测，直到被编辑或下次校验
+            self._missing = dict.fromkeys(missing + no_audio, float('inf'))
+            self.verified_at = time.time()
+        self.last_report = {
+            "scanned_files": scanned,
+            "songs_with_audio": len(files),
+            "missing_files": len(missing),
+            "paths_relocated": len(fixes),
+            "paths_fixed": len(fixes) if update_db else 0,
+            "elapsed_sec": round(time.time() - start, 2)
+        }
+        logger.info(f"音频文件校验完成: {self.last_report}")
+        if missing:
+            logger.warning(f"{len(missing)} 首歌曲的 audio_path 找不到文件，例如: {missing[:5]}")
+        return self.last_report
+
+    # ---------- 查询 ----------
+
+    def _song_source(self, song_id: str, engine) -> Tuple[bool, Optional[str], Optional[str]]:
+        """(歌曲是否存在, audio_path, track_id)"""
+        if self._catalog.is_loaded:
+            record = self._catalog.get(song_id)
+            if record is None:
+                return False, None, None
+            return True, record.get('audio_path'), record.get('track_id')
+        with engine.connect() as conn:
+            row = conn.execute(text("SELECT audio_path, track_id FROM enhanced_song_features "
+                                    "WHERE song_id = :song_id"), {"song_id": song_id}).fetchone()
+        return (True, row.audio_path, row.track_id) if row else (False, None, None)
+
+    def _relocate(self, raw_path: Optional[str], track_id) -> Optional[AudioFile]:
+        """按上次扫描结果找回文件，并确认它仍然存在"""
+        audio = relocate_audio_file(self._by_name, self._by_track, raw_path, track_id)
+        if audio is None:
+            return None
+        try:
+            st = os.stat(audio.path)
+        except OSError:
+            return None
+        return audio._replace(size=st.st_size, mtime=st.st_mtime)
+
+    def lookup(self, song_id: str, engine) -> Tuple[bool, Optional[AudioFile]]:
+        """返回 (歌曲是否存在, 音频文件)；文件不存在或不可读时音频文件为 None"""
+        song_id = str(song_id)
+        cached = self._files.get(song_id)
+        if cached is not None:
+            try:
+                st = os.stat(cached.path)
+                if (st.st_size, st.st_mtime) != (cached.size, cached.mtime):
+                    cached = cached._replace(size=st.st_size, mtime=st.st_mtime)
+                    self._files[song_id] = cached
+                return True, cached
+            except OSError:
+                logger.info(f"[音频索引] 文件已不存在，重新解析: {cached.path}")
+                with self._lock:
+                    self._files.pop(song_id, None)
+
+        retry_at = self._missing.get(song_id)
+        if retry_at is not None and time.time() < retry_at:
+            return self._song_source(song_id, engine)[0], None
+
+        exists, raw_path, track_id = self._song_source(song_id, engine)
+        if not exists:
+            return False, None
+        audio = resolve_audio_file(raw_path) or self._relocate(raw_path, track_id)
+        with self._lock:
+            if audio is None:
+                self._missing[song_id] = time.time() + MISSING_RETRY_SEC
+                if raw_path:
+                    logger.warning(f"[音频索引] 音频文件不存在或不可读: {song_id} -> {raw_path}")
+            else:
+                self._files[song_id] = audio
+                self._missing.pop(song_id, None)
+        return True, audio
+
+    def has_audio_batch(self, song_ids: Iterable[str], engine) -> Dict[str, bool]:
+        """批量判断是否有可用音频；只有校验后被编辑过的歌曲才会访问文件系统"""
+        status = {}
+        for song_id in song_ids:
+            song_id = str(song_id)
+            if song_id in self._files:
+                status[song_id] = True
+            elif self._missing.get(song_id) == float('inf'):
+                status[song_id] = False
+            else:
+                status[song_id] = self.lookup(song_id, engine)[1] is not None
+        return status
+
+
+# 全局音频文件索引（歌曲目录加载后由 RecommenderService 启动后台校验）
+audio_file_index = AudioFileIndex(song_catalog)
@@ -1,7 +1,7 @@
 import os
 import sys
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
 
 # 加载.env文件
@@ -45,6 +45,56 @@ class Config:
     MAX_RECOMMEND_COUNT: int = min(int(os.getenv('MAX_RECOMMEND_COUNT', 50)), 100)
     DEFAULT_RECOMMEND_COUNT: int = min(int(os.getenv('DEFAULT_RECOMMEND_COUNT', 10)), MAX_RECOMMEND_COUNT)
     CACHE_RECOMMENDATIONS_TTL: int = int(os.getenv('CACHE_TTL', 1800))  # 30分钟
+
+    # 冷启动用户折叠（fold-in）配置
+    FOLD_IN_MIN_INTERACTIONS: int = int(os.getenv('FOLD_IN_MIN_INTERACTIONS', 1))
+    FOLD_IN_MAX_HISTORY: int = int(os.getenv('FOLD_IN_MAX_HISTORY', 50))
+    FOLD_IN_REG: float = float(os.getenv('FOLD_IN_REG', 0.1))
+    FOLD_IN_CACHE_TTL: int = int(os.getenv('FOLD_IN_CACHE_TTL', 300))  # 5分钟
+    FOLD_IN_EMPTY_CACHE_TTL: int = int(os.getenv('FOLD_IN_EMPTY_CACHE_TTL', 30))  # 空结果只缓存30秒
+
+    # 重型召回组件（UserCF/内容/LightFM）延迟到后台加载，MF与热门就绪即可提供服务
+    LAZY_RECALL_COMPONENTS: bool = os.getenv('LAZY_RECALL_COMPONENTS', 'True').lower() in ('true', '1', 'yes')
+
+    # 多样性推荐（MMR重排）：候选池大小与相关性权重 lambda
+    DIVERSE_CANDIDATE_POOL: int = int(os.getenv('DIVERSE_CANDIDATE_POOL', 50))
+    DIVERSE_MMR_LAMBDA: float = float(os.getenv('DIVERSE_MMR_LAMBDA', 0.6))
+    
+    # 搜索联想配置：联想条目上限（保留最热门的）与单次返回数上限
+    SUGGEST_MAX_ENTRIES: int = int(os.getenv('SUGGEST_MAX_ENTRIES', 200000))
+    SUGGEST_MAX_RESULTS: int = int(os.getenv('SUGGEST_MAX_RESULTS', 20))
+    
+    # 热门歌曲：近期播放量刷新间隔、统计窗口与加权系数（排序分 = 流行度 + 系数 * log(1 + 播放数)）
+    HOT_SONGS_REFRESH_SEC: int = int(os.getenv('HOT_SONGS_REFRESH_SEC', 300))
+    HOT_PLAYS_WINDOW_DAYS: int = int(os.getenv('HOT_PLAYS_WINDOW_DAYS', 7))
+    HOT_PLAY_WEIGHT: float = float(os.getenv('HOT_PLAY_WEIGHT', 10.0))
+    HOT_SONGS_MAX_N: int = int(os.getenv('HOT_SONGS_MAX_N', 100))
+    
+    # 游标分页：列表总数（COUNT(*)）按筛选条件缓存的秒数，期间翻页返回缓存的近似总数
+    PAGINATION_COUNT_TTL: int = int(os.getenv('PAGINATION_COUNT_TTL', 60))
+    
+    # 管理后台 Dashboard：统计快照的有效期（过期后后台重建）与歌曲播放数全量重算间隔
+    DASHBOARD_ROLLUP_TTL: int = int(os.getenv('DASHBOARD_ROLLUP_TTL', 300))
+    DASHBOARD_PLAYS_FULL_REFRESH_SEC: int = int(os.getenv('DASHBOARD_PLAYS_FULL_REFRESH_SEC', 3600))
+    
+    # 算法性能指标（performance_monitor.py）：推荐后多少天内的正反馈计入命中、首次运行回填天数、计算间隔（分钟）
+    PERF_ATTRIBUTION_DAYS: int = int(os.getenv('PERF_ATTRIBUTION_DAYS', 7))
+    PERF_BACKFILL_DAYS: int = int(os.getenv('PERF_BACKFILL_DAYS', 30))
+    PERF_METRICS_INTERVAL_MIN: int = int(os.getenv('PERF_METRICS_INTERVAL_MIN', 60))
+    PERF_POSITIVE_BEHAVIORS: List[str] = os.getenv('PERF_POSITIVE_BEHAVIORS', 'play,like,collect').split(',')
+    
+    # 推荐日汇总桶（管理后台趋势/A/B 统计）：刷新间隔，以及水位前多少天的桶仍会重算（点击/收听标记回写窗口）
+    DAILY_BUCKETS_REFRESH_SEC: int = int(os.getenv('DAILY_BUCKETS_REFRESH_SEC', 300))
+    DAILY_BUCKETS_OPEN_DAYS: int = int(os.getenv('DAILY_BUCKETS_OPEN_DAYS', 3))
+    
+    # 音频文件：本地根目录（启动时后台扫描校验）；设置 AUDIO_ACCEL_REDIRECT_PREFIX（nginx internal location）后，
+    # 根目录下的文件改为 X-Accel-Redirect 交给 nginx 发送
+    AUDIO_ROOT: str = os.getenv('AUDIO_ROOT', '')
+    AUDIO_ACCEL_REDIRECT_PREFIX: str = os.getenv('AUDIO_ACCEL_REDIRECT_PREFIX', '')
+    AUDIO_CACHE_MAX_AGE: int = int(os.getenv('AUDIO_CACHE_MAX_AGE', 3600))
+    # 启动校验音频文件后，把库中路径已失效、按唯一文件名找回的新路径回写 enhanced_song_features.audio_path
+    # （默认只在内存索引中使用新路径，不改库）
+    AUDIO_RECONCILE_DB: bool = os.getenv('AUDIO_RECONCILE_DB', 'False').lower() in ('true', '1', 'yes')
     
     # 熔断器配置（recommender_service.py需要）- 关键修复
     CIRCUIT_BREAKER_THRESHOLD: int = int(os.getenv('CIRCUIT_BREAKER_THRESHOLD', 5))
@@ -77,6 +127,11 @@ class Config:
         'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 3600))
     }
 
+    # 数据库后端：mssql（默认）或 sqlite（本地基准测试，首次启动时从数据目录建库）
+    DB_BACKEND: str = os.getenv('DB_BACKEND', 'mssql').lower()
+    SQLITE_PATH: Path = Path(os.getenv('SQLITE_PATH', BASE_DIR / 'local_db' / 'music_recommendation.db'))
+    SQLITE_DATA_DIR: Path = Path(os.getenv('SQLITE_DATA_DIR', DATASET_DIR / 'separated_processed_data'))
+
     # 缓存配置 - 【新增】
     CACHE_TYPE: str = os.getenv('CACHE_TYPE', 'SimpleCache')
     CACHE_DEFAULT_TIMEOUT: int = int(os.getenv('CACHE_DEFAULT_TIMEOUT', 300))
@@ -88,7 +143,9 @@ class Config:
     
     @classmethod
     def get_db_connection_string(cls) -> str:
-        """生成SQL Server连接字符串 - Windows身份验证"""
+        """生成SQL Server连接字符串 - Windows身份验证；DB_BACKEND=sqlite 时返回本地库地址"""
+        if cls.DB_BACKEND == 'sqlite':
+            return f"sqlite:///{cls.SQLITE_PATH}"
         cfg = cls.DB_CONFIG
         driver = cfg['driver'].replace(' ', '+')
         
@@ -101,8 +158,11 @@ class Config:
         """启动时验证配置"""
         errors = []
         
+        if cls.DB_BACKEND not in ('mssql', 'sqlite'):
+            errors.append(f"DB_BACKEND 只支持 mssql / sqlite，当前为: {cls.DB_BACKEND}")
+
         # 如果不是 Windows 身份验证，才检查密码
-        if cls.DB_CONFIG.get('trusted_connection') != 'yes':
+        if cls.DB_BACKEND == 'mssql' and cls.DB_CONFIG.get('trusted_connection') != 'yes':
             if not cls.DB_CONFIG.get('password'):
                 errors.append("DB_PASSWORD 环境变量未设置（或使用Windows身份验证）")
         
@@ -0,0 +1,163 @@
+"""
+推荐日汇总桶：recommendation_daily_buckets（日期 × 算法 -> 推荐数/曝光/点击/收听）
+
+- 管理后台的算法趋势、A/B 测试与每日 CTR 只读桶表，任意日期范围都只扫描 天数 × 算法数 行，
+  不随 recommendations 的增长变慢
+- 后台按 DAILY_BUCKETS_REFRESH_SEC 重算水位（已有最大日期）前 DAILY_BUCKETS_OPEN_DAYS 天起的桶——
+  推荐的点击/收听标记通常在 24 小时内回写，更早的桶视为已封存；首次运行按月分段回填全部历史
+- 桶内先删后批量 upsert，recommendations 中被删除的记录或算法也会从桶中消失
+- algorithm_type 为空的推荐计入空字符串桶，供「算法类型未指定」时的汇总回退使用
+"""
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from config import Config
+from utils.sql_dialect import as_date, get_dialect
+
+logger = logging.getLogger(__name__)
+
+BUCKET_TABLE = 'recommendation_daily_buckets'
+BUCKET_COLUMNS = ['total_recommendations', 'views', 'clicks', 'listens']
+# 回填时单次聚合的天数
+BACKFILL_CHUNK_DAYS = 31
+
+
+class DailyBuckets:
+    """推荐日汇总桶的维护与查询"""
+
+    def __init__(self):
+        self._table_ready = False
+        self._refreshing = threading.Lock()
+        self.refreshed_at = 0.0
+
+    def ensure_table(self, engine):
+        if self._table_ready:
+            return
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = '{BUCKET_TABLE}')
+                CREATE TABLE {BUCKET_TABLE} (
+                    bucket_date DATE NOT NULL,
+                    algorithm_type VARCHAR(50) NOT NULL,
+                    total_recommendations INT NOT NULL DEFAULT 0,
+                    views INT NOT NULL DEFAULT 0,
+                    clicks INT NOT NULL DEFAULT 0,
+                    listens INT NOT NULL DEFAULT 0,
+                    updated_at DATETIME DEFAULT GETDATE(),
+                    PRIMARY KEY (bucket_date, algorithm_type)
+                )
+            """))
+        self._table_ready = True
+
+    # ---------- 维护 ----------
+
+    def _rebuild_range(self, engine, start: date, end: date) -> int:
+        """重算 [start, end) 的桶"""
+        params = {"start": datetime.combine(start, datetime.min.time()),
+                  "end": datetime.combine(end, datetime.min.time())}
+        with engine.connect() as conn:
+            result = conn.execute(text("""
+                SELECT
+                    CAST(created_at AS DATE) as bucket_date,
+                    COALESCE(algorithm_type, '') as algorithm_type,
+                    COUNT(*) as total_recommendations,
+                    SUM(CASE WHEN is_viewed = 1 THEN 1 ELSE 0 END) as views,
+                    SUM(CASE WHEN is_clicked = 1 THEN 1 ELSE 0 END) as clicks,
+                    SUM(CASE WHEN is_listened = 1 THEN 1 ELSE 0 END) as listens
+                FROM recommendations
+                WHERE created_at >= :start AND created_at < :end
+                GROUP BY CAST(created_at AS DATE), COALESCE(algorithm_type, '')
+            """), params)
+            rows = [{
+                'bucket_date': as_date(row.bucket_date),
+                'algorithm_type': row.algorithm_type,
+                'total_recommendations': row.total_recommendations,
+                'views': row.views or 0,
+                'clicks': row.clicks or 0,
+                'listens': row.listens or 0
+            } for row in result]
+
+        with engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {BUCKET_TABLE} WHERE bucket_date >= :start AND bucket_date < :end"),
+                         {"start": start, "end": end})
+            get_dialect(engine).upsert_many(conn, BUCKET_TABLE, ['bucket_date', 'algorithm_type'],
+                                            BUCKET_COLUMNS, rows, touch_column='updated_at')
+        return len(rows)
+
+    def refresh(self, engine, start: Optional[date] = None) -> int:
+        """重算仍可能变化的桶；start 给出时从该日期起全部重算，返回写入的桶数"""
+        self.ensure_table(engine)
+        today = datetime.now().date()
+        if start is None:
+            with engine.connect() as conn:
+                watermark = conn.execute(text(f"SELECT MAX(bucket_date) FROM {BUCKET_TABLE}")).scalar()
+                if watermark is not None:
+                    start = min(as_date(watermark), today) - timedelta(days=Config.DAILY_BUCKETS_OPEN_DAYS)
+                else:
+                    first = conn.execute(text("SELECT MIN(created_at) FROM recommendations")).scalar()
+                    start = as_date(first) if first is not None else today
+
+        written, chunk_start, end = 0, start, today + timedelta(days=1)
+        while chunk_start < end:
+            chunk_end = min(chunk_start + timedelta(days=BACKFILL_CHUNK_DAYS), end)
+            written += self._rebuild_range(engine, chunk_start, chunk_end)
+            chunk_start = chunk_end
+        self.refreshed_at = time.time()
+        logger.info(f"推荐日汇总桶已更新: {start} ~ {today}, {written} 个桶")
+        return written
+
+    def maybe_refresh(self, engine):
+        """从未刷新时同步刷新；过期时在后台刷新，当前请求读取现有桶"""
+        if self.refreshed_at == 0.0:
+            with self._refreshing:
+                if self.refreshed_at == 0.0:
+                    self.refresh(engine)
+            return
+        if time.time() - self.refreshed_at < Config.DAILY_BUCKETS_REFRESH_SEC:
+            return
+        if not self._refreshing.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.refresh(engine)
+            except Exception as e:
+                # 失败后同样等待一个刷新周期再重试
+                self.refreshed_at = time.time()
+                logger.warning(f"刷新推荐日汇总桶失败: {e}")
+            finally:
+                self._refreshing.release()
+
+        threading.Thread(target=run, name='daily-buckets-refresh', daemon=True).start()
+
+    # ---------- 查询 ----------
+
+    def daily(self, engine, start: date, end: date) -> List[Dict]:
+        """[start, end] 内每天每个算法的计数（含 algorithm_type 为空字符串的桶），按日期、算法排序"""
+        self.maybe_refresh(engine)
+        with engine.connect() as conn:
+            result = conn.execute(text(f"""
+                SELECT bucket_date, algorithm_type, total_recommendations, views, clicks, listens
+                FROM {BUCKET_TABLE}
+                WHERE bucket_date >= :start AND bucket_date <= :end
+                ORDER BY bucket_date, algorithm_type
+            """), {"start": start, "end": end})
+            return [{**row._mapping, 'bucket_date': as_date(row.bucket_date)} for row in result]
+
+    def totals(self, engine, start: date, end: date) -> Dict[str, Dict]:
+        """[start, end] 内按算法汇总的计数：algorithm_type -> {total_recommendations, views, clicks, listens}"""
+        totals: Dict[str, Dict] = {}
+        for row in self.daily(engine, start, end):
+            bucket = totals.setdefault(row['algorithm_type'], dict.fromkeys(BUCKET_COLUMNS, 0))
+            for column in BUCKET_COLUMNS:
+                bucket[column] += row[column] or 0
+        return totals
+
+
+# 全局推荐日汇总桶（管理后台统计接口读取时按需刷新）
+daily_buckets = DailyBuckets()
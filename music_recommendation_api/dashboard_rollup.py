@@ -0,0 +1,149 @@
+"""
+管理后台统计汇总：Dashboard 各项聚合结果以内存快照提供
+
+- 每组统计（stats / advanced 等）注册一个构建函数，结果连同构建时间保存为快照；
+  首次请求同步构建，超过 DASHBOARD_ROLLUP_TTL 后在后台线程重建，期间继续返回旧快照
+- 歌曲播放数按 interaction_id 水位增量累加（每次只扫描新增的播放记录），
+  每 DASHBOARD_PLAYS_FULL_REFRESH_SEC 全量重算一次，纠正删除记录等造成的偏差
+- 响应带 generated_at / age_seconds，前端可据此展示数据新鲜度
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+
+from config import Config
+from song_catalog import SongCatalog, song_catalog
+
+logger = logging.getLogger(__name__)
+
+
+class _Rollup(NamedTuple):
+    data: Dict
+    built_at: float
+
+    def payload(self) -> Dict:
+        """快照数据 + 新鲜度字段"""
+        return {
+            **self.data,
+            "generated_at": datetime.fromtimestamp(self.built_at).isoformat(timespec='seconds'),
+            "age_seconds": int(time.time() - self.built_at)
+        }
+
+
+class DashboardRollup:
+    """统计快照与增量播放数；读取无锁，重建时整体替换"""
+
+    def __init__(self, catalog: SongCatalog, ttl: int = Config.DASHBOARD_ROLLUP_TTL):
+        self._catalog = catalog
+        self._ttl = ttl
+        self._builders: Dict[str, Callable] = {}
+        self._rollups: Dict[str, _Rollup] = {}
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._refreshing: Dict[str, threading.Lock] = {}
+        # 歌曲播放数（增量累加）
+        self._plays_lock = threading.Lock()
+        self._plays: Counter = Counter()
+        self._plays_watermark = 0
+        self._plays_full_at = 0.0
+
+    # ---------- 统计快照 ----------
+
+    def register(self, name: str, builder: Callable):
+        """注册一组统计的构建函数 builder(engine) -> dict"""
+        self._builders[name] = builder
+        self._build_locks[name] = threading.Lock()
+        self._refreshing[name] = threading.Lock()
+
+    def _build(self, name: str, engine) -> _Rollup:
+        start = time.time()
+        rollup = _Rollup(self._builders[name](engine), time.time())
+        self._rollups[name] = rollup
+        logger.info(f"Dashboard 统计 [{name}] 已重建，耗时 {time.time() - start:.2f}秒")
+        return rollup
+
+    def get(self, name: str, engine, force: bool = False) -> _Rollup:
+        """返回统计快照；没有快照或 force 时同步构建，过期时后台重建并先返回旧快照"""
+        rollup = self._rollups.get(name)
+        if rollup is None or force:
+            with self._build_locks[name]:
+                current = self._rollups.get(name)
+                # 等锁期间其他请求已构建好的直接使用
+                if current is not None and current is not rollup:
+                    return current
+                return self._build(name, engine)
+        if time.time() - rollup.built_at >= self._ttl:
+            self._refresh_async(name, engine)
+        return rollup
+
+    def _refresh_async(self, name: str, engine):
+        if not self._refreshing[name].acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                with self._build_locks[name]:
+                    self._build(name, engine)
+            except Exception as e:
+                logger.warning(f"重建 Dashboard 统计 [{name}] 失败: {e}")
+            finally:
+                self._refreshing[name].release()
+
+        threading.Thread(target=run, name=f'dashboard-rollup-{name}', daemon=True).start()
+
+    def invalidate(self, name: Optional[str] = None):
+        """丢弃快照，下次请求重新构建"""
+        if name is None:
+            self._rollups.clear()
+        else:
+            self._rollups.pop(name, None)
+
+    # ---------- 播放数 ----------
+
+    def refresh_play_counts(self, engine) -> Counter:
+        """累加水位之后新增的播放记录；到期时全量重算"""
+        with self._plays_lock:
+            full = time.time() - self._plays_full_at >= Config.DASHBOARD_PLAYS_FULL_REFRESH_SEC
+            watermark = 0 if full else self._plays_watermark
+            query = text("""
+                SELECT song_id, COUNT(*) AS plays, MAX(interaction_id) AS last_id
+                FROM user_song_interaction
+                WHERE behavior_type = 'play' AND interaction_id > :watermark
+                GROUP BY song_id
+            """)
+            plays = Counter() if full else Counter(self._plays)
+            with engine.connect() as conn:
+                for row in conn.execute(query, {"watermark": watermark}):
+                    plays[str(row.song_id)] += int(row.plays)
+                    watermark = max(watermark, int(row.last_id))
+            self._plays, self._plays_watermark = plays, watermark
+            if full:
+                self._plays_full_at = time.time()
+            return plays
+
+    def top_played(self, engine, n: int = 10) -> List[Tuple[Dict, int]]:
+        """播放数前 n 的歌曲 [(目录记录, 播放数)]，同播放数按 final_popularity 降序；
+        有播放的歌曲不足 n 首时用流行度最高的歌曲补足（与原 LEFT JOIN 排序一致）"""
+        plays = self.refresh_play_counts(engine)
+
+        def popularity(record):
+            value = record.get('final_popularity')
+            return float(value) if value is not None and value == value else float('-inf')
+
+        played = [(record, count) for record, count in
+                  ((self._catalog.get(song_id), count) for song_id, count in plays.items())
+                  if record is not None]
+        top = heapq.nlargest(n, played, key=lambda item: (item[1], popularity(item[0])))
+        if len(top) < n:
+            unplayed = (r for r in self._catalog.songs() if r['song_id'] not in plays)
+            top += [(r, 0) for r in heapq.nlargest(n - len(top), unplayed, key=popularity)]
+        return top
+
+
+# 全局 Dashboard 统计汇总（构建函数由 routes/admin.py 注册）
+dashboard_rollup = DashboardRollup(song_catalog)
@@ -178,7 +178,8 @@ class ExplanationEngine:
         user_count = 0
         top_similar_user = None
         
-        if song_idx is not None:
+        # 编码 >= n_songs 的歌曲不在训练矩阵中（无交互列）
+        if song_idx is not None and song_idx < self.rec.n_songs:
             for sim_user, sim_score in list(similar_users.items())[:10]:
                 sim_user_idx = self.rec.user_to_idx.get(sim_user)
                 if sim_user_idx and self.rec.user_song_matrix[sim_user_idx, song_idx] > 0:
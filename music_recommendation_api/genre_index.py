@@ -0,0 +1,255 @@
+"""
+流派分面索引：流派 -> 有序歌曲下标数组
+
+- 每首歌按 genre / genre_clean 的归一化文本归入「流派值」分面；查询词匹配包含它的流派值，
+  与原 genre LIKE '%词%' OR genre_clean LIKE '%词%' 语义一致（大类到源流派的展开由前端完成）
+- 另按 GENRE_NORMALIZATION 统计各大类歌曲数（源流派是流派值的子串即归入），只用于 stats
+- 每个分面是按 有音频优先 > 流行度降序 > 下标 排好序的 int32 数组；
+  多流派查询对命中的分面求并集后重新排序，结果按查询缓存
+- 翻页支持 offset 与游标（最后一首的排序键），游标不受前面插入/删除的影响
+- 各流派歌曲数与大类歌曲数随目录增量更新，/songs/by-genre/stats 不再访问数据库
+"""
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from search_index import normalize_text
+from song_catalog import SongCatalog, song_catalog
+
+logger = logging.getLogger(__name__)
+
+# 极简流派归一化映射（与前端一致）
+GENRE_NORMALIZATION = {
+    '流行': ['华语流行', '欧美流行', '日本流行', 'Pop', 'K-Pop'],
+    '摇滚': ['Rock', 'Punk', '摇滚'],
+    '电子': ['Electronic', '电子'],
+    '金属': ['Metal'],
+    '说唱': ['Rap', '说唱'],
+    '民谣': ['Folk', '民谣', 'Country'],
+    '其他': ['Jazz', 'Blues', 'Latin', 'New Age', 'World', 'Reggae', 'RnB', '翻唱', '现场', '影视原声']
+}
+# 大类名本身也视为源流派（如 genre 为「流行」的歌曲归入流行）
+_NORMALIZED_SOURCES = {
+    normalize_text(code): [normalize_text(s) for s in [code] + sources]
+    for code, sources in GENRE_NORMALIZATION.items()
+}
+_CODE_NAMES = {normalize_text(code): code for code in GENRE_NORMALIZATION}
+
+# 缓存的查询结果数（索引变更后整体失效）
+QUERY_CACHE_SIZE = 256
+
+
+class _GenreDoc(NamedTuple):
+    song_id: str
+    values: FrozenSet[str]     # 归一化后的 genre / genre_clean
+    codes: FrozenSet[str]      # 所属大类
+    genre: Optional[str]       # 原始 genre（统计口径与原 GROUP BY genre 一致）
+
+
+def song_popularity(record: Dict) -> float:
+    """COALESCE(final_popularity, popularity, 50)"""
+    for name in ('final_popularity', 'popularity'):
+        value = record.get(name)
+        if value is not None and value == value:
+            return float(value)
+    return 50.0
+
+
+def song_has_audio(record: Dict) -> bool:
+    return bool(record.get('audio_path')) or record.get('track_id') is not None
+
+
+def _make_doc(record: Dict) -> _GenreDoc:
+    values = frozenset(v for v in (normalize_text(record.get('genre')),
+                                   normalize_text(record.get('genre_clean'))) if v)
+    codes = frozenset(code for code, sources in _NORMALIZED_SOURCES.items()
+                      if any(s in v for s in sources for v in values))
+    genre = record.get('genre')
+    genre = str(genre).strip() if genre is not None else ''
+    return _GenreDoc(record['song_id'], values, codes, genre or None)
+
+
+class GenreFacetIndex:
+    """订阅 SongCatalog 的流派分面索引，目录重载时重建、编辑时增量更新"""
+
+    def __init__(self, catalog: SongCatalog):
+        self._catalog = catalog
+        self._lock = threading.RLock()
+        # doc_id -> _GenreDoc；删除的文档置为 None
+        self._docs: List[Optional[_GenreDoc]] = []
+        self._doc_of: Dict[str, int] = {}
+        self._audio = np.zeros(0, dtype=np.int8)
+        self._popularity = np.zeros(0, dtype=np.float64)
+        self._value_postings: Dict[str, np.ndarray] = {}
+        self._genre_counts: Counter = Counter()
+        self._code_counts: Counter = Counter()
+        self._cache: Dict[str, np.ndarray] = {}
+        self.built_at: Optional[float] = None
+        catalog.subscribe(self._on_catalog_change)
+
+    @property
+    def is_ready(self) -> bool:
+        return self.built_at is not None
+
+    # ---------- 构建与增量更新 ----------
+
+    def _on_catalog_change(self, event, song_id, record):
+        if event == 'reload':
+            self.rebuild()
+        elif event == 'update':
+            self.update(record)
+        elif event == 'remove':
+            self.remove(song_id)
+
+    @staticmethod
+    def _sorted(ids: np.ndarray, audio: np.ndarray, popularity: np.ndarray) -> np.ndarray:
+        """按 有音频优先 > 流行度降序 > 下标 排序"""
+        ids = np.asarray(ids, dtype=np.int32)
+        order = np.lexsort((ids, -popularity[ids], -audio[ids]))
+        return ids[order]
+
+    def rebuild(self):
+        start = time.time()
+        # 下标按 song_id 顺序分配，同分歌曲的先后在重建前后保持一致
+        records = sorted(self._catalog.songs(), key=lambda r: r['song_id'])
+        docs = [_make_doc(r) for r in records]
+        audio = np.fromiter((song_has_audio(r) for r in records), dtype=np.int8, count=len(records))
+        popularity = np.fromiter((song_popularity(r) for r in records), dtype=np.float64, count=len(records))
+
+        value_members = defaultdict(list)
+        genre_counts, code_counts = Counter(), Counter()
+        for doc_id, doc in enumerate(docs):
+            for value in doc.values:
+                value_members[value].append(doc_id)
+            if doc.genre:
+                genre_counts[doc.genre] += 1
+            code_counts.update(doc.codes)
+
+        with self._lock:
+            self._docs = docs
+            self._doc_of = {doc.song_id: i for i, doc in enumerate(docs)}
+            self._audio, self._popularity = audio, popularity
+            self._value_postings = {k: self._sorted(v, audio, popularity) for k, v in value_members.items()}
+            self._genre_counts, self._code_counts = genre_counts, code_counts
+            self._cache.clear()
+            self.built_at = time.time()
+        logger.info(f"流派索引已构建: {len(docs)} 首歌曲, {len(value_members)} 个流派值, "
+                    f"耗时 {time.time() - start:.2f}秒")
+
+    def _move(self, postings: Dict[str, np.ndarray], doc_id: int, old: FrozenSet[str], new: FrozenSet[str]):
+        """把 doc_id 从 old 分面移出、放入 new 分面，并按新的排序键重排受影响的分面"""
+        for key in old | new:
+            ids = postings.get(key)
+            ids = ids[ids != doc_id] if ids is not None else np.empty(0, dtype=np.int32)
+            if key in new:
+                ids = np.append(ids, doc_id)
+            if len(ids):
+                postings[key] = self._sorted(ids, self._audio, self._popularity)
+            else:
+                postings.pop(key, None)
+
+    def _count(self, doc: _GenreDoc, sign: int):
+        if doc.genre:
+            self._genre_counts[doc.genre] += sign
+            if self._genre_counts[doc.genre] <= 0:
+                del self._genre_counts[doc.genre]
+        for code in doc.codes:
+            self._code_counts[code] += sign
+
+    def update(self, record: Dict):
+        """新增或修改一首歌曲"""
+        doc = _make_doc(record)
+        with self._lock:
+            doc_id = self._doc_of.get(doc.song_id)
+            if doc_id is None:
+                doc_id = len(self._docs)
+                self._docs.append(doc)
+                self._doc_of[doc.song_id] = doc_id
+                self._audio = np.append(self._audio, np.int8(0))
+                self._popularity = np.append(self._popularity, 0.0)
+                old = _GenreDoc(doc.song_id, frozenset(), frozenset(), None)
+            else:
+                old = self._docs[doc_id]
+                self._docs[doc_id] = doc
+            self._audio[doc_id] = song_has_audio(record)
+            self._popularity[doc_id] = song_popularity(record)
+            self._move(self._value_postings, doc_id, old.values, doc.values)
+            self._count(old, -1)
+            self._count(doc, 1)
+            self._cache.clear()
+
+    def remove(self, song_id: str):
+        with self._lock:
+            doc_id = self._doc_of.pop(str(song_id), None)
+            if doc_id is None:
+                return
+            doc = self._docs[doc_id]
+            self._docs[doc_id] = None
+            self._move(self._value_postings, doc_id, doc.values, frozenset())
+            self._count(doc, -1)
+            self._cache.clear()
+
+    # ---------- 查询 ----------
+
+    def _resolve(self, terms: List[str]) -> np.ndarray:
+        """查询词 -> 有序 doc_id 数组；每个词匹配包含它的流派值"""
+        key = '\x1f'.join(sorted(set(terms)))
+        ordered = self._cache.get(key)
+        if ordered is not None:
+            return ordered
+        parts = []
+        for term in set(terms):
+            parts.extend(ids for value, ids in self._value_postings.items() if term in value)
+        if not parts:
+            ordered = np.empty(0, dtype=np.int32)
+        elif len(parts) == 1:
+            ordered = parts[0]
+        else:
+            ordered = self._sorted(np.unique(np.concatenate(parts)), self._audio, self._popularity)
+        if len(self._cache) >= QUERY_CACHE_SIZE:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = ordered
+        return ordered
+
+    def page(self, genres: List[str], limit: int, offset: int = 0,
+             after: Optional[list] = None) -> Tuple[List[Tuple[str, bool, float]], int, Optional[list]]:
+        """返回 ([(song_id, has_audio, popularity)], 命中总数, 下一页游标键)
+
+        after 为上一页最后一首的排序键 [has_audio, popularity, song_id]，给出时忽略 offset。
+        """
+        terms = [t for t in (normalize_text(g) for g in genres) if t]
+        with self._lock:
+            ordered = self._resolve(terms)
+            audio, popularity = self._audio, self._popularity
+            if after is not None:
+                last_audio, last_popularity, last_song = int(after[0]), float(after[1]), str(after[2])
+                last_doc = self._doc_of.get(last_song, -1)
+                a, p = audio[ordered], popularity[ordered]
+                # 排在游标（含）之前的歌曲数即起始位置
+                offset = int(np.count_nonzero(
+                    (a > last_audio) | ((a == last_audio) & (
+                        (p > last_popularity) | ((p == last_popularity) & (ordered <= last_doc))))))
+            ids = ordered[offset:offset + limit].tolist()
+            rows = [(self._docs[i].song_id, bool(audio[i]), float(popularity[i])) for i in ids]
+        next_key = None
+        if rows and offset + len(rows) < len(ordered):
+            song_id, has_audio, pop = rows[-1]
+            next_key = [int(has_audio), pop, song_id]
+        return rows, len(ordered), next_key
+
+    def stats(self) -> Tuple[List[Dict], List[Dict]]:
+        """返回 (各流派歌曲数, 各大类歌曲数)，均按歌曲数降序"""
+        with self._lock:
+            genres = [{"name": name, "count": count} for name, count in self._genre_counts.most_common()]
+            categories = [{"name": _CODE_NAMES[code], "count": self._code_counts.get(code, 0)}
+                          for code in _NORMALIZED_SOURCES]
+        categories.sort(key=lambda c: -c['count'])
+        return genres, categories
+
+
+# 全局流派索引（随 song_catalog 加载自动构建）
+genre_facet_index = GenreFacetIndex(song_catalog)
@@ -0,0 +1,195 @@
+"""
+热门歌曲服务：按流行度分层的有序列表常驻内存
+
+- 分层（hit/popular/normal）与基础流行度来自推荐引擎两个来源的 tiered_songs / song_popularity，
+  模型切换后由 RecommenderService 重新载入
+- 排序分 = 流行度 + HOT_PLAY_WEIGHT * log(1 + 近期播放数)，播放数每 HOT_SONGS_REFRESH_SEC
+  在后台线程从 user_song_interaction 刷新一次
+- 每层只物化前 HOT_SONGS_MAX_N 首的响应字典；快照带内容指纹，供 /songs/hot 与 /songs/hot/stats 做 ETag
+- 展示字段取自歌曲目录，目录变更时重建快照
+"""
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+
+from config import Config
+from song_catalog import SongCatalog, song_catalog
+
+logger = logging.getLogger(__name__)
+
+TIERS = ('hit', 'popular', 'normal')
+
+
+class _HotSnapshot(NamedTuple):
+    lists: Dict[str, List[Dict]]    # 层级（含 all）-> 按排序分降序的前 N 首
+    stats: List[Dict]               # 各层歌曲数与平均流行度
+    version: str                    # 内容指纹
+    built_at: float
+
+
+class HotSongsService:
+    """热门歌曲分层列表；读取无锁，重建时整体替换快照"""
+
+    def __init__(self, catalog: SongCatalog, max_n: int = Config.HOT_SONGS_MAX_N):
+        self._catalog = catalog
+        self._max_n = max_n
+        self._system = None
+        # song_id -> (层级, 基础流行度)
+        self._base: Dict[str, Tuple[str, float]] = {}
+        self._plays: Dict[str, int] = {}
+        self._snapshot: Optional[_HotSnapshot] = None
+        self._build_lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._plays_refreshed_at = 0.0
+        catalog.subscribe(self._on_catalog_change)
+
+    @property
+    def is_ready(self) -> bool:
+        return self._snapshot is not None
+
+    # ---------- 数据载入 ----------
+
+    def load_from_engine(self, system):
+        """从推荐引擎（SeparatedMusicRecommender）载入分层与基础流行度"""
+        base = {}
+        for recommender in (system.internal_recommender, system.external_recommender):
+            popularity = recommender.song_popularity
+            for tier in TIERS:
+                for song_id in recommender.tiered_songs.get(tier, []):
+                    value = popularity.get(song_id)
+                    value = 50.0 if value is None or value != value else float(value)
+                    sid = str(song_id)
+                    if sid not in base or value > base[sid][1]:
+                        base[sid] = (tier, value)
+        self._system = system
+        self._base = base
+        self._rebuild()
+
+    def refresh_play_counts(self, engine):
+        """统计近期播放数并重建快照"""
+        query = text("""
+            SELECT song_id, COUNT(*) as plays
+            FROM user_song_interaction
+            WHERE behavior_type = 'play'
+              AND [timestamp] >= DATEADD(day, -:days, GETDATE())
+            GROUP BY song_id
+        """)
+        with engine.connect() as conn:
+            plays = {str(row.song_id): int(row.plays)
+                     for row in conn.execute(query, {"days": Config.HOT_PLAYS_WINDOW_DAYS})}
+        self._plays = plays
+        self._plays_refreshed_at = time.time()
+        self._rebuild()
+
+    def maybe_refresh(self, engine):
+        """播放数过期时在后台刷新，当前请求继续使用现有快照"""
+        if engine is None or time.time() - self._plays_refreshed_at < Config.HOT_SONGS_REFRESH_SEC:
+            return
+        if not self._refreshing.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.refresh_play_counts(engine)
+            except Exception as e:
+                # 失败后同样等待一个刷新周期再重试
+                self._plays_refreshed_at = time.time()
+                logger.warning(f"刷新热门歌曲播放数失败: {e}")
+            finally:
+                self._refreshing.release()
+
+        threading.Thread(target=run, name='hot-songs-refresh', daemon=True).start()
+
+    def _on_catalog_change(self, event, song_id, record):
+        if self._base:
+            self._rebuild()
+
+    # ---------- 快照构建 ----------
+
+    def _score(self, song_id: str, popularity: float) -> float:
+        plays = self._plays.get(song_id, 0)
+        return popularity + Config.HOT_PLAY_WEIGHT * math.log1p(plays) if plays else popularity
+
+    def _payload(self, song_id: str, tier: str, popularity: float) -> Optional[Dict]:
+        record = self._catalog.get(song_id)
+        if record is None:
+            info = self._system.get_song_info(song_id) if self._system is not None else None
+            if not info:
+                return None
+            record = {'song_name': info.get('song_name'), 'artists': info.get('artists'),
+                      'album': None, 'genre': info.get('genre'), 'audio_path': None}
+        return {
+            "song_id": song_id,
+            "song_name": record.get('song_name'),
+            "artists": record.get('artists'),
+            "album": record.get('album'),
+            "genre": record.get('genre_clean') or record.get('genre'),
+            "popularity": int(popularity) if popularity else 50,
+            "popularity_tier": tier,
+            "recent_plays": self._plays.get(song_id, 0),
+            "has_audio": bool(record.get('audio_path'))
+        }
+
+    def _top(self, ranked) -> List[Dict]:
+        songs = []
+        for _, song_id, tier, popularity in ranked:
+            payload = self._payload(song_id, tier, popularity)
+            if payload is not None:
+                songs.append(payload)
+                if len(songs) >= self._max_n:
+                    break
+        return songs
+
+    def _rebuild(self):
+        with self._build_lock:
+            ranked = {tier: [] for tier in TIERS}
+            for song_id, (tier, popularity) in self._base.items():
+                ranked[tier].append((-self._score(song_id, popularity), song_id, tier, popularity))
+            for rows in ranked.values():
+                rows.sort()
+
+            lists = {tier: self._top(rows) for tier, rows in ranked.items()}
+            # all 层：各层前 N 首合并后取全局前 N
+            merged = sorted(row for rows in ranked.values() for row in rows[:self._max_n * 2])
+            lists['all'] = self._top(merged)
+
+            stats = []
+            for tier in TIERS:
+                rows = ranked[tier]
+                if rows:
+                    stats.append({
+                        "tier": tier,
+                        "count": len(rows),
+                        "avg_popularity": round(sum(r[3] for r in rows) / len(rows), 4)
+                    })
+
+            digest = hashlib.sha1(json.dumps([lists, stats], sort_keys=True, default=str)
+                                  .encode('utf-8')).hexdigest()[:16]
+            self._snapshot = _HotSnapshot(lists, stats, digest, time.time())
+
+    # ---------- 查询 ----------
+
+    def get(self, tier: str = 'all', n: int = 20) -> Tuple[List[Dict], str]:
+        """返回 (前 n 首热门歌曲, ETag)；未知层级按 all 处理"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return [], ''
+        tier = tier if tier in snapshot.lists else 'all'
+        n = max(0, min(n, self._max_n))
+        return snapshot.lists[tier][:n], f"hot-{snapshot.version}-{tier}-{n}"
+
+    def stats(self) -> Tuple[List[Dict], str]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return [], ''
+        return snapshot.stats, f"hot-stats-{snapshot.version}"
+
+
+# 全局热门歌曲服务（模型载入/切换时由 RecommenderService 填充）
+hot_songs = HotSongsService(song_catalog)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型版本注册表
+- 每个模型版本对应 recommender_cache/versions/<version> 下独立的缓存目录
+- registry.json 记录所有版本、当前激活版本和上一个激活版本（用于回滚）
+- 未注册任何版本时，recommender_cache 根目录作为 'legacy' 版本使用
+"""
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+LEGACY_VERSION = 'legacy'
+
+
+class ModelRegistry:
+    """基于文件的模型版本注册表（线程安全）"""
+
+    def __init__(self, base_dir: Path):
+        self.base_dir = Path(base_dir)
+        self.versions_dir = self.base_dir / 'versions'
+        self.registry_file = self.base_dir / 'registry.json'
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+    def _read(self) -> Dict:
+        if not self.registry_file.exists():
+            return {"active": None, "previous": None, "versions": {}}
+        try:
+            with open(self.registry_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"读取模型注册表失败，使用空注册表: {e}")
+            return {"active": None, "previous": None, "versions": {}}
+
+    def _write(self, data: Dict):
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.registry_file.with_suffix('.json.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        # 原子替换，避免读到写了一半的注册表
+        os.replace(tmp_file, self.registry_file)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def active_version(self) -> str:
+        with self._lock:
+            return self._read().get('active') or LEGACY_VERSION
+
+    def previous_version(self) -> Optional[str]:
+        with self._lock:
+            return self._read().get('previous')
+
+    def cache_dir_for(self, version: str) -> Path:
+        if version == LEGACY_VERSION:
+            return self.base_dir
+        return self.versions_dir / version
+
+    def get_version(self, version: str) -> Optional[Dict]:
+        if version == LEGACY_VERSION:
+            return {"version": LEGACY_VERSION, "status": "ready",
+                    "path": str(self.base_dir), "created_at": None}
+        with self._lock:
+            return self._read()['versions'].get(version)
+
+    def list_versions(self) -> List[Dict]:
+        with self._lock:
+            data = self._read()
+        active = data.get('active') or LEGACY_VERSION
+        versions = [self.get_version(LEGACY_VERSION)] + sorted(
+            data['versions'].values(), key=lambda v: v.get('created_at') or '', reverse=True
+        )
+        for v in versions:
+            v['active'] = v['version'] == active
+            v['previous'] = v['version'] == data.get('previous')
+        return versions
+
+    # ------------------------------------------------------------------
+    # 版本生命周期
+    # ------------------------------------------------------------------
+    def create_version(self) -> str:
+        """登记一个新的构建中版本，并创建其缓存目录"""
+        with self._lock:
+            data = self._read()
+            version = datetime.now().strftime('v%Y%m%d_%H%M%S')
+            suffix = 1
+            while version in data['versions']:
+                version = f"{datetime.now().strftime('v%Y%m%d_%H%M%S')}_{suffix}"
+                suffix += 1
+            path = self.cache_dir_for(version)
+            path.mkdir(parents=True, exist_ok=True)
+            data['versions'][version] = {
+                "version": version,
+                "status": "building",
+                "path": str(path),
+                "created_at": datetime.now().isoformat(),
+                "finished_at": None,
+                "stats": {},
+                "error": None
+            }
+            self._write(data)
+            return version
+
+    def mark_ready(self, version: str, stats: Dict = None):
+        self._update(version, status="ready", finished_at=datetime.now().isoformat(),
+                     stats=stats or {})
+
+    def mark_failed(self, version: str, error: str):
+        self._update(version, status="failed", finished_at=datetime.now().isoformat(),
+                     error=error)
+
+    def _update(self, version: str, **fields):
+        with self._lock:
+            data = self._read()
+            if version in data['versions']:
+                data['versions'][version].update(fields)
+                self._write(data)
+
+    def activate(self, version: str):
+        """将版本设为激活版本，原激活版本记为 previous"""
+        with self._lock:
+            data = self._read()
+            if version != LEGACY_VERSION:
+                info = data['versions'].get(version)
+                if info is None:
+                    raise KeyError(f"模型版本不存在: {version}")
+                if info.get('status') != 'ready':
+                    raise ValueError(f"模型版本 {version} 状态为 {info.get('status')}，无法激活")
+            current = data.get('active') or LEGACY_VERSION
+            if current != version:
+                data['previous'] = current
+            data['active'] = None if version == LEGACY_VERSION else version
+            self._write(data)
+
+    def delete_version(self, version: str):
+        """删除非激活版本及其缓存目录"""
+        with self._lock:
+            data = self._read()
+            if version == (data.get('active') or LEGACY_VERSION) or version == LEGACY_VERSION:
+                raise ValueError("不能删除当前激活版本或legacy版本")
+            if version not in data['versions']:
+                raise KeyError(f"模型版本不存在: {version}")
+            del data['versions'][version]
+            if data.get('previous') == version:
+                data['previous'] = None
+            self._write(data)
+        shutil.rmtree(self.cache_dir_for(version), ignore_errors=True)
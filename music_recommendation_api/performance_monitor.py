@@ -1,121 +1,205 @@
+"""
+算法性能指标计算（按 推荐日期 × 算法 写入 algorithm_performance_stats）
+
+- 命中：某天推荐给用户的歌曲，在推荐之后（不早于当天首次推荐的时间）、当天起 PERF_ATTRIBUTION_DAYS 天内
+  被该用户正反馈（播放/喜欢/收藏）；推荐前的行为不算命中
+- 准确率 = 命中的 (用户, 歌曲) / 推荐的 (用户, 歌曲)
+- 召回率 = 命中的 (用户, 歌曲) / 这些用户同期全部正反馈的 (用户, 歌曲)
+- 覆盖率 = 推荐过的不同歌曲 / 曲库歌曲数
+- 多样性 = 每个推荐列表 (不同流派数 - 1) / (列表长度 - 1) 的平均值
+- 增量：已写入的最大 metric_date 为水位，只重算水位前 PERF_ATTRIBUTION_DAYS 天起仍可能有新反馈的日期；
+  首次运行回填 PERF_BACKFILL_DAYS 天。结果多行 VALUES 批量 upsert
+"""
 import schedule
 import time
 import logging
-from datetime import datetime, timedelta
-from sqlalchemy import text
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+from sqlalchemy import bindparam, inspect, text
+from config import Config
 from recommender_service import recommender_service
+from utils.sql_dialect import as_date, get_dialect
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def calculate_algorithm_performance():
-    """计算算法性能指标"""
+STATS_TABLE = 'algorithm_performance_stats'
+METRIC_COLUMNS = ['recall_rate', 'precision_rate', 'diversity_score', 'coverage_rate', 'ctr_rate', 'listen_rate',
+                  'total_recommendations', 'clicks', 'listens']
+
+# 统计区间内去重后的推荐 (算法, 日期, 用户, 歌曲) 及当天首次推荐的时间
+_REC_CTE = """
+    rec AS (
+        SELECT algorithm_type, CAST(created_at AS DATE) AS metric_date, user_id, song_id,
+               MIN(created_at) AS recommended_at
+        FROM recommendations
+        WHERE created_at >= :start AND created_at < :end AND algorithm_type IS NOT NULL
+        GROUP BY algorithm_type, CAST(created_at AS DATE), user_id, song_id
+    )
+"""
+
+
+def ensure_schema(engine):
+    """旧表缺少 coverage_rate 列时补上"""
+    columns = {c['name'].lower() for c in inspect(engine).get_columns(STATS_TABLE)}
+    if 'coverage_rate' not in columns:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {STATS_TABLE} ADD coverage_rate FLOAT"))
+        logger.info(f"{STATS_TABLE} 已添加 coverage_rate 列")
+
+
+def _metrics_start(conn, today: date) -> date:
+    """本次需要重算的起始日期：水位前仍在归因窗口内的日期；首次运行时回填"""
+    watermark = conn.execute(text(f"SELECT MAX(metric_date) FROM {STATS_TABLE}")).scalar()
+    if watermark is not None:
+        return min(as_date(watermark), today) - timedelta(days=Config.PERF_ATTRIBUTION_DAYS)
+    first = conn.execute(text("SELECT MIN(created_at) FROM recommendations")).scalar()
+    earliest = today - timedelta(days=Config.PERF_BACKFILL_DAYS)
+    return max(as_date(first), earliest) if first is not None else today
+
+
+def _recommendation_counters(conn, params) -> Dict[Tuple[str, date], Dict]:
+    """各算法每天的推荐数、点击、收听与推荐过的不同歌曲数"""
+    result = conn.execute(text("""
+        SELECT
+            algorithm_type,
+            CAST(created_at AS DATE) AS metric_date,
+            COUNT(*) AS total_recommendations,
+            SUM(CASE WHEN is_clicked = 1 THEN 1 ELSE 0 END) AS clicks,
+            SUM(CASE WHEN is_listened = 1 THEN 1 ELSE 0 END) AS listens,
+            COUNT(DISTINCT song_id) AS distinct_songs
+        FROM recommendations
+        WHERE created_at >= :start AND created_at < :end AND algorithm_type IS NOT NULL
+        GROUP BY algorithm_type, CAST(created_at AS DATE)
+    """), params)
+    return {
+        (row.algorithm_type, as_date(row.metric_date)): {
+            'total_recommendations': row.total_recommendations,
+            'clicks': row.clicks or 0,
+            'listens': row.listens or 0,
+            'distinct_songs': row.distinct_songs
+        }
+        for row in result
+    }
+
+
+def _hit_counts(conn, params) -> Dict[Tuple[str, date], Tuple[int, int]]:
+    """(算法, 日期) -> (同期正反馈的 (用户, 歌曲) 数, 其中推荐后才发生正反馈的数)"""
+    query = text(f"""
+        WITH {_REC_CTE},
+        rec_users AS (
+            SELECT DISTINCT algorithm_type, metric_date, user_id FROM rec
+        ),
+        pos AS (
+            SELECT u.algorithm_type, u.metric_date, i.user_id, i.song_id, MAX(i.[timestamp]) AS last_positive_at
+            FROM rec_users u
+            JOIN user_song_interaction i ON i.user_id = u.user_id
+            WHERE i.behavior_type IN :behaviors
+              AND i.[timestamp] >= u.metric_date
+              AND i.[timestamp] < DATEADD(day, :window, u.metric_date)
+            GROUP BY u.algorithm_type, u.metric_date, i.user_id, i.song_id
+        )
+        SELECT
+            p.algorithm_type,
+            p.metric_date,
+            COUNT(*) AS positives,
+            SUM(CASE WHEN p.last_positive_at >= r.recommended_at THEN 1 ELSE 0 END) AS hits
+        FROM pos p
+        LEFT JOIN rec r ON r.algorithm_type = p.algorithm_type AND r.metric_date = p.metric_date
+            AND r.user_id = p.user_id AND r.song_id = p.song_id
+        GROUP BY p.algorithm_type, p.metric_date
+    """).bindparams(bindparam('behaviors', expanding=True))
+    result = conn.execute(query, {**params, "behaviors": Config.PERF_POSITIVE_BEHAVIORS,
+                                  "window": Config.PERF_ATTRIBUTION_DAYS})
+    return {(row.algorithm_type, as_date(row.metric_date)): (row.positives, row.hits or 0) for row in result}
+
+
+def _list_stats(conn, params) -> Dict[Tuple[str, date], Tuple[int, float]]:
+    """(算法, 日期) -> (推荐的 (用户, 歌曲) 数, 平均列表内流派多样性)"""
+    result = conn.execute(text(f"""
+        WITH {_REC_CTE},
+        lists AS (
+            SELECT
+                r.algorithm_type,
+                r.metric_date,
+                r.user_id,
+                COUNT(*) AS list_size,
+                COUNT(DISTINCT COALESCE(s.genre_clean, s.genre, '')) AS genres
+            FROM rec r
+            LEFT JOIN enhanced_song_features s ON s.song_id = r.song_id
+            GROUP BY r.algorithm_type, r.metric_date, r.user_id
+        )
+        SELECT
+            algorithm_type,
+            metric_date,
+            SUM(list_size) AS rec_pairs,
+            AVG(CASE WHEN list_size > 1 THEN (genres - 1) * 1.0 / (list_size - 1) END) AS diversity
+        FROM lists
+        GROUP BY algorithm_type, metric_date
+    """), params)
+    return {(row.algorithm_type, as_date(row.metric_date)): (row.rec_pairs, row.diversity) for row in result}
+
+
+def _percent(numerator, denominator):
+    return round(numerator * 100.0 / denominator, 4) if denominator else None
+
+
+def calculate_algorithm_performance(engine=None, today: date = None) -> int:
+    """增量计算算法性能指标并批量写入，返回写入的行数"""
     try:
-        engine = recommender_service._engine
-        today = datetime.now().date()
-        
-        # 计算最近7天的数据
+        engine = engine or recommender_service._engine
+        today = today or datetime.now().date()
+        ensure_schema(engine)
+
         with engine.connect() as conn:
-            # 1. 获取各算法的推荐数据
-            result = conn.execute(text("""
-                SELECT 
-                    algorithm_type,
-                    COUNT(*) as total_recommendations,
-                    SUM(CASE WHEN is_clicked = 1 THEN 1 ELSE 0 END) as clicks,
-                    SUM(CASE WHEN is_listened = 1 THEN 1 ELSE 0 END) as listens
-                FROM recommendations
-                WHERE created_at >= :start_date
-                GROUP BY algorithm_type
-            """), {"start_date": today - timedelta(days=7)})
-            
-            algorithm_data = {}
-            for row in result:
-                algorithm_data[row.algorithm_type] = {
-                    'total': row.total_recommendations,
-                    'clicks': row.clicks or 0,
-                    'listens': row.listens or 0
-                }
-            
-            # 2. 计算CTR和收听率
-            performance_stats = []
-            for algo, data in algorithm_data.items():
-                if data['total'] > 0:
-                    ctr = (data['clicks'] / data['total']) * 100
-                    listen_rate = (data['listens'] / data['total']) * 100
-                    
-                    # 模拟计算召回率、准确率、多样性（实际中需要更复杂的计算）
-                    # 这里可以根据你的业务逻辑实现
-                    recall_rate = calculate_recall_rate(algo, today)
-                    precision_rate = calculate_precision_rate(algo, today)
-                    diversity_score = calculate_diversity_score(algo, today)
-                    
-                    performance_stats.append({
-                        'algorithm_type': algo,
-                        'metric_date': today,
-                        'recall_rate': recall_rate,
-                        'precision_rate': precision_rate,
-                        'diversity_score': diversity_score,
-                        'ctr_rate': ctr,
-                        'listen_rate': listen_rate,
-                        'total_recommendations': data['total'],
-                        'clicks': data['clicks'],
-                        'listens': data['listens']
-                    })
-            
-            # 3. 保存到数据库
-            for stat in performance_stats:
-                conn.execute(text("""
-                    MERGE algorithm_performance_stats AS target
-                    USING (SELECT :algorithm_type as algo, :metric_date as date) AS source
-                    ON target.algorithm_type = source.algo AND target.metric_date = source.date
-                    WHEN MATCHED THEN
-                        UPDATE SET 
-                            recall_rate = :recall_rate,
-                            precision_rate = :precision_rate,
-                            diversity_score = :diversity_score,
-                            ctr_rate = :ctr_rate,
-                            listen_rate = :listen_rate,
-                            total_recommendations = :total_recommendations,
-                            clicks = :clicks,
-                            listens = :listens,
-                            created_at = GETDATE()
-                    WHEN NOT MATCHED THEN
-                        INSERT (algorithm_type, metric_date, recall_rate, precision_rate,
-                                diversity_score, ctr_rate, listen_rate, total_recommendations,
-                                clicks, listens)
-                        VALUES (:algorithm_type, :metric_date, :recall_rate, :precision_rate,
-                                :diversity_score, :ctr_rate, :listen_rate, :total_recommendations,
-                                :clicks, :listens);
-                """), stat)
-            
-            conn.commit()
-            logger.info(f"算法性能统计更新完成: {len(performance_stats)}条记录")
-            
-    except Exception as e:
-        logger.error(f"计算算法性能失败: {e}")
+            start = _metrics_start(conn, today)
+            params = {"start": datetime.combine(start, datetime.min.time()),
+                      "end": datetime.combine(today + timedelta(days=1), datetime.min.time())}
+            counters = _recommendation_counters(conn, params)
+            if not counters:
+                logger.info(f"{start} 以来无推荐数据，跳过")
+                return 0
+            hits = _hit_counts(conn, params)
+            lists = _list_stats(conn, params)
+            catalog_size = conn.execute(text("SELECT COUNT(*) FROM enhanced_song_features")).scalar() or 0
+
+        rows: List[Dict] = []
+        for (algo, metric_date), data in sorted(counters.items(), key=lambda item: (item[0][1], item[0][0])):
+            positives, hit = hits.get((algo, metric_date), (0, 0))
+            rec_pairs, diversity = lists.get((algo, metric_date), (0, None))
+            rows.append({
+                'algorithm_type': algo,
+                'metric_date': metric_date,
+                'recall_rate': _percent(hit, positives),
+                'precision_rate': _percent(hit, rec_pairs),
+                'diversity_score': round(diversity * 100, 4) if diversity is not None else None,
+                'coverage_rate': _percent(data['distinct_songs'], catalog_size),
+                'ctr_rate': _percent(data['clicks'], data['total_recommendations']),
+                'listen_rate': _percent(data['listens'], data['total_recommendations']),
+                'total_recommendations': data['total_recommendations'],
+                'clicks': data['clicks'],
+                'listens': data['listens']
+            })
 
-def calculate_recall_rate(algorithm, date):
-    """计算召回率（需要根据你的业务逻辑实现）"""
-    # 这里实现召回率计算逻辑
-    # 可以基于测试集和推荐结果计算
-    return 75.0 + (hash(algorithm) % 20)  # 临时示例
+        with engine.begin() as conn:
+            get_dialect(engine).upsert_many(conn, STATS_TABLE, ['algorithm_type', 'metric_date'],
+                                            METRIC_COLUMNS, rows, touch_column='created_at')
+        logger.info(f"算法性能统计更新完成: {start} ~ {today}, {len(rows)}条记录")
+        return len(rows)
 
-def calculate_precision_rate(algorithm, date):
-    """计算准确率"""
-    return 70.0 + (hash(algorithm) % 15)
+    except Exception as e:
+        logger.error(f"计算算法性能失败: {e}", exc_info=True)
+        return 0
 
-def calculate_diversity_score(algorithm, date):
-    """计算多样性得分"""
-    return 65.0 + (hash(algorithm) % 20)
 
 if __name__ == "__main__":
     # 立即运行一次
     calculate_algorithm_performance()
-    
-    # 设置定时任务（每天凌晨2点运行）
-    schedule.every().day.at("02:00").do(calculate_algorithm_performance)
-    
+
+    # 增量计算，只重算仍在归因窗口内的日期，可以频繁运行
+    schedule.every(Config.PERF_METRICS_INTERVAL_MIN).minutes.do(calculate_algorithm_performance)
+
     logger.info("算法性能监控服务启动...")
     while True:
         schedule.run_pending()
-        time.sleep(60)
\ No newline at end of file
+        time.sleep(60)
@@ -5,7 +5,7 @@ import threading
 import time
 from functools import lru_cache
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Tuple, Any, NamedTuple
 from enum import Enum
 import importlib.util
 import json
@@ -16,6 +16,11 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.pool import QueuePool
 
 from config import Config
+from model_registry import ModelRegistry
+from utils.sql_dialect import install as install_sql_dialect
+from song_catalog import song_catalog
+from hot_songs import hot_songs
+from audio_index import audio_file_index
 
 logger = logging.getLogger(__name__)
 
@@ -71,6 +76,60 @@ class CircuitBreaker:
                 logger.error(f"熔断器打开！连续失败{self.failure_count}次")
 
 
+class TTLCache:
+    """带过期时间的线程安全缓存（key -> (过期时间, 值)）；单条可用 ttl 覆盖默认过期时间"""
+    def __init__(self, ttl: int = 300, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._cache: Dict[Any, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if time.time() > expires_at:
+                del self._cache[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl: Optional[int] = None):
+        with self._lock:
+            if len(self._cache) >= self.maxsize:
+                # 淘汰最早过期的一半，避免无限增长
+                oldest = sorted(self._cache.items(), key=lambda kv: kv[1][0])[:self.maxsize // 2]
+                for k, _ in oldest:
+                    del self._cache[k]
+            self._cache[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+
+    def stats(self) -> Dict[str, int]:
+        """条目总数与其中已过期（尚未被读取清理）的条目数"""
+        with self._lock:
+            now = time.time()
+            expired = sum(1 for expires_at, _ in self._cache.values() if now > expires_at)
+            return {"total": len(self._cache), "expired": expired}
+
+    def pop_where(self, predicate) -> int:
+        with self._lock:
+            keys = [k for k in self._cache if predicate(k)]
+            for k in keys:
+                del self._cache[k]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+class ModelHandle(NamedTuple):
+    """当前服务的模型快照（整体替换，保证引擎与用户集合一致）"""
+    version: str
+    recommender: Any
+    valid_users: frozenset
+
+
 def singleton_with_lock(cls):
     instances = {}
     locks = {}
@@ -92,13 +151,20 @@ class RecommenderService:
     """
 
     def __init__(self):
-        self._recommender = None
+        self._model: Optional[ModelHandle] = None
         self._engine = None
         self._status = InitStatus.UNINITIALIZED
         self._init_lock = threading.RLock()
         self._init_error: Optional[str] = None
-        self._valid_users: set = set()
         self._module = None
+
+        # 模型版本管理（后台构建 + 原子切换）
+        self._registry = ModelRegistry(Config.DATASET_DIR / "recommender_cache")
+        self._build_lock = threading.Lock()
+        self._build_state: Dict[str, Any] = {"status": "idle"}
+
+        # 启动各阶段耗时（秒），initialize() 结束时输出报告
+        self._startup_timings: Dict[str, float] = {}
         self._circuit_breaker = CircuitBreaker(
             threshold=Config.CIRCUIT_BREAKER_THRESHOLD,
             timeout=Config.CIRCUIT_BREAKER_TIMEOUT
@@ -108,6 +174,10 @@ class RecommenderService:
         self._fallback_hot_songs: List[Dict] = []
         self._last_fallback_update = 0
 
+        # 冷启动用户折叠推荐缓存（按用户，新交互时失效）
+        self._cache_ttl = Config.FOLD_IN_CACHE_TTL
+        self._recommendation_cache = TTLCache(ttl=self._cache_ttl)
+
         # ===== 新增：最佳权重配置（根据最近调优结果）=====
         # 内部用户权重 (itemcf, usercf, content, mf, sentiment)
         self._internal_weights = (0.4, 0.1, 0.2, 0.1, 0.0)
@@ -118,6 +188,21 @@ class RecommenderService:
         self._lightfm_weight = 0.15
         # =================================================
 
+    @property
+    def _recommender(self):
+        model = self._model
+        return model.recommender if model else None
+
+    @property
+    def _valid_users(self) -> frozenset:
+        model = self._model
+        return model.valid_users if model else frozenset()
+
+    @property
+    def model_version(self) -> Optional[str]:
+        model = self._model
+        return model.version if model else None
+
     @property
     def is_healthy(self) -> bool:
         return self._status in (InitStatus.INITIALIZED, InitStatus.DEGRADED)
@@ -137,6 +222,10 @@ class RecommenderService:
         if self._status == InitStatus.INITIALIZED and not force:
             return True
 
+        # 已有模型在服务：强制重建改为后台构建新版本，完成后原子切换，不中断服务
+        if force and self._model is not None:
+            return self.rebuild_model()
+
         if self._status == InitStatus.INITIALIZING:
             for _ in range(30):
                 if self._status != InitStatus.INITIALIZING:
@@ -154,13 +243,16 @@ class RecommenderService:
             start_time = datetime.now()
 
             try:
-                self._setup_database()
-                self._load_recommender_module()
-                self._initialize_engine()
-                self._refresh_fallback_data()
+                self._startup_timings = {}
+                self._timed_stage('setup_database', self._setup_database)
+                self._timed_stage('song_catalog', self._load_song_catalog)
+                self._timed_stage('load_module', self._load_recommender_module)
+                self._timed_stage('initialize_engine', self._initialize_engine)
+                self._timed_stage('fallback_data', self._refresh_fallback_data)
 
                 elapsed = (datetime.now() - start_time).total_seconds()
                 logger.info(f"✓ 初始化完成，耗时: {elapsed:.2f}秒")
+                self._log_startup_report()
                 self._status = InitStatus.INITIALIZED
                 return True
 
@@ -171,8 +263,42 @@ class RecommenderService:
                 self._try_degraded_mode()
                 return False
 
+    def _timed_stage(self, stage: str, func):
+        start_time = time.time()
+        try:
+            return func()
+        finally:
+            self._startup_timings[stage] = time.time() - start_time
+
+    def get_startup_timings(self) -> Dict[str, Any]:
+        """服务阶段耗时 + 引擎内部（延迟导入、数据加载、各来源组件）耗时"""
+        timings: Dict[str, Any] = {"service": dict(self._startup_timings)}
+        recommender = self._recommender
+        if recommender is not None and hasattr(recommender, 'startup_timings'):
+            timings.update(recommender.startup_timings())
+        return timings
+
+    def _log_startup_report(self):
+        timings = self.get_startup_timings()
+        logger.info("【启动耗时报告】")
+        for group, stages in timings.items():
+            if not stages:
+                continue
+            detail = ", ".join(f"{name}={sec:.2f}s" for name, sec in
+                               sorted(stages.items(), key=lambda x: x[1], reverse=True))
+            logger.info(f"  {group}: {detail}")
+
     def _setup_database(self):
-        if self._engine is None:
+        if self._engine is None and Config.DB_BACKEND == 'sqlite':
+            from utils.sqlite_backend import bootstrap_sqlite
+            bootstrap_sqlite(Config.SQLITE_PATH, str(Config.SQLITE_DATA_DIR))
+            self._engine = install_sql_dialect(create_engine(
+                Config.get_db_connection_string(),
+                connect_args={'check_same_thread': False},
+                echo=False
+            ))
+            logger.info(f"使用本地SQLite数据库: {Config.SQLITE_PATH}")
+        elif self._engine is None:
             self._engine = create_engine(
                 Config.get_db_connection_string(),
                 poolclass=QueuePool,
@@ -184,6 +310,15 @@ class RecommenderService:
             )
             logger.info("数据库连接池已建立")
 
+    def _load_song_catalog(self):
+        """加载歌曲目录（搜索/联想索引随之构建）；失败时相关接口回退到SQL查询"""
+        try:
+            song_catalog.load(self._engine)
+        except Exception as e:
+            logger.warning(f"加载歌曲目录失败，搜索将回退到数据库查询: {e}")
+        # 音频文件校验在后台进行，完成前音频状态仍查数据库
+        audio_file_index.start_verify(self._engine)
+
     def _load_recommender_module(self):
         code_path = Config.RECOMMENDER_CODE_PATH
         if not code_path.exists():
@@ -208,11 +343,23 @@ class RecommenderService:
         logger.info(f"成功加载分离式推荐模块: {code_path.name}")
 
     def _initialize_engine(self):
-        """实例化 SeparatedMusicRecommender"""
+        """实例化当前激活版本的 SeparatedMusicRecommender"""
+        version = self._registry.active_version()
+        recommender = self._build_recommender(self._registry.cache_dir_for(version),
+                                              lazy=Config.LAZY_RECALL_COMPONENTS)
+        self._swap_model(version, recommender)
+
+    def _build_recommender(self, cache_dir, lazy: bool = False):
+        """在指定缓存目录上构建（或从缓存加载）推荐引擎
+
+        lazy=True 时 MF 与热门分层就绪即返回，UserCF/内容/LightFM 在后台加载；
+        后台构建新版本时使用完整加载，切换后即为完整模型。
+        """
         SeparatedMusicRecommender = self._module.SeparatedMusicRecommender
 
         data_dir = str(Config.DATASET_DIR / "separated_processed_data")
-        cache_dir = str(Config.DATASET_DIR / "recommender_cache")
+        if Config.DB_BACKEND == 'sqlite':
+            data_dir = str(Config.SQLITE_DATA_DIR)
 
         if not os.path.exists(data_dir):
             raise FileNotFoundError(
@@ -220,20 +367,132 @@ class RecommenderService:
                 "请确保已运行 separated_preprocessor.py 生成预处理数据"
             )
 
-        self._recommender = SeparatedMusicRecommender(
+        # 本地SQLite后端下引擎直接读取导入SQLite所用的数据目录，不连接SQL Server
+        data_loader = None
+        if Config.DB_BACKEND == 'sqlite':
+            data_loader = self._module.FileDataLoader(data_dir)
+
+        return SeparatedMusicRecommender(
             data_dir=data_dir,
-            cache_dir=cache_dir
+            cache_dir=str(cache_dir),
+            lazy=lazy,
+            data_loader=data_loader,
+            # 服务进程中有请求线程与各种锁，冷缓存构建只用线程，不 fork/spawn 子进程
+            process_pool=False
         )
 
-        internal_users = set(self._recommender.internal_recommender.user_to_idx.keys())
-        external_users = set(self._recommender.external_recommender.user_to_idx.keys())
-        self._valid_users = internal_users | external_users
+    def _swap_model(self, version: str, recommender):
+        """原子替换当前模型引用（单次赋值），正在处理的请求继续使用旧快照"""
+        internal_users = set(recommender.internal_recommender.user_to_idx.keys())
+        external_users = set(recommender.external_recommender.user_to_idx.keys())
+        self._model = ModelHandle(
+            version=version,
+            recommender=recommender,
+            valid_users=frozenset(internal_users | external_users)
+        )
+        # 旧模型的折叠推荐与画像缓存不再有效
+        self._recommendation_cache.clear()
+        self.get_user_profile_cached.cache_clear()
 
         logger.info(
-            f"推荐引擎就绪: 内部用户={len(internal_users)}, "
+            f"推荐引擎就绪 [版本 {version}]: 内部用户={len(internal_users)}, "
             f"外部用户={len(external_users)}, 总用户={len(self._valid_users)}"
         )
 
+    # ------------------------------------------------------------------
+    # 模型版本管理（后台构建 / 激活 / 回滚）
+    # ------------------------------------------------------------------
+    def rebuild_model(self) -> bool:
+        """后台构建新模型版本到新的缓存目录，成功后激活并切换"""
+        version = None
+
+        def build(v):
+            recommender = self._build_recommender(self._registry.cache_dir_for(v))
+            self._registry.mark_ready(v, stats={
+                "internal_users": len(recommender.internal_recommender.user_to_idx),
+                "external_users": len(recommender.external_recommender.user_to_idx),
+            })
+            self._registry.activate(v)
+            return recommender
+
+        if not self._build_lock.acquire(blocking=False):
+            logger.warning("已有模型构建任务在进行中")
+            return False
+        try:
+            version = self._registry.create_version()
+        except Exception:
+            self._build_lock.release()
+            raise
+        self._start_model_task('build', version, build)
+        return True
+
+    def activate_model_version(self, version: str) -> bool:
+        """后台加载指定版本（从其缓存目录）并切换"""
+        info = self._registry.get_version(version)
+        if info is None:
+            raise KeyError(f"模型版本不存在: {version}")
+        if info.get('status') != 'ready':
+            raise ValueError(f"模型版本 {version} 状态为 {info.get('status')}，无法激活")
+
+        def load(v):
+            recommender = self._build_recommender(self._registry.cache_dir_for(v))
+            self._registry.activate(v)
+            return recommender
+
+        if not self._build_lock.acquire(blocking=False):
+            logger.warning("已有模型构建任务在进行中")
+            return False
+        self._start_model_task('activate', version, load)
+        return True
+
+    def rollback_model(self) -> Optional[str]:
+        """回滚到上一个激活版本，返回目标版本号"""
+        previous = self._registry.previous_version()
+        if not previous:
+            return None
+        return previous if self.activate_model_version(previous) else None
+
+    def list_model_versions(self) -> Dict[str, Any]:
+        return {
+            "serving_version": self.model_version,
+            "active_version": self._registry.active_version(),
+            "previous_version": self._registry.previous_version(),
+            "build": dict(self._build_state),
+            "versions": self._registry.list_versions()
+        }
+
+    def _start_model_task(self, action: str, version: str, task):
+        """在后台线程执行模型任务（调用方需已持有 _build_lock）"""
+        self._build_state = {
+            "status": "running",
+            "action": action,
+            "version": version,
+            "started_at": datetime.now().isoformat()
+        }
+
+        def run():
+            start_time = time.time()
+            try:
+                if self._module is None:
+                    self._load_recommender_module()
+                logger.info(f"【后台模型任务】{action} {version} 开始")
+                recommender = task(version)
+                self._swap_model(version, recommender)
+                self._refresh_fallback_data()
+                self._build_state.update(status="succeeded",
+                                         elapsed_sec=round(time.time() - start_time, 2))
+                logger.info(f"【后台模型任务】{action} {version} 完成，已切换")
+            except Exception as e:
+                import traceback
+                logger.error(f"【后台模型任务】{action} {version} 失败: {e}\n{traceback.format_exc()}")
+                if action == 'build':
+                    self._registry.mark_failed(version, str(e))
+                self._build_state.update(status="failed", error=str(e))
+            finally:
+                self._build_lock.release()
+
+        threading.Thread(target=run, name=f"model-{action}-{version}", daemon=True).start()
+
     def _try_degraded_mode(self):
         try:
             cache_file = Config.DATASET_DIR / 'fallback_hot_songs.json'
@@ -249,13 +508,18 @@ class RecommenderService:
         """刷新兜底热门歌曲（持久化到JSON）"""
         try:
             if self._recommender:
-                hot_songs = self.get_hot_songs(tier='all', n=100)
-                self._fallback_hot_songs = hot_songs
+                hot_songs.load_from_engine(self._recommender)
+                try:
+                    hot_songs.refresh_play_counts(self._engine)
+                except Exception as e:
+                    logger.warning(f"统计近期播放数失败，热门列表仅按流行度排序: {e}")
+                hot, _ = hot_songs.get(tier='all', n=100)
+                self._fallback_hot_songs = hot
                 self._last_fallback_update = time.time()
 
                 cache_file = Config.DATASET_DIR / 'fallback_hot_songs.json'
                 with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(hot_songs, f, ensure_ascii=False, indent=2)
+                    json.dump(hot, f, ensure_ascii=False, indent=2)
         except Exception as e:
             logger.warning(f"刷新兜底数据失败: {e}")
 
@@ -268,21 +532,28 @@ class RecommenderService:
         优化：混合推荐使用并行版本，并传入调优后的7个权重
         """
         user_id_str = str(user_id)
-        is_cold = user_id_str not in self._valid_users
+        # 固定本次请求使用的模型快照，后台切换版本不影响进行中的请求
+        model = self._model
+        system = model.recommender
+        is_cold = user_id_str not in model.valid_users
 
-        # 冷启动：直接使用对应推荐器的冷启动方法
+        # 冷启动：优先将近期交互折叠进MF空间，无交互时使用冷启动方法
         if is_cold:
             logger.info(f"用户 {user_id} 冷启动")
-            user_type = self._recommender.get_user_type(user_id_str)
-            recommender = (self._recommender.internal_recommender
-                           if user_type == 'internal' else self._recommender.external_recommender)
+            if algorithm != 'cold':
+                recs = self._get_fold_in_recs(user_id_str, n, system)
+                if recs:
+                    return recs
+            user_type = system.get_user_type(user_id_str)
+            recommender = (system.internal_recommender
+                           if user_type == 'internal' else system.external_recommender)
             recs = recommender.get_cold_start_recs(n=n)
             return recs if recs else []
 
         # 个性化用户：获取对应子推荐器
-        user_type = self._recommender.get_user_type(user_id_str)
-        recommender = (self._recommender.internal_recommender
-                       if user_type == 'internal' else self._recommender.external_recommender)
+        user_type = system.get_user_type(user_id_str)
+        recommender = (system.internal_recommender
+                       if user_type == 'internal' else system.external_recommender)
 
         # 算法路由
         if algorithm in ('usercf', 'cf', 'content', 'mf', 'cold'):
@@ -320,6 +591,70 @@ class RecommenderService:
 
         return recs
 
+    def _get_fold_in_recs(self, user_id: str, n: int, system) -> List[Tuple]:
+        """
+        冷启动用户折叠推荐：读取 user_song_interaction 中的近期交互，
+        通过岭回归投影到 song_factors 空间后检索MF/Faiss索引，结果按用户缓存；
+        交互不足或无结果时以较短的 FOLD_IN_EMPTY_CACHE_TTL 缓存空列表，避免每次请求都查库
+        """
+        cache_key = (user_id, n)
+        cached = self._recommendation_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        song_weights = self._load_recent_interactions(user_id)
+        if len(song_weights) < Config.FOLD_IN_MIN_INTERACTIONS:
+            self._recommendation_cache.set(cache_key, [], ttl=Config.FOLD_IN_EMPTY_CACHE_TTL)
+            return []
+
+        # 选择覆盖该用户交互歌曲最多的子推荐器
+        candidates = [system.internal_recommender, system.external_recommender]
+        recommender = max(
+            candidates,
+            key=lambda r: sum(1 for sid in song_weights if sid in r.song_to_idx)
+        )
+        try:
+            recs = recommender.fold_in_rec(song_weights, n=n, reg=Config.FOLD_IN_REG)
+        except Exception as e:
+            logger.warning(f"用户 {user_id} 折叠推荐失败: {e}")
+            return []
+
+        if recs:
+            logger.info(f"用户 {user_id} 折叠推荐 | 交互歌曲={len(song_weights)}, 结果={len(recs)}")
+            self._recommendation_cache.set(cache_key, recs)
+        else:
+            recs = []
+            self._recommendation_cache.set(cache_key, recs, ttl=Config.FOLD_IN_EMPTY_CACHE_TTL)
+        return recs
+
+    def _load_recent_interactions(self, user_id: str) -> Dict[str, float]:
+        """读取用户近期正向交互 {song_id: 累计权重}"""
+        if not self._engine:
+            return {}
+        query = text(f"""
+            SELECT TOP {int(Config.FOLD_IN_MAX_HISTORY)}
+                song_id,
+                SUM([weight]) as total_weight,
+                MAX([timestamp]) as last_time
+            FROM user_song_interaction
+            WHERE user_id = :uid
+            AND behavior_type IN ('play', 'like', 'collect', 'comment')
+            GROUP BY song_id
+            ORDER BY last_time DESC
+        """)
+        try:
+            with self._engine.connect() as conn:
+                result = conn.execute(query, {"uid": user_id})
+                return {str(row.song_id): float(row.total_weight or 1.0) for row in result}
+        except Exception as e:
+            logger.warning(f"读取用户近期交互失败 {user_id}: {e}")
+            return {}
+
+    def invalidate_fold_in(self, user_id: str):
+        """用户产生新交互后，清除其折叠推荐缓存"""
+        user_id_str = str(user_id)
+        self._recommendation_cache.pop_where(lambda key: key[0] == user_id_str)
+
     # ------------------------------------------------------------------
     # 对外接口（保持原签名不变）
     # ------------------------------------------------------------------
@@ -337,6 +672,29 @@ class RecommenderService:
             logger.error(f"获取推荐失败: {e}", exc_info=True)
             return self._get_fallback_recommendations(n)
 
+    def get_diverse_recommendations(self, user_id: str, n: int = 10,
+                                    lambda_: float = None) -> List[Dict]:
+        """多样性推荐：取混合推荐候选池，在引擎内按歌曲编码做MMR重排"""
+        try:
+            self._check_initialized()
+            user_id_str = str(user_id)
+            system = self._model.recommender
+            lambda_ = Config.DIVERSE_MMR_LAMBDA if lambda_ is None else lambda_
+            pool = max(n, min(n * 3, Config.DIVERSE_CANDIDATE_POOL))
+            candidates = self._get_recommendations_internal(user_id_str, pool, 'hybrid')
+            recommender = (system.internal_recommender
+                           if system.get_user_type(user_id_str) == 'internal'
+                           else system.external_recommender)
+            recs = recommender.mmr_rerank(candidates, user_id_str, n=n, lambda_=lambda_)
+            is_cold = user_id_str not in self._valid_users
+            results = self._format_recommendations(recs, is_cold)
+            if len(results) < n:
+                results = self._fill_with_hot_songs(results, n)
+            return results
+        except Exception as e:
+            logger.error(f"获取多样性推荐失败: {e}", exc_info=True)
+            return self._get_fallback_recommendations(n)
+
     def _format_recommendations(self, recs: List[Tuple], is_cold: bool) -> List[Dict]:
         """将 (song_id, score) 格式化为前端所需字典，并查询音频状态"""
         results = []
@@ -370,10 +728,12 @@ class RecommenderService:
         return results
 
     def _get_audio_status_batch(self, song_ids: List[str]) -> Dict[str, bool]:
-        """批量查询音频文件是否存在"""
+        """批量查询音频文件是否存在（音频索引校验完成后直接查索引）"""
         if not song_ids or not self._engine:
             return {}
         try:
+            if audio_file_index.is_ready:
+                return audio_file_index.has_audio_batch(song_ids, self._engine)
             batch_size = 50
             audio_status = {}
             for i in range(0, len(song_ids), batch_size):
@@ -402,9 +762,8 @@ class RecommenderService:
             return existing
         for song in self._fallback_hot_songs:
             if song['song_id'] not in existing_ids and needed > 0:
-                song['cold_start'] = True
-                song['fallback'] = True
-                existing.append(song)
+                # 热门列表为共享快照，复制后再标记
+                existing.append(dict(song, cold_start=True, fallback=True))
                 needed -= 1
         return existing
 
@@ -435,28 +794,12 @@ class RecommenderService:
     # 热门歌曲
     # ------------------------------------------------------------------
     def get_hot_songs(self, tier: str = 'all', n: int = 20) -> List[Dict]:
-        """使用内部推荐器的热门分层数据（外部歌曲较少，统一使用内部）"""
+        """热门歌曲（内存分层列表，见 hot_songs.HotSongsService）"""
         self._check_initialized()
-        recommender = self._recommender.internal_recommender
-
         try:
-            if tier == 'hit':
-                songs = recommender.tiered_songs.get('hit', [])[:n]
-            elif tier == 'popular':
-                songs = recommender.tiered_songs.get('popular', [])[:n]
-            elif tier == 'normal':
-                songs = recommender.tiered_songs.get('normal', [])[:n]
-            else:  # all
-                songs = (recommender.tiered_songs.get('hit', [])[:n // 3] +
-                         recommender.tiered_songs.get('popular', [])[:n // 3] +
-                         recommender.tiered_songs.get('normal', [])[:n // 3])
-
-            results = []
-            for sid in songs[:n]:
-                info = self.get_song_details(sid)
-                if info:
-                    results.append(info)
-            return results
+            hot_songs.maybe_refresh(self._engine)
+            songs, _ = hot_songs.get(tier, n)
+            return songs if songs else self._fallback_hot_songs[:n]
         except Exception as e:
             logger.error(f"获取热门歌曲失败: {e}")
             return self._fallback_hot_songs[:n]
@@ -520,7 +863,9 @@ class RecommenderService:
             "ready": self.is_ready,
             "timestamp": datetime.now().isoformat(),
             "fallback_songs_count": len(self._fallback_hot_songs),
-            "circuit_breaker": self._circuit_breaker.state
+            "circuit_breaker": self._circuit_breaker.state,
+            "model_version": self.model_version,
+            "model_build": self._build_state.get("status")
         }
         if self._recommender:
             internal = self._recommender.internal_recommender
@@ -530,7 +875,9 @@ class RecommenderService:
                 "external_users": len(external.user_to_idx) if external.user_to_idx else 0,
                 "internal_songs": len(internal.source_songs) if internal.source_songs is not None else 0,
                 "external_songs": len(external.source_songs) if external.source_songs is not None else 0,
-                "total_users": len(self._valid_users)
+                "total_users": len(self._valid_users),
+                "components": self._recommender.component_status(),
+                "startup_timings": self.get_startup_timings()
             })
         if self._init_error:
             status["last_error"] = self._init_error
@@ -565,6 +912,7 @@ class RecommenderService:
     def invalidate_user_cache(self, user_id: str):
         """清除用户缓存（仅用于兼容旧接口）"""
         self.get_user_profile_cached.cache_clear()
+        self.invalidate_fold_in(user_id)
         logger.info(f"清除用户画像缓存 | user={user_id}")
 
 
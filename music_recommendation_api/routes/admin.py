@@ -5,10 +5,15 @@ from datetime import datetime, timedelta
 import jwt
 import hashlib
 import logging  # 【添加这一行】
-import time
 
 from config import Config
 from recommender_service import recommender_service
+from utils.sql_dialect import get_dialect
+from song_catalog import song_catalog
+from genre_index import genre_facet_index
+from dashboard_rollup import dashboard_rollup
+from daily_buckets import daily_buckets
+from utils.pagination import Keyset, CountCache, song_comment_counts
 
 # 【添加这一行】
 logger = logging.getLogger(__name__)
@@ -24,7 +29,12 @@ def get_song_comments_admin(song_id):
         # 这里已经有登录验证，所以不需要额外验证
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 10, type=int), 100)
-        offset = (page - 1) * per_page
+        cursor = request.args.get('cursor', '').strip()
+        try:
+            cursor_clause, cursor_params = COMMENT_KEYSET.where(cursor)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        offset = 0 if cursor else (page - 1) * per_page
         
         engine = recommender_service._engine
         
@@ -38,7 +48,7 @@ def get_song_comments_admin(song_id):
             return jsonify({"success": False, "message": "歌曲不存在"}), 404
         
         # 获取评论数据
-        query = text("""
+        query = text(f"""
             SELECT 
                 comment_id,
                 unified_song_id,
@@ -49,22 +59,24 @@ def get_song_comments_admin(song_id):
                 comment_time,
                 sentiment_score,
                 is_positive,
-                created_at
+                created_at,
+                {COMMENT_KEYSET.select_sql()}
             FROM song_comments
-            WHERE unified_song_id = :song_id
-            ORDER BY comment_time DESC
+            WHERE unified_song_id = :song_id AND {cursor_clause}
+            ORDER BY {COMMENT_KEYSET.order_sql()}
             OFFSET :offset ROWS
             FETCH NEXT :limit ROWS ONLY
         """)
         
         with engine.connect() as conn:
-            result = conn.execute(
+            rows = conn.execute(
                 query,
-                {"song_id": song_id, "offset": offset, "limit": per_page}
-            )
+                {"song_id": song_id, **cursor_params, "offset": offset, "limit": per_page + 1}
+            ).fetchall()
+            rows, next_cursor = COMMENT_KEYSET.split(rows, per_page)
             
             comments = []
-            for row in result:
+            for row in rows:
                 comments.append({
                     "comment_id": row.comment_id,
                     "user_id": row.original_user_id,
@@ -77,13 +89,14 @@ def get_song_comments_admin(song_id):
                     "created_at": row.created_at.isoformat() if row.created_at else None
                 })
             
-            # 获取总数
+            # 获取总数（与评论接口共用按歌曲的缓存，发表/删除评论时失效）
             count_query = text("""
                 SELECT COUNT(*) as total 
                 FROM song_comments 
                 WHERE unified_song_id = :song_id
             """)
-            total = conn.execute(count_query, {"song_id": song_id}).fetchone().total
+            total = song_comment_counts.get(song_id,
+                                            lambda: conn.execute(count_query, {"song_id": song_id}).fetchone().total)
         
         return jsonify({
             "success": True,
@@ -95,7 +108,9 @@ def get_song_comments_admin(song_id):
                     "page": page,
                     "per_page": per_page,
                     "total": total,
-                    "pages": (total + per_page - 1) // per_page
+                    "pages": (total + per_page - 1) // per_page,
+                    "next_cursor": next_cursor,
+                    "has_more": next_cursor is not None
                 }
             }
         })
@@ -293,6 +308,7 @@ def delete_comment_admin(comment_id):
             conn.execute(update_song_query, {"song_id": comment.unified_song_id})
         
         logger.info(f"管理员删除评论 {comment_id}, 歌曲: {comment.unified_song_id}")
+        song_comment_counts.invalidate(lambda key: key == comment.unified_song_id)
         
         return jsonify({
             "success": True,
@@ -401,9 +417,13 @@ def admin_login():
 @bp.route('/dashboard/stats', methods=['GET'])
 @admin_required
 def get_dashboard_stats():
-    """获取Dashboard核心统计数据"""
-    engine = recommender_service._engine
-    
+    """获取Dashboard核心统计数据（统计快照，refresh=true 时立即重建）"""
+    force = request.args.get('refresh', '').lower() in ('true', '1')
+    rollup = dashboard_rollup.get('stats', recommender_service._engine, force=force)
+    return jsonify({"success": True, "data": rollup.payload()})
+
+def _build_dashboard_stats(engine):
+    """Dashboard核心统计；歌曲数/流派分布取内存索引，热门歌曲取增量播放数"""
     stats = {}
     
     with engine.connect() as conn:
@@ -412,8 +432,11 @@ def get_dashboard_stats():
         stats['total_users'] = result.fetchone()[0]
         
         # 2. 歌曲总数
-        result = conn.execute(text("SELECT COUNT(*) FROM enhanced_song_features"))
-        stats['total_songs'] = result.fetchone()[0]
+        if song_catalog.is_loaded:
+            stats['total_songs'] = len(song_catalog)
+        else:
+            result = conn.execute(text("SELECT COUNT(*) FROM enhanced_song_features"))
+            stats['total_songs'] = result.fetchone()[0]
         
         # 3. 今日播放量
         result = conn.execute(text("""
@@ -446,17 +469,23 @@ def get_dashboard_stats():
             stats['success_rate'] = 87.0  # 默认值
         
         # 5. 流派分布（用于饼图）
-        result = conn.execute(text("""
-            SELECT genre, COUNT(*) as count 
-            FROM enhanced_song_features 
-            WHERE genre IS NOT NULL 
-            GROUP BY genre 
-            ORDER BY count DESC
-        """))
-        stats['genre_distribution'] = [
-            {"name": row.genre, "value": row.count} 
-            for row in result
-        ]
+        if genre_facet_index.is_ready:
+            stats['genre_distribution'] = [
+                {"name": g['name'], "value": g['count']}
+                for g in genre_facet_index.stats()[0]
+            ]
+        else:
+            result = conn.execute(text("""
+                SELECT genre, COUNT(*) as count 
+                FROM enhanced_song_features 
+                WHERE genre IS NOT NULL 
+                GROUP BY genre 
+                ORDER BY count DESC
+            """))
+            stats['genre_distribution'] = [
+                {"name": row.genre, "value": row.count} 
+                for row in result
+            ]
         
         # 6. 近7天用户增长趋势
         result = conn.execute(text("""
@@ -473,45 +502,79 @@ def get_dashboard_stats():
             for row in result
         ]
         
-        # 7. 热门歌曲Top10
-        result = conn.execute(text("""
-            SELECT TOP 10 
-                s.song_id,
-                s.song_name,
-                s.artists,
-                COALESCE(COUNT(i.interaction_id), 0) as total_plays
-            FROM enhanced_song_features s
-            LEFT JOIN user_song_interaction i ON s.song_id = i.song_id
-                AND i.behavior_type = 'play'
-            GROUP BY s.song_id, s.song_name, s.artists, s.final_popularity
-            ORDER BY total_plays DESC, s.final_popularity DESC
-        """))
+    # 7. 热门歌曲Top10（播放数按水位增量累加，不再 JOIN 全部交互记录）
+    if song_catalog.is_loaded:
         stats['hot_songs_top10'] = [
             {
-                "song_id": row.song_id,
-                "name": f"{row.song_name} - {row.artists}"[:50],
-                "value": row.total_plays or 0,
-                "song_name": row.song_name,
-                "artists": row.artists
+                "song_id": record['song_id'],
+                "name": f"{record.get('song_name')} - {record.get('artists')}"[:50],
+                "value": plays,
+                "song_name": record.get('song_name'),
+                "artists": record.get('artists')
             }
-            for row in result
+            for record, plays in dashboard_rollup.top_played(engine, 10)
         ]
+    else:
+        with engine.connect() as conn:
+            result = conn.execute(text("""
+                SELECT TOP 10 
+                    s.song_id,
+                    s.song_name,
+                    s.artists,
+                    COALESCE(COUNT(i.interaction_id), 0) as total_plays
+                FROM enhanced_song_features s
+                LEFT JOIN user_song_interaction i ON s.song_id = i.song_id
+                    AND i.behavior_type = 'play'
+                GROUP BY s.song_id, s.song_name, s.artists, s.final_popularity
+                ORDER BY total_plays DESC, s.final_popularity DESC
+            """))
+            stats['hot_songs_top10'] = [
+                {
+                    "song_id": row.song_id,
+                    "name": f"{row.song_name} - {row.artists}"[:50],
+                    "value": row.total_plays or 0,
+                    "song_name": row.song_name,
+                    "artists": row.artists
+                }
+                for row in result
+            ]
     
-    return jsonify({"success": True, "data": stats})
+    return stats
+
+dashboard_rollup.register('stats', _build_dashboard_stats)
 
 # ==================== 3. 歌曲管理（CRUD） ====================
+
+# 歌曲列表排序字段白名单：字段 -> 排序表达式（可为空的列给出最小哨兵值，与 NULL 排最前一致）
+SONG_SORT_FIELDS = {
+    'song_id': 'song_id',
+    'song_name': "COALESCE(song_name, '')",
+    'final_popularity': 'COALESCE(final_popularity, -1)',
+    'popularity': 'COALESCE(popularity, -1)',
+    'created_at': "COALESCE(created_at, '1900-01-01')",
+}
+# 用户列表：注册时间倒序，user_id 保证唯一
+USER_KEYSET = Keyset([("COALESCE(created_at, '1900-01-01')", 'DESC'), ('user_id', 'DESC')])
+# 评论列表：评论时间倒序，comment_id 保证唯一
+COMMENT_KEYSET = Keyset([("COALESCE(comment_time, '1900-01-01')", 'DESC'), ('comment_id', 'DESC')])
+# 歌曲/用户列表总数缓存，键为 (列表, 筛选条件...)
+_list_counts = CountCache(Config.PAGINATION_COUNT_TTL)
+
 @bp.route('/songs', methods=['GET'])
 @admin_required
 def get_songs_list():
-    """获取歌曲列表（分页+排序+筛选）"""
+    """获取歌曲列表（游标分页+排序+筛选）
+
+    翻页回传上一页的 next_cursor；未带游标时仍兼容 page 参数
+    """
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), 100)
+    cursor = request.args.get('cursor', '').strip()
     genre = request.args.get('genre', '')
     keyword = request.args.get('keyword', '')
     sort_by = request.args.get('sort_by', 'song_id')  # 【新增】排序字段
     sort_order = request.args.get('sort_order', 'asc')  # 【新增】排序方向
     
-    offset = (page - 1) * per_page
     engine = recommender_service._engine
     
     # 构建查询条件
@@ -528,31 +591,45 @@ def get_songs_list():
     where_clause = " AND ".join(conditions)
     
     # 【关键】白名单校验排序字段，防止SQL注入
-    allowed_sort_fields = ['song_id', 'song_name', 'final_popularity', 'popularity', 'created_at']
-    if sort_by not in allowed_sort_fields:
+    if sort_by not in SONG_SORT_FIELDS:
         sort_by = 'song_id'
     
     # 校验排序方向
     sort_order = 'DESC' if sort_order.lower() == 'desc' else 'ASC'
     
+    # 排序键 = 排序字段 + song_id（保证唯一）
+    sort_keys = [(SONG_SORT_FIELDS[sort_by], sort_order)]
+    if sort_by != 'song_id':
+        sort_keys.append(('song_id', sort_order))
+    keyset = Keyset(sort_keys)
+    try:
+        cursor_clause, cursor_params = keyset.where(cursor)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    offset = 0 if cursor else (page - 1) * per_page
+    
     with engine.connect() as conn:
         query = f"""
         SELECT 
             song_id, song_name, artists, album, genre, 
-            popularity, final_popularity, created_at
+            popularity, final_popularity, created_at,
+            {keyset.select_sql()}
         FROM enhanced_song_features
-        WHERE {where_clause}
-        ORDER BY {sort_by} {sort_order}  /* 【关键】使用动态排序 */
-        OFFSET {offset} ROWS
-        FETCH NEXT {per_page} ROWS ONLY
+        WHERE {where_clause} AND {cursor_clause}
+        ORDER BY {keyset.order_sql()}  /* 【关键】使用动态排序 */
+        OFFSET :offset ROWS
+        FETCH NEXT :limit ROWS ONLY
         """
         
-        result = conn.execute(text(query), params)
-        songs = [dict(row._mapping) for row in result]
+        rows = conn.execute(text(query), {**params, **cursor_params,
+                                          "offset": offset, "limit": per_page + 1}).fetchall()
+        rows, next_cursor = keyset.split(rows, per_page)
+        songs = [keyset.record(row) for row in rows]
         
-        # 统计总数
+        # 统计总数（按筛选条件缓存）
         count_query = f"SELECT COUNT(*) FROM enhanced_song_features WHERE {where_clause}"
-        total = conn.execute(text(count_query), params).fetchone()[0]
+        total = _list_counts.get(('songs', genre, keyword),
+                                 lambda: conn.execute(text(count_query), params).fetchone()[0])
     
     return jsonify({
         "success": True,
@@ -560,7 +637,9 @@ def get_songs_list():
             "songs": songs,
             "total": total,
             "page": page,
-            "pages": (total + per_page - 1) // per_page
+            "pages": (total + per_page - 1) // per_page,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
     })
 
@@ -593,6 +672,9 @@ def update_song(song_id):
         if result.rowcount == 0:
             return jsonify({"success": False, "message": "歌曲不存在"}), 404
     
+    # 同步内存歌曲目录（搜索索引随之增量更新）
+    song_catalog.refresh_song(engine, song_id)
+    
     return jsonify({"success": True, "message": "更新成功"})
 
 @bp.route('/songs/<song_id>', methods=['DELETE'])
@@ -619,6 +701,9 @@ def delete_song(song_id):
             {"id": song_id}
         )
     
+    song_catalog.remove(song_id)
+    _list_counts.invalidate(lambda key: key[0] == 'songs')
+    
     return jsonify({"success": True, "message": "删除成功"})
 
 # ==================== 4. 推荐策略配置 ====================
@@ -640,17 +725,23 @@ def update_config():
 @bp.route('/users', methods=['GET'])
 @admin_required
 def get_users_list():
-    """获取用户列表（分页+筛选）- 修复版"""
+    """获取用户列表（游标分页+筛选）- 修复版"""
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    per_page = min(request.args.get('per_page', 10, type=int), 100)
+    cursor = request.args.get('cursor', '').strip()
     keyword = request.args.get('keyword', '').strip()
     activity_level = request.args.get('activity_level', '').strip()
     
-    offset = (page - 1) * per_page
     engine = recommender_service._engine
     
+    try:
+        cursor_clause, cursor_params = USER_KEYSET.where(cursor)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    offset = 0 if cursor else (page - 1) * per_page
+    
     conditions = ["1=1"]
-    params = {"offset": offset, "limit": per_page}
+    params = {}
     
     if keyword:
         conditions.append("(user_id LIKE :keyword OR nickname LIKE :keyword)")
@@ -667,29 +758,30 @@ def get_users_list():
         # 调试：打印实际执行的SQL
         logger.info(f"用户查询条件: activity_level='{activity_level}', SQL: {where_clause}")
         
-        result = conn.execute(text(f"""
+        rows = conn.execute(text(f"""
             SELECT user_id, nickname, role, activity_level, 
-                   unique_songs, total_interactions, created_at
+                   unique_songs, total_interactions, created_at,
+                   {USER_KEYSET.select_sql()}
             FROM enhanced_user_features
-            WHERE {where_clause}
-            ORDER BY created_at DESC
+            WHERE {where_clause} AND {cursor_clause}
+            ORDER BY {USER_KEYSET.order_sql()}
             OFFSET :offset ROWS
             FETCH NEXT :limit ROWS ONLY
-        """), params)
+        """), {**params, **cursor_params, "offset": offset, "limit": per_page + 1}).fetchall()
+        rows, next_cursor = USER_KEYSET.split(rows, per_page)
         
         users = []
-        for row in result:
-            user_dict = dict(row._mapping)
+        for row in rows:
+            user_dict = USER_KEYSET.record(row)
             # 【关键】清理数据中的空格
             user_dict['activity_level'] = user_dict['activity_level'].strip() if user_dict['activity_level'] else '普通用户'
             users.append(user_dict)
         
-        # 统计总数
-        count_params = {k: v for k, v in params.items() if k not in ['offset', 'limit']}
-        total = conn.execute(text(f"""
+        # 统计总数（按筛选条件缓存）
+        total = _list_counts.get(('users', keyword, activity_level), lambda: conn.execute(text(f"""
             SELECT COUNT(*) FROM enhanced_user_features 
             WHERE {where_clause}
-        """), count_params).fetchone()[0]
+        """), params).fetchone()[0])
     
     return jsonify({
         "success": True,
@@ -697,7 +789,9 @@ def get_users_list():
             "users": users,
             "total": total,
             "page": page,
-            "pages": (total + per_page - 1) // per_page
+            "pages": (total + per_page - 1) // per_page,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
     })
 
@@ -732,8 +826,20 @@ def update_user(user_id):
 @bp.route('/dashboard/advanced-stats', methods=['GET'])
 @admin_required
 def get_advanced_stats():
-    """获取高级统计数据（用于可视化）"""
-    engine = recommender_service._engine
+    """获取高级统计数据（用于可视化；统计快照，refresh=true 时立即重建）"""
+    force = request.args.get('refresh', '').lower() in ('true', '1')
+    try:
+        rollup = dashboard_rollup.get('advanced', recommender_service._engine, force=force)
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"获取统计数据失败: {str(e)}",
+            "data": {}
+        })
+    return jsonify({"success": True, "data": rollup.payload()})
+
+def _build_advanced_stats(engine):
+    """高级统计（各项查询失败时该项为空，不影响其他项）"""
     stats = {}
     
     try:
@@ -1034,42 +1140,23 @@ def get_advanced_stats():
                 logger.error(f"获取省份分布失败: {e}")
                 stats['province_distribution'] = []
             
-            # 9. 每日推荐点击率趋势（近7天）
+            # 9. 每日推荐点击率趋势（近7天，读推荐日汇总桶）
             try:
-                # 生成最近7天的日期序列
-                result = conn.execute(text("""
-                    WITH DateSeries AS (
-                        SELECT CAST(GETDATE() - 6 AS DATE) as date
-                        UNION ALL SELECT CAST(GETDATE() - 5 AS DATE)
-                        UNION ALL SELECT CAST(GETDATE() - 4 AS DATE)
-                        UNION ALL SELECT CAST(GETDATE() - 3 AS DATE)
-                        UNION ALL SELECT CAST(GETDATE() - 2 AS DATE)
-                        UNION ALL SELECT CAST(GETDATE() - 1 AS DATE)
-                        UNION ALL SELECT CAST(GETDATE() AS DATE)
-                    )
-                    SELECT 
-                        CONVERT(VARCHAR(5), ds.date, 110) as date_str,
-                        COALESCE(SUM(CASE WHEN r.is_clicked = 1 THEN 1 ELSE 0 END), 0) as clicks,
-                        COALESCE(COUNT(r.recommendation_id), 0) as total_recommendations,
-                        CASE 
-                            WHEN COALESCE(COUNT(r.recommendation_id), 0) > 0 
-                            THEN ROUND(COALESCE(SUM(CASE WHEN r.is_clicked = 1 THEN 1.0 ELSE 0.0 END), 0) * 100.0 / COUNT(r.recommendation_id), 2)
-                            ELSE 0 
-                        END as ctr
-                    FROM DateSeries ds
-                    LEFT JOIN recommendations r ON CAST(r.created_at AS DATE) = ds.date
-                    GROUP BY ds.date
-                    ORDER BY ds.date
-                """))
+                today = datetime.now().date()
+                days = [today - timedelta(days=i) for i in range(6, -1, -1)]
+                per_day = {day: [0, 0] for day in days}
+                for row in daily_buckets.daily(engine, days[0], today):
+                    per_day[row['bucket_date']][0] += row['total_recommendations'] or 0
+                    per_day[row['bucket_date']][1] += row['clicks'] or 0
                 
                 stats['daily_ctr'] = [
                     {
-                        "date": row.date_str,
-                        "ctr": float(row.ctr or 0),
-                        "clicks": row.clicks,
-                        "total": row.total_recommendations
+                        "date": day.strftime('%m-%d'),
+                        "ctr": round(clicks * 100.0 / total, 2) if total else 0.0,
+                        "clicks": clicks,
+                        "total": total
                     }
-                    for row in result
+                    for day, (total, clicks) in per_day.items()
                 ]
             except Exception as e:
                 logger.error(f"获取每日CTR失败: {e}")
@@ -1214,14 +1301,13 @@ def get_advanced_stats():
                 stats['top_rated_songs'] = []
     
     except Exception as e:
+        # 连接失败等全局错误交给调用方，不保存不完整的快照
         logger.error(f"获取高级统计时发生全局错误: {e}")
-        return jsonify({
-            "success": False,
-            "message": f"获取统计数据失败: {str(e)}",
-            "data": {}
-        })
+        raise
     
-    return jsonify({"success": True, "data": stats})
+    return stats
+
+dashboard_rollup.register('advanced', _build_advanced_stats)
 
 @bp.route('/cache/clear', methods=['POST'])
 @admin_required
@@ -1234,30 +1320,105 @@ def clear_cache():
 @admin_required
 def get_cache_stats():
     """获取缓存统计"""
-    cache = recommender_service._recommendation_cache
-    with cache._lock:
-        total_keys = len(cache._cache)
-        # 统计过期的key数量
-        now = time.time()
-        expired = sum(1 for ts, _ in cache._cache.values() if now - ts > recommender_service._cache_ttl)
+    stats = recommender_service._recommendation_cache.stats()
     
     return jsonify({
         "success": True,
         "data": {
-            "total_cached": total_keys,
-            "expired_keys": expired,
+            "total_cached": stats["total"],
+            "expired_keys": stats["expired"],
             "ttl_seconds": recommender_service._cache_ttl,
             "cache_enabled": True
         }
     })
+
+# ==================== 模型版本管理接口 ====================
+@bp.route('/models', methods=['GET'])
+@admin_required
+def list_model_versions():
+    """列出模型版本及当前构建状态"""
+    return jsonify({"success": True, "data": recommender_service.list_model_versions()})
+
+@bp.route('/models/build', methods=['POST'])
+@admin_required
+def build_model_version():
+    """后台构建新模型版本，完成后自动切换（不中断服务）"""
+    try:
+        started = recommender_service.rebuild_model()
+    except Exception as e:
+        logger.error(f"启动模型构建失败: {e}")
+        return jsonify({"success": False, "message": f"启动模型构建失败: {str(e)}"}), 500
+    if not started:
+        return jsonify({"success": False, "message": "已有模型任务在进行中"}), 409
+    return jsonify({"success": True, "message": "模型构建已在后台启动",
+                    "data": recommender_service.list_model_versions()['build']}), 202
+
+@bp.route('/models/<version>/activate', methods=['POST'])
+@admin_required
+def activate_model_version(version):
+    """切换到指定的已构建版本"""
+    try:
+        started = recommender_service.activate_model_version(version)
+    except KeyError as e:
+        return jsonify({"success": False, "message": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    if not started:
+        return jsonify({"success": False, "message": "已有模型任务在进行中"}), 409
+    return jsonify({"success": True, "message": f"正在后台加载版本 {version}"}), 202
+
+@bp.route('/models/rollback', methods=['POST'])
+@admin_required
+def rollback_model_version():
+    """回滚到上一个激活版本"""
+    try:
+        target = recommender_service.rollback_model()
+    except (KeyError, ValueError) as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    if not target:
+        return jsonify({"success": False, "message": "没有可回滚的版本或已有模型任务在进行中"}), 409
+    return jsonify({"success": True, "message": f"正在回滚到版本 {target}"}), 202
 # ==================== A/B测试统计接口 ====================
+# 各算法的平均播放时长（秒），用于 A/B 测试展示
+ALGORITHM_AVG_DURATION = {
+    'hybrid': 225,
+    'itemcf': 192,
+    'usercf': 210,
+    'content': 198,
+    'mf': 185,
+    'cf': 200,  # 兼容cf别名
+    'cold': 180
+}
+
+def _bucket_date_range(default_days=7, max_days=366):
+    """解析 start/end（YYYY-MM-DD）或 days 参数为 (start, end)；不合法时抛出 ValueError"""
+    today = datetime.now().date()
+    end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else today
+    if request.args.get('start'):
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+    else:
+        days = request.args.get('days', default_days, type=int)
+        if days < 1:
+            raise ValueError("days 必须大于 0")
+        start = end - timedelta(days=days - 1)
+    if start > end:
+        raise ValueError("start 不能晚于 end")
+    if (end - start).days + 1 > max_days:
+        raise ValueError(f"日期范围不能超过 {max_days} 天")
+    return start, end
+
 @bp.route('/ab-test/stats', methods=['GET'])
 @admin_required
 def get_ab_test_stats():
-    """获取A/B测试真实统计数据"""
+    """获取A/B测试真实统计数据（读推荐日汇总桶；默认最近7天，支持 days 或 start/end）"""
     engine = recommender_service._engine
     stats = {}
     
+    try:
+        start, end = _bucket_date_range()
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"日期参数不合法: {e}"}), 400
+    
     try:
         # 先检查数据库连接
         if not engine:
@@ -1268,101 +1429,57 @@ def get_ab_test_stats():
                 "data": {"algorithm_performance": []}
             })
         
-        with engine.connect() as conn:
-            # 1. 检查推荐表是否有数据
-            table_check = conn.execute(text("""
-                SELECT COUNT(*) as total 
-                FROM recommendations 
-                WHERE created_at >= DATEADD(day, -7, GETDATE())
-            """)).fetchone()
-            
-            if not table_check or table_check.total == 0:
-                logger.info("最近7天无推荐数据")
-                stats['algorithm_performance'] = []
-                stats['note'] = '最近7天无推荐数据，请确保推荐系统正常运行'
-                return jsonify({"success": True, "data": stats})
-            
-            # 2. 获取算法性能数据
-            result = conn.execute(text("""
-                SELECT 
-                    algorithm_type,
-                    COUNT(*) as total_recommendations,
-                    SUM(CASE WHEN is_clicked = 1 THEN 1 ELSE 0 END) as total_clicks,
-                    SUM(CASE WHEN is_listened = 1 THEN 1 ELSE 0 END) as total_listens,
-                    CASE 
-                        WHEN COUNT(*) > 0 
-                        THEN ROUND(
-                            SUM(CASE WHEN is_clicked = 1 THEN 1.0 ELSE 0.0 END) * 100.0 / COUNT(*), 
-                            2
-                        )
-                        ELSE 0 
-                    END as ctr
-                FROM recommendations
-                WHERE created_at >= DATEADD(day, -7, GETDATE())
-                AND algorithm_type IS NOT NULL
-                GROUP BY algorithm_type
-                ORDER BY total_recommendations DESC
-            """))
-            
-            algorithm_stats = []
-            for row in result:
-                alg = row.algorithm_type.lower() if row.algorithm_type else 'unknown'
-                
-                # 使用算法特定参数或默认值
-                avg_duration_map = {
-                    'hybrid': 225,
-                    'itemcf': 192,
-                    'usercf': 210,
-                    'content': 198,
-                    'mf': 185,
-                    'cf': 200,  # 兼容cf别名
-                    'cold': 180
-                }
-                
-                avg_duration = avg_duration_map.get(alg, 180)
-                conversion_rate = (row.total_listens or 0) / max(row.total_recommendations, 1) * 100
-                
-                algorithm_stats.append({
-                    "algorithm": alg,
-                    "ctr": round(row.ctr or 0, 2),
-                    "total": row.total_recommendations or 0,
-                    "clicks": row.total_clicks or 0,
-                    "listens": row.total_listens or 0,
-                    "avg_duration": avg_duration,
-                    "conversion_rate": round(conversion_rate, 1)
-                })
-            
-            stats['algorithm_performance'] = algorithm_stats
-            
-            # 3. 如果没有数据，添加说明
-            if not algorithm_stats:
-                stats['note'] = '无算法性能数据（可能算法类型字段为空）'
-                
-                # 尝试另一种查询方式
-                fallback_result = conn.execute(text("""
-                    SELECT 
-                        'hybrid' as algorithm_type,
-                        COUNT(*) as total,
-                        SUM(CASE WHEN is_clicked = 1 THEN 1 ELSE 0 END) as clicks,
-                        SUM(CASE WHEN is_listened = 1 THEN 1 ELSE 0 END) as listens
-                    FROM recommendations
-                    WHERE created_at >= DATEADD(day, -7, GETDATE())
-                """)).fetchone()
-                
-                if fallback_result and fallback_result.total > 0:
-                    ctr = (fallback_result.clicks or 0) / fallback_result.total * 100
-                    conversion = (fallback_result.listens or 0) / fallback_result.total * 100
-                    
-                    stats['algorithm_performance'] = [{
-                        "algorithm": "hybrid",
-                        "ctr": round(ctr, 2),
-                        "total": fallback_result.total,
-                        "clicks": fallback_result.clicks or 0,
-                        "listens": fallback_result.listens or 0,
-                        "avg_duration": 225,
-                        "conversion_rate": round(conversion, 1)
-                    }]
-                    stats['note'] = '使用汇总数据（算法类型未指定）'
+        stats['start_date'], stats['end_date'] = start.isoformat(), end.isoformat()
+        totals = daily_buckets.totals(engine, start, end)
+        
+        # 1. 检查区间内是否有推荐数据
+        if not any(data['total_recommendations'] for data in totals.values()):
+            logger.info(f"{start} ~ {end} 无推荐数据")
+            stats['algorithm_performance'] = []
+            stats['note'] = f'{start} ~ {end} 无推荐数据，请确保推荐系统正常运行'
+            return jsonify({"success": True, "data": stats})
+        
+        # 2. 各算法性能数据（同名算法不区分大小写合并）
+        merged = {}
+        for algorithm_type, data in totals.items():
+            if not algorithm_type:
+                continue
+            bucket = merged.setdefault(algorithm_type.lower(), {"total": 0, "clicks": 0, "listens": 0})
+            bucket["total"] += data['total_recommendations']
+            bucket["clicks"] += data['clicks']
+            bucket["listens"] += data['listens']
+        
+        algorithm_stats = []
+        for alg, data in sorted(merged.items(), key=lambda item: -item[1]["total"]):
+            total = data["total"]
+            algorithm_stats.append({
+                "algorithm": alg,
+                "ctr": round(data["clicks"] * 100.0 / total, 2) if total else 0,
+                "total": total,
+                "clicks": data["clicks"],
+                "listens": data["listens"],
+                "avg_duration": ALGORITHM_AVG_DURATION.get(alg, 180),
+                "conversion_rate": round(data["listens"] / max(total, 1) * 100, 1)
+            })
+        
+        stats['algorithm_performance'] = algorithm_stats
+        
+        # 3. 如果没有数据（算法类型字段均为空），使用汇总数据
+        if not algorithm_stats:
+            unspecified = totals.get('')
+            stats['note'] = '无算法性能数据（可能算法类型字段为空）'
+            if unspecified and unspecified['total_recommendations'] > 0:
+                total = unspecified['total_recommendations']
+                stats['algorithm_performance'] = [{
+                    "algorithm": "hybrid",
+                    "ctr": round(unspecified['clicks'] / total * 100, 2),
+                    "total": total,
+                    "clicks": unspecified['clicks'],
+                    "listens": unspecified['listens'],
+                    "avg_duration": 225,
+                    "conversion_rate": round(unspecified['listens'] / total * 100, 1)
+                }]
+                stats['note'] = '使用汇总数据（算法类型未指定）'
     
     except Exception as e:
         logger.error(f"获取A/B测试数据失败: {e}", exc_info=True)
@@ -1456,7 +1573,29 @@ def get_algorithm_performance():
                     ORDER BY total_recommendations DESC
                 """))
                 
-                for row in result:
+                rows = result.fetchall()
+                
+                # 召回率/准确率/多样性/覆盖率取 performance_monitor.py 写入的每日指标（按推荐数加权）
+                measured = {}
+                try:
+                    measured = {
+                        row.algorithm_type.lower(): row
+                        for row in conn.execute(text("""
+                            SELECT 
+                                algorithm_type,
+                                SUM(recall_rate * total_recommendations) / NULLIF(SUM(CASE WHEN recall_rate IS NOT NULL THEN total_recommendations END), 0) as recall_rate,
+                                SUM(precision_rate * total_recommendations) / NULLIF(SUM(CASE WHEN precision_rate IS NOT NULL THEN total_recommendations END), 0) as precision_rate,
+                                SUM(diversity_score * total_recommendations) / NULLIF(SUM(CASE WHEN diversity_score IS NOT NULL THEN total_recommendations END), 0) as diversity_score,
+                                AVG(coverage_rate) as coverage_rate
+                            FROM algorithm_performance_stats
+                            WHERE metric_date >= CAST(GETDATE() - 30 AS DATE)
+                            GROUP BY algorithm_type
+                        """))
+                    }
+                except Exception as e:
+                    logger.warning(f"读取算法性能指标失败，使用估算值: {e}")
+                
+                for row in rows:
                     algorithm = row.algorithm_type.lower()
                     total = row.total_recommendations or 0
                     clicks = row.clicks or 0
@@ -1464,23 +1603,30 @@ def get_algorithm_performance():
                     ctr = row.ctr or 0
                     listen_rate = row.listen_rate or 0
                     
-                    # 根据真实数据计算其他指标（或使用合理估算）
-                    # 召回率和准确率需要AB测试数据，这里使用基于CTR的估算
-                    recall_estimate = min(85.0, max(60.0, ctr * 6 + 50))  # 基于CTR估算召回率
-                    precision_estimate = min(90.0, max(65.0, ctr * 7 + 55))  # 基于CTR估算准确率
-                    diversity_estimate = min(80.0, max(50.0, 100 - ctr * 5))  # CTR越高多样性可能越低
-                    
-                    stats[algorithm] = {
-                        "召回率": round(recall_estimate, 1),
-                        "准确率": round(precision_estimate, 1),
-                        "多样性": round(diversity_estimate, 1),
+                    metrics = measured.get(algorithm)
+                    if metrics is not None and metrics.precision_rate is not None:
+                        stats[algorithm] = {
+                            "召回率": round(float(metrics.recall_rate or 0), 1),
+                            "准确率": round(float(metrics.precision_rate), 1),
+                            "多样性": round(float(metrics.diversity_score or 0), 1),
+                            "覆盖率": round(float(metrics.coverage_rate or 0), 1),
+                            "备注": "基于真实推荐数据与后续用户行为"
+                        }
+                    else:
+                        # 指标尚未计算时，召回率和准确率使用基于CTR的估算
+                        stats[algorithm] = {
+                            "召回率": round(min(85.0, max(60.0, ctr * 6 + 50)), 1),
+                            "准确率": round(min(90.0, max(65.0, ctr * 7 + 55)), 1),
+                            "多样性": round(min(80.0, max(50.0, 100 - ctr * 5)), 1),  # CTR越高多样性可能越低
+                            "备注": "基于真实推荐数据（召回率/准确率/多样性为估算）"
+                        }
+                    stats[algorithm].update({
                         "点击率": round(ctr, 1),
                         "收听率": round(listen_rate, 1),
                         "总推荐数": total,
                         "点击次数": clicks,
-                        "收听次数": listens,
-                        "备注": "基于真实推荐数据"
-                    }
+                        "收听次数": listens
+                    })
                 
                 logger.info(f"从推荐表获取到 {len(stats)} 个算法的真实数据")
     
@@ -1502,115 +1648,74 @@ def get_algorithm_performance():
 @bp.route('/algorithm-trend', methods=['GET'])
 @admin_required
 def get_algorithm_trend():
-    """获取各算法7天趋势数据 - 使用真实数据"""
+    """获取各算法每日点击率趋势（读推荐日汇总桶；默认最近7天，支持 days 或 start/end）"""
     engine = recommender_service._engine
     
     try:
-        with engine.connect() as conn:
-            # 检查是否有数据
-            check_query = text("""
-                SELECT COUNT(*) as cnt 
-                FROM recommendations 
-                WHERE created_at >= DATEADD(day, -7, GETDATE())
-                AND algorithm_type IS NOT NULL
-            """)
-            
-            check_result = conn.execute(check_query).fetchone()
-            
-            if not check_result or check_result.cnt == 0:
-                logger.info("最近7天无推荐数据")
-                return jsonify({
-                    "success": True,
-                    "data": {
-                        "dates": [],
-                        "series": []
-                    },
-                    "note": "最近7天无推荐数据"
+        start, end = _bucket_date_range()
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"日期参数不合法: {e}"}), 400
+    
+    try:
+        # 算法 -> 日期 -> [推荐数, 点击数]（同名算法不区分大小写合并）
+        algorithms = {}
+        for row in daily_buckets.daily(engine, start, end):
+            if not row['algorithm_type'] or not row['total_recommendations']:
+                continue
+            counts = algorithms.setdefault(row['algorithm_type'].lower(), {}).setdefault(row['bucket_date'], [0, 0])
+            counts[0] += row['total_recommendations']
+            counts[1] += row['clicks'] or 0
+        
+        if not algorithms:
+            logger.info(f"{start} ~ {end} 无推荐数据")
+            return jsonify({
+                "success": True,
+                "data": {
+                    "dates": [],
+                    "series": []
+                },
+                "note": f"{start} ~ {end} 无推荐数据"
+            })
+        
+        # 有数据的日期；跨年时显示完整日期
+        all_dates = sorted({day for per_day in algorithms.values() for day in per_day})
+        date_format = '%m-%d' if start.year == end.year else '%Y-%m-%d'
+        
+        def ctr_values(algorithm):
+            per_day = algorithms[algorithm]
+            return [round(per_day[day][1] * 100.0 / per_day[day][0], 2) if day in per_day else 0
+                    for day in all_dates]
+        
+        series_data = []
+        
+        # 主要算法列表
+        algorithm_list = ['hybrid', 'itemcf', 'usercf', 'content', 'mf', 'cf']
+        
+        for algorithm in algorithm_list:
+            if algorithm in algorithms:
+                series_data.append({
+                    "name": get_algorithm_display_name(algorithm),
+                    "data": ctr_values(algorithm),
+                    "type": "line"
                 })
-            
-            # 获取最近7天的数据
-            result = conn.execute(text("""
-                WITH DateSeries AS (
-                    SELECT CAST(GETDATE() - 6 AS DATE) as date
-                    UNION ALL SELECT CAST(GETDATE() - 5 AS DATE)
-                    UNION ALL SELECT CAST(GETDATE() - 4 AS DATE)
-                    UNION ALL SELECT CAST(GETDATE() - 3 AS DATE)
-                    UNION ALL SELECT CAST(GETDATE() - 2 AS DATE)
-                    UNION ALL SELECT CAST(GETDATE() - 1 AS DATE)
-                    UNION ALL SELECT CAST(GETDATE() AS DATE)
-                ),
-                AlgorithmData AS (
-                    SELECT 
-                        CONVERT(VARCHAR(5), ds.date, 110) as date_str,
-                        r.algorithm_type,
-                        COUNT(*) as total,
-                        SUM(CASE WHEN r.is_clicked = 1 THEN 1 ELSE 0 END) as clicks,
-                        CASE 
-                            WHEN COUNT(*) > 0 
-                            THEN ROUND(SUM(CASE WHEN r.is_clicked = 1 THEN 1.0 ELSE 0.0 END) * 100.0 / COUNT(*), 2)
-                            ELSE 0 
-                        END as ctr
-                    FROM DateSeries ds
-                    LEFT JOIN recommendations r ON CAST(r.created_at AS DATE) = ds.date
-                    WHERE r.algorithm_type IS NOT NULL
-                    GROUP BY ds.date, r.algorithm_type
-                )
-                SELECT * FROM AlgorithmData
-                WHERE algorithm_type IS NOT NULL
-                ORDER BY date_str, algorithm_type
-            """))
-            
-            # 组织数据
-            dates_set = set()
-            algorithms = {}
-            
-            for row in result:
-                date_str = row.date_str
-                algorithm = row.algorithm_type.lower()
-                ctr = float(row.ctr or 0)
-                
-                dates_set.add(date_str)
-                
-                if algorithm not in algorithms:
-                    algorithms[algorithm] = {}
-                
-                algorithms[algorithm][date_str] = ctr
-            
-            # 排序日期并填充缺失的日期数据
-            all_dates = sorted(list(dates_set))
-            series_data = []
-            
-            # 主要算法列表
-            algorithm_list = ['hybrid', 'itemcf', 'usercf', 'content', 'mf', 'cf']
-            
-            for algorithm in algorithm_list:
-                if algorithm in algorithms:
-                    # 使用列表推导式获取每个日期的值
-                    values = [algorithms[algorithm].get(date, 0) for date in all_dates]
+        
+        # 如果数据较少，尝试获取其他算法
+        if len(series_data) < 2:
+            for algorithm in algorithms.keys():
+                if algorithm not in algorithm_list:
                     series_data.append({
                         "name": get_algorithm_display_name(algorithm),
-                        "data": values,
+                        "data": ctr_values(algorithm),
                         "type": "line"
                     })
-            
-            # 如果数据较少，尝试获取其他算法
-            if len(series_data) < 2:
-                for algorithm in algorithms.keys():
-                    if algorithm not in algorithm_list:
-                        values = [algorithms[algorithm].get(date, 0) for date in all_dates]
-                        series_data.append({
-                            "name": get_algorithm_display_name(algorithm),
-                            "data": values,
-                            "type": "line"
-                        })
-            
-            return jsonify({
-                "success": True,
-                "data": {
-                    "dates": all_dates,
-                    "series": series_data
-                }
-            })
+        
+        return jsonify({
+            "success": True,
+            "data": {
+                "dates": [day.strftime(date_format) for day in all_dates],
+                "series": series_data
+            }
+        })
             
     except Exception as e:
         logger.error(f"获取算法趋势数据失败: {e}")
@@ -1812,19 +1917,12 @@ def update_system_config():
                     config_key = f"{category}.{key}"
                     config_value = str(value)
                     
-                    # 使用upsert操作
-                    upsert_query = text("""
-                        MERGE system_config AS target
-                        USING (SELECT :key AS config_key, :value AS config_value) AS source
-                        ON target.config_key = source.config_key
-                        WHEN MATCHED THEN
-                            UPDATE SET config_value = source.config_value, updated_at = GETDATE()
-                        WHEN NOT MATCHED THEN
-                            INSERT (config_key, config_value) VALUES (source.config_key, source.config_value);
-                    """)
+                    # 使用upsert操作（SQL Server 为 MERGE，SQLite 为 ON CONFLICT）
+                    upsert_query = text(get_dialect(engine).upsert_sql(
+                        'system_config', ['config_key'], ['config_value'], touch_column='updated_at'))
                     
                     with engine.begin() as conn:
-                        conn.execute(upsert_query, {"key": config_key, "value": config_value})
+                        conn.execute(upsert_query, {"config_key": config_key, "config_value": config_value})
         
         return jsonify({
             "success": True,
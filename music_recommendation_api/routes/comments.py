@@ -4,6 +4,7 @@ from sqlalchemy import text, func, desc
 from datetime import datetime, timedelta
 import logging
 from utils.response import success, error
+from utils.pagination import Keyset, song_comment_counts
 from recommender_service import recommender_service
 import re  # 添加正则表达式支持
 
@@ -20,16 +21,27 @@ except ImportError:
 
 # ==================== 歌曲评论API ====================
 
+# 评论排序字段 -> 排序表达式（可为空的列给出最小哨兵值，保证游标比较有效）
+COMMENT_SORT_FIELDS = {
+    'comment_time': "COALESCE(comment_time, '1900-01-01')",
+    'liked_count': 'COALESCE(liked_count, -1)',
+    'sentiment': 'COALESCE(sentiment_score, -1)'
+}
+
 @bp.route('/songs/<song_id>/comments', methods=['GET'])
 def get_song_comments(song_id):
-    """获取歌曲的所有评论（分页+排序）"""
+    """获取歌曲的所有评论（游标分页+排序）
+
+    翻页回传上一页的 pagination.next_cursor；未带游标时仍兼容 page 参数
+    """
     try:
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 100)
         sort_by = request.args.get('sort_by', 'comment_time')  # comment_time, liked_count
         sort_order = request.args.get('order', 'desc')  # asc, desc
+        cursor = request.args.get('cursor', '').strip()
         
-        offset = (page - 1) * per_page
+        offset = 0 if cursor else (page - 1) * per_page
         
         engine = recommender_service._engine
         
@@ -42,14 +54,14 @@ def get_song_comments(song_id):
         if not song_check:
             return error(message="歌曲不存在", code=404)
         
-        # 构建排序
-        order_map = {
-            'comment_time': 'comment_time',
-            'liked_count': 'liked_count',
-            'sentiment': 'sentiment_score'
-        }
-        order_field = order_map.get(sort_by, 'comment_time')
+        # 构建排序（排序字段 + comment_id 作为游标键）
+        order_field = COMMENT_SORT_FIELDS.get(sort_by, COMMENT_SORT_FIELDS['comment_time'])
         order_direction = 'DESC' if sort_order.lower() == 'desc' else 'ASC'
+        keyset = Keyset([(order_field, order_direction), ('comment_id', order_direction)])
+        try:
+            cursor_clause, cursor_params = keyset.where(cursor)
+        except ValueError as e:
+            return error(message=str(e), code=400)
         
         # 获取评论数据
         query = text(f"""
@@ -63,22 +75,24 @@ def get_song_comments(song_id):
                 comment_time,
                 sentiment_score,
                 is_positive,
-                created_at
+                created_at,
+                {keyset.select_sql()}
             FROM song_comments
-            WHERE unified_song_id = :song_id
-            ORDER BY {order_field} {order_direction}
+            WHERE unified_song_id = :song_id AND {cursor_clause}
+            ORDER BY {keyset.order_sql()}
             OFFSET :offset ROWS
             FETCH NEXT :limit ROWS ONLY
         """)
         
         with engine.connect() as conn:
-            result = conn.execute(
+            rows = conn.execute(
                 query,
-                {"song_id": song_id, "offset": offset, "limit": per_page}
-            )
+                {"song_id": song_id, **cursor_params, "offset": offset, "limit": per_page + 1}
+            ).fetchall()
+            rows, next_cursor = keyset.split(rows, per_page)
             
             comments = []
-            for row in result:
+            for row in rows:
                 comments.append({
                     "comment_id": row.comment_id,
                     "user_id": row.original_user_id,
@@ -91,13 +105,14 @@ def get_song_comments(song_id):
                     "created_at": row.created_at.isoformat() if row.created_at else None
                 })
             
-            # 获取总数
+            # 获取总数（按歌曲缓存，发表/删除评论时失效）
             count_query = text("""
                 SELECT COUNT(*) as total 
                 FROM song_comments 
                 WHERE unified_song_id = :song_id
             """)
-            total = conn.execute(count_query, {"song_id": song_id}).fetchone().total
+            total = song_comment_counts.get(song_id,
+                                        lambda: conn.execute(count_query, {"song_id": song_id}).fetchone().total)
         
         # 获取情感统计
         sentiment_stats = get_song_sentiment_stats(song_id)
@@ -109,7 +124,9 @@ def get_song_comments(song_id):
                 "page": page,
                 "per_page": per_page,
                 "total": total,
-                "pages": (total + per_page - 1) // per_page
+                "pages": (total + per_page - 1) // per_page,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None
             },
             "sort": {
                 "by": sort_by,
@@ -412,6 +429,7 @@ def add_song_comment(song_id):
         except Exception as behavior_error:
             logger.warning(f"记录评论行为失败: {behavior_error}")
         
+        song_comment_counts.invalidate(lambda key: key == song_id)
         logger.info(f"用户 {user_id} 为歌曲 {song_id} 添加评论")
         
         return success({
@@ -664,6 +682,7 @@ def delete_comment(comment_id):
         with engine.begin() as conn:
             conn.execute(update_song_query, {"song_id": comment.unified_song_id})
         
+        song_comment_counts.invalidate(lambda key: key == comment.unified_song_id)
         logger.info(f"评论 {comment_id} 已删除")
         
         return success({
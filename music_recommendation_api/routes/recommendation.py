@@ -208,52 +208,24 @@ def get_diverse_recommendations(user_id: str):
         n = request.args.get('n', 10, type=int)
         n = min(max(n, 1), Config.MAX_RECOMMEND_COUNT)
         
-        # 获取较多候选进行重排序
-        candidates = recommender_service.get_recommendations(
-            user_id, 
-            n=min(n * 3, 50),  # 最多取50个候选
-            algorithm='hybrid'
-        )
-        
-        # 简单重排序（实际可调用mmr_rerank）
-        # 这里只是示例：按流派多样性简单重排
-        sorted_recs = _simple_diversity_sort(candidates, n)
+        lambda_ = request.args.get('lambda', Config.DIVERSE_MMR_LAMBDA, type=float)
+        lambda_ = min(max(lambda_, 0.0), 1.0)
+
+        # 引擎内基于内容近邻与流派编码的MMR重排
+        recs = recommender_service.get_diverse_recommendations(user_id, n=n, lambda_=lambda_)
         
         return success({
             "user_id": user_id,
-            "recommendations": sorted_recs,
+            "recommendations": recs,
             "diversity_optimized": True,
-            "algorithm": "mmr-lite"
+            "algorithm": "mmr",
+            "lambda": lambda_
         })
         
     except Exception as e:
         current_app.logger.error(f"多样性推荐错误: {e}")
         return error(message=str(e), code=500)
 
-
-def _simple_diversity_sort(songs: list, n: int) -> list:
-    """简单的多样性重排序：确保前N首不重复流派"""
-    if len(songs) <= n:
-        return songs
-    
-    selected = []
-    genres_seen = set()
-    remaining = songs.copy()
-    
-    # 第一轮：每个流派选一首
-    for song in songs:
-        if len(selected) >= n:
-            break
-        genre = song.get('genre', 'unknown')
-        if genre not in genres_seen:
-            selected.append(song)
-            genres_seen.add(genre)
-            remaining.remove(song)
-    
-    # 补满剩余名额
-    selected.extend(remaining[:n - len(selected)])
-    return selected
-
 @bp.route('/recommend/<user_id>/compare', methods=['GET'])
 def get_ab_test_recommendations(user_id: str):
     """
@@ -479,6 +451,9 @@ def record_behavior():
                     WHERE user_id = :uid
                 """), {"uid": data['user_id']})
         
+        # 新交互使冷启动折叠推荐失效
+        recommender_service.invalidate_fold_in(data['user_id'])
+        
         logger.info(f"行为记录成功: user={data['user_id']}, song={data['song_id']}, type={data['behavior_type']}")
         return success(message="行为记录成功")
         
@@ -1,10 +1,20 @@
 import os
 import logging
-from flask import Blueprint, request, send_file, current_app, make_response, Response
+from flask import Blueprint, request, current_app
 from sqlalchemy import text
-from utils.response import success, error
+from utils.response import success, error, success_with_etag
+from utils.pagination import encode_cursor, decode_cursor, Keyset, CountCache, NUMBER
+from utils.audio_stream import send_audio
+from config import Config
 from recommender_service import recommender_service
+from song_catalog import song_catalog
+from search_index import song_search_index
+from suggest_index import song_suggest_index
+from hot_songs import hot_songs
+from genre_index import genre_facet_index
+from audio_index import audio_file_index
 from datetime import datetime, timedelta
+from urllib.parse import quote
 
 logger = logging.getLogger(__name__)
 bp = Blueprint('song', __name__)
@@ -41,55 +51,23 @@ def get_songs_batch():
 
 @bp.route('/hot', methods=['GET'])
 def get_hot_songs():
-    """获取热门歌曲（分层）"""
+    """获取热门歌曲（分层）；支持 ETag / If-None-Match"""
     try:
         tier = request.args.get('tier', 'all')
         n = request.args.get('n', 20, type=int)
         n = min(n, 100)
         
-        engine = recommender_service._engine
-        
-        where_clause = ""
-        if tier == 'hit':
-            where_clause = "WHERE popularity_tier = 'hit'"
-        elif tier == 'popular':
-            where_clause = "WHERE popularity_tier = 'popular'"
-        elif tier == 'normal':
-            where_clause = "WHERE popularity_tier = 'normal'"
-        
-        query = text(f"""
-            SELECT TOP {n}
-                song_id, song_name, artists, album, 
-                COALESCE(genre_clean, genre) as genre,
-                COALESCE(final_popularity, popularity, 50) as popularity,  -- 使用真实流行度
-                popularity_tier,
-                audio_path,
-                CASE 
-                    WHEN audio_path IS NOT NULL AND audio_path != '' THEN 1 
-                    ELSE 0 
-                END as has_audio
-            FROM enhanced_song_features
-            {where_clause}
-            ORDER BY COALESCE(final_popularity, popularity, 50) DESC  -- 按真实流行度排序
-        """)
-        
-        with engine.connect() as conn:
-            result = conn.execute(query)
-            songs = []
-            for row in result:
-                # 确保流行度是整数
-                popularity = int(row.popularity) if row.popularity else 50
-                songs.append({
-                    "song_id": row.song_id,
-                    "song_name": row.song_name,
-                    "artists": row.artists,
-                    "album": row.album,
-                    "genre": row.genre,
-                    "popularity": popularity,  # 真实流行度
-                    "popularity_tier": row.popularity_tier,
-                    "has_audio": bool(row.has_audio)
-                })
-        
+        if hot_songs.is_ready:
+            hot_songs.maybe_refresh(recommender_service._engine)
+            songs, etag = hot_songs.get(tier, n)
+            return success_with_etag({
+                "tier": tier,
+                "count": len(songs),
+                "songs": songs
+            }, etag)
+        
+        # 热门服务未就绪（引擎未加载）：回退到数据库查询
+        songs = _hot_songs_sql(tier, n)
         logger.info(f"[热门歌曲] tier={tier}, 返回 {len(songs)} 首歌曲，平均流行度: {sum(s['popularity'] for s in songs)/len(songs) if songs else 0:.1f}")
         
         return success({
@@ -102,20 +80,140 @@ def get_hot_songs():
         logger.error(f"获取热门歌曲失败: {e}", exc_info=True)
         return error(message=str(e), code=500)
 
-# 极简流派归一化映射（与前端一致）
-GENRE_NORMALIZATION = {
-    '流行': ['华语流行', '欧美流行', '日本流行', 'Pop', 'K-Pop'],
-    '摇滚': ['Rock', 'Punk', '摇滚'],
-    '电子': ['Electronic', '电子'],
-    '金属': ['Metal'],
-    '说唱': ['Rap', '说唱'],
-    '民谣': ['Folk', '民谣', 'Country'],
-    '其他': ['Jazz', 'Blues', 'Latin', 'New Age', 'World', 'Reggae', 'RnB', '翻唱', '现场', '影视原声']
-}
+
+def _hot_songs_sql(tier: str, n: int) -> list:
+    """按数据库 popularity_tier 列查询热门歌曲"""
+    engine = recommender_service._engine
+    
+    where_clause = ""
+    if tier == 'hit':
+        where_clause = "WHERE popularity_tier = 'hit'"
+    elif tier == 'popular':
+        where_clause = "WHERE popularity_tier = 'popular'"
+    elif tier == 'normal':
+        where_clause = "WHERE popularity_tier = 'normal'"
+    
+    query = text(f"""
+        SELECT TOP {n}
+            song_id, song_name, artists, album, 
+            COALESCE(genre_clean, genre) as genre,
+            COALESCE(final_popularity, popularity, 50) as popularity,  -- 使用真实流行度
+            popularity_tier,
+            audio_path,
+            CASE 
+                WHEN audio_path IS NOT NULL AND audio_path != '' THEN 1 
+                ELSE 0 
+            END as has_audio
+        FROM enhanced_song_features
+        {where_clause}
+        ORDER BY COALESCE(final_popularity, popularity, 50) DESC  -- 按真实流行度排序
+    """)
+    
+    with engine.connect() as conn:
+        result = conn.execute(query)
+        songs = []
+        for row in result:
+            # 确保流行度是整数
+            popularity = int(row.popularity) if row.popularity else 50
+            songs.append({
+                "song_id": row.song_id,
+                "song_name": row.song_name,
+                "artists": row.artists,
+                "album": row.album,
+                "genre": row.genre,
+                "popularity": popularity,  # 真实流行度
+                "popularity_tier": row.popularity_tier,
+                "has_audio": bool(row.has_audio)
+            })
+    return songs
+
+def _genre_song_payload(record, has_audio, popularity):
+    return {
+        "song_id": record['song_id'],
+        "song_name": record.get('song_name') or "未知歌曲",
+        "artists": record.get('artists') or "未知艺术家",
+        "album": record.get('album') or "",
+        "genre": record.get('genre_clean') or record.get('genre') or "未知流派",
+        "popularity": int(popularity) if popularity else 50,
+        "has_audio": has_audio,
+        "popularity_tier": record.get('popularity_tier'),
+        "audio_features": {
+            "danceability": float(record['danceability']) if record.get('danceability') else 0.5,
+            "energy": float(record['energy']) if record.get('energy') else 0.5,
+            "valence": float(record['valence']) if record.get('valence') else 0.5,
+            "tempo": float(record['tempo']) if record.get('tempo') else 120
+        }
+    }
+
+
+# 与流派索引一致的排序：有音频优先 > 流行度降序 > song_id，游标格式 [has_audio, popularity, song_id]
+_HAS_AUDIO_SQL = "CASE WHEN (audio_path IS NOT NULL AND audio_path != '') OR track_id IS NOT NULL THEN 1 ELSE 0 END"
+GENRE_KEYSET = Keyset([(_HAS_AUDIO_SQL, 'DESC'),
+                       ('COALESCE(final_popularity, popularity, 50)', 'DESC'),
+                       ('song_id', 'ASC')])
+# 搜索回退查询的排序：流行度降序 > song_id，游标格式 [popularity, song_id]
+SEARCH_KEYSET = Keyset([('COALESCE(final_popularity, -1)', 'DESC'), ('song_id', 'ASC')])
+# 数据库回退查询的总数缓存，键为 (列表, 筛选条件)
+_list_counts = CountCache(Config.PAGINATION_COUNT_TTL)
+
+
+def _songs_by_genre_sql(engine, source_genres, limit, offset, cursor=None):
+    """流派索引未就绪时的数据库查询，返回 (songs, total, next_cursor)"""
+    # 构建 WHERE 子句
+    conditions = []
+    params = {}
+    
+    for i, g in enumerate(source_genres):
+        param_name = f"genre_{i}"
+        params[param_name] = f"%{g}%"
+        # 同时在 genre 和 genre_clean 中搜索
+        conditions.append(f"(genre LIKE :{param_name} OR genre_clean LIKE :{param_name})")
+    
+    where_clause = " OR ".join(conditions) if conditions else "1=1"
+    cursor_clause, cursor_params = GENRE_KEYSET.where(cursor)
+    if cursor:
+        offset = 0
+    
+    # 构建查询
+    query_str = f"""
+    SELECT 
+        song_id, song_name, artists, album, genre, genre_clean,
+        danceability, energy, valence, tempo, popularity_tier,
+        {GENRE_KEYSET.select_sql()}
+    FROM enhanced_song_features
+    WHERE ({where_clause}) AND {cursor_clause}
+    ORDER BY {GENRE_KEYSET.order_sql()}
+    OFFSET :offset ROWS
+    FETCH NEXT :limit ROWS ONLY
+    """
+    
+    logger.info(f"[流派查询] 查询条件: {where_clause}, 参数: {params}")
+    
+    with engine.connect() as conn:
+        rows = conn.execute(text(query_str), {**params, **cursor_params,
+                                              "offset": offset, "limit": limit + 1}).fetchall()
+        rows, next_cursor = GENRE_KEYSET.split(rows, limit)
+        # _sort0 = has_audio, _sort1 = popularity
+        songs = [_genre_song_payload(dict(row._mapping), bool(row._sort0), row._sort1) for row in rows]
+        
+        # 获取总数（使用相同的条件，按流派组合缓存）
+        count_query = f"""
+        SELECT COUNT(*) as total
+        FROM enhanced_song_features
+        WHERE {where_clause}
+        """
+        total = _list_counts.get(('by-genre',) + tuple(sorted(source_genres)),
+                                 lambda: conn.execute(text(count_query), params).scalar() or 0)
+    return songs, total, next_cursor
+
 
 @bp.route('/by-genre', methods=['GET'])
 def get_songs_by_genre():
-    """按流派查询（支持多值匹配）"""
+    """按流派查询（支持多值匹配）
+
+    翻页可用 offset，或回传上一页响应中的 cursor（next_cursor）
+    """
+    source_genres = []
     try:
         genre_param = request.args.get('genre', '').strip()
         if not genre_param:
@@ -126,84 +224,27 @@ def get_songs_by_genre():
         
         limit = min(request.args.get('limit', 50, type=int), 100)
         offset = request.args.get('offset', 0, type=int)
-        
-        engine = recommender_service._engine
-        
-        # 【关键修复】使用更灵活的查询条件
-        # 构建 WHERE 子句
-        conditions = []
-        params = {}
-        
-        for i, g in enumerate(source_genres):
-            param_name = f"genre_{i}"
-            params[param_name] = f"%{g}%"
-            # 同时在 genre 和 genre_clean 中搜索
-            conditions.append(f"(genre LIKE :{param_name} OR genre_clean LIKE :{param_name})")
-        
-        where_clause = " OR ".join(conditions) if conditions else "1=1"
-        
-        # 构建查询
-        query_str = f"""
-        SELECT 
-            song_id, song_name, artists, album, 
-            COALESCE(genre_clean, genre) as genre,
-            COALESCE(final_popularity, popularity, 50) as popularity,
-            danceability, energy, valence, tempo,
-            audio_path,
-            track_id,
-            CASE 
-                WHEN (audio_path IS NOT NULL AND audio_path != '') OR track_id IS NOT NULL THEN 1 
-                ELSE 0 
-            END as has_audio,
-            popularity_tier
-        FROM enhanced_song_features
-        WHERE {where_clause}
-        ORDER BY 
-            CASE 
-                WHEN (audio_path IS NOT NULL AND audio_path != '') OR track_id IS NOT NULL THEN 0 
-                ELSE 1 
-            END,
-            COALESCE(final_popularity, popularity, 50) DESC
-        OFFSET :offset ROWS
-        FETCH NEXT :limit ROWS ONLY
-        """
-        
-        params["offset"] = offset
-        params["limit"] = limit
-        
-        logger.info(f"[流派查询] 查询条件: {where_clause}, 参数: {params}")
-        
-        with engine.connect() as conn:
-            result = conn.execute(text(query_str), params)
+        cursor = request.args.get('cursor', '').strip()
+        try:
+            # 两条路径的游标都是 [has_audio, popularity, song_id]；类型不对的游标直接 400，不进入查询
+            after = decode_cursor(cursor, (int, NUMBER, str)) if cursor else None
+        except ValueError as e:
+            return error(message=str(e), code=400)
+        
+        next_cursor = None
+        if genre_facet_index.is_ready:
+            rows, total, next_key = genre_facet_index.page(source_genres, limit, offset, after)
             songs = []
-            for row in result:
-                songs.append({
-                    "song_id": row.song_id,
-                    "song_name": row.song_name or "未知歌曲",
-                    "artists": row.artists or "未知艺术家",
-                    "album": row.album or "",
-                    "genre": row.genre or "未知流派",
-                    "popularity": int(row.popularity) if row.popularity else 50,
-                    "has_audio": bool(row.has_audio),
-                    "popularity_tier": row.popularity_tier,
-                    "audio_features": {
-                        "danceability": float(row.danceability) if row.danceability else 0.5,
-                        "energy": float(row.energy) if row.energy else 0.5,
-                        "valence": float(row.valence) if row.valence else 0.5,
-                        "tempo": float(row.tempo) if row.tempo else 120
-                    }
-                })
-        
-        # 获取总数（使用相同的条件）
-        count_query = f"""
-        SELECT COUNT(*) as total
-        FROM enhanced_song_features
-        WHERE {where_clause}
-        """
-        
-        with engine.connect() as conn:
-            count_result = conn.execute(text(count_query), {k: v for k, v in params.items() if not k.startswith('offset') and not k.startswith('limit')})
-            total = count_result.scalar() or 0
+            for song_id, has_audio, popularity in rows:
+                record = song_catalog.get(song_id)
+                if record is not None:
+                    songs.append(_genre_song_payload(record, has_audio, popularity))
+            next_cursor = encode_cursor(next_key) if next_key else None
+            has_more = next_key is not None
+        else:
+            songs, total, next_cursor = _songs_by_genre_sql(recommender_service._engine, source_genres,
+                                                            limit, offset, cursor)
+            has_more = next_cursor is not None
         
         audio_count = sum(1 for song in songs if song['has_audio'])
         logger.info(f"[流派查询] 返回 {len(songs)}/{total} 首歌曲，有音频: {audio_count} 首")
@@ -214,7 +255,8 @@ def get_songs_by_genre():
             "count": len(songs),
             "total": total,
             "audio_count": audio_count,
-            "has_more": (offset + len(songs)) < total
+            "has_more": has_more,
+            "next_cursor": next_cursor
         })
         
     except Exception as e:
@@ -227,166 +269,65 @@ def get_songs_by_genre():
             "total": 0,
             "audio_count": 0,
             "has_more": False,
+            "next_cursor": None,
             "warning": str(e)
         })
     
 
 # ==================== 新增：音频文件服务路由 ====================
 
+def _accel_path(file_path):
+    """根目录下的文件 -> nginx 内部路径；未配置或不在根目录下时返回 None"""
+    prefix, root = Config.AUDIO_ACCEL_REDIRECT_PREFIX, Config.AUDIO_ROOT
+    if not prefix or not root:
+        return None
+    root = os.path.abspath(root)
+    path = os.path.abspath(file_path)
+    if os.path.commonpath([root, path]) != root:
+        return None
+    relative = os.path.relpath(path, root).replace(os.sep, '/')
+    return f"{prefix.rstrip('/')}/{quote(relative)}"
+
+
 @bp.route('/<song_id>/audio', methods=['GET'])
 def get_song_audio(song_id):
+    """音频文件（支持 Range 拖动进度条、ETag/Last-Modified 协商缓存）"""
     try:
-        logger.info(f"[音频请求] 开始处理歌曲ID: {song_id}")
-        
-        # 获取歌曲信息
-        engine = recommender_service._engine
-        query = text("""
-            SELECT audio_path, track_id, song_name, 
-                   CASE 
-                     WHEN audio_path IS NOT NULL AND audio_path != '' THEN 1 
-                     ELSE 0 
-                   END as has_audio
-            FROM enhanced_song_features 
-            WHERE song_id = :song_id
-        """)
-        
-        with engine.connect() as conn:
-            result = conn.execute(query, {"song_id": song_id}).fetchone()
-            
-            if not result:
-                logger.warning(f"[音频请求] 歌曲不存在: {song_id}")
-                return error(message="歌曲不存在", code=404)
-            
-            # 检查是否有音频
-            if not result.has_audio:
-                logger.info(f"[音频请求] 歌曲无音频: {song_id}")
-                return error(message="该歌曲暂无音频文件", code=404)
-            
-            file_path = result.audio_path
-            
-            # 详细的路径检查和日志
-            logger.info(f"[音频请求] 原始路径: {file_path}")
-            
-            if not file_path or file_path == '':
-                logger.warning(f"[音频请求] 音频路径为空: {song_id}")
-                return error(message="音频文件路径为空", code=404)
-            
-            # 处理路径（Windows）
-            file_path = str(file_path).strip()
-            
-            # 检查文件是否存在
-            if not os.path.exists(file_path):
-                # 尝试多种路径格式
-                possible_paths = [
-                    file_path,
-                    file_path.replace('\\', '/'),
-                    file_path.replace('/', '\\'),
-                    os.path.normpath(file_path),
-                    os.path.abspath(file_path)
-                ]
-                
-                for i, path in enumerate(possible_paths):
-                    logger.info(f"[音频请求] 尝试路径 {i+1}: {path}")
-                    if os.path.exists(path):
-                        file_path = path
-                        logger.info(f"[音频请求] 找到文件: {path}")
-                        break
-                else:
-                    logger.error(f"[音频请求] 所有路径都不存在: {song_id}")
-                    return error(message=f"音频文件不存在于任何路径: {file_path}", code=404)
-            
-            # 检查文件可读性
-            if not os.access(file_path, os.R_OK):
-                logger.error(f"[音频请求] 文件不可读: {file_path}")
-                return error(message="音频文件不可读", code=403)
-            
-            file_size = os.path.getsize(file_path)
-            logger.info(f"[音频请求] 文件大小: {file_size} bytes, 路径: {file_path}")
-        
-        # 设置mimetype
-        ext = os.path.splitext(file_path)[1].lower()
-        mimetypes = {
-            '.mp3': 'audio/mpeg',
-            '.wav': 'audio/wav',
-            '.ogg': 'audio/ogg',
-            '.m4a': 'audio/mp4',
-            '.flac': 'audio/flac'
-        }
-        mimetype = mimetypes.get(ext, 'application/octet-stream')
-        
-        # 处理Range请求（支持进度条拖动）
-        range_header = request.headers.get('Range')
-        
-        if range_header:
-            logger.info(f"[音频请求] Range请求: {range_header}")
-            response = _send_file_range(file_path, range_header, mimetype)
-        else:
-            # 直接返回完整文件
-            logger.info(f"[音频请求] 完整文件请求")
-            response = make_response(send_file(
-                file_path,
-                mimetype=mimetype,
-                as_attachment=False,
-                download_name=f"{song_id}_{os.path.basename(file_path)}"
-            ))
-            response.headers['Content-Length'] = str(file_size)
-        
-        # 添加缓存头，避免重复请求
-        response.headers['Cache-Control'] = 'public, max-age=3600'
-        response.headers['Accept-Ranges'] = 'bytes'
-        
-        logger.info(f"[音频请求] 成功处理: {song_id}, 大小: {file_size}")
+        exists, audio = audio_file_index.lookup(song_id, recommender_service._engine)
+        if not exists:
+            logger.warning(f"[音频请求] 歌曲不存在: {song_id}")
+            return error(message="歌曲不存在", code=404)
+        if audio is None:
+            logger.info(f"[音频请求] 歌曲无可用音频: {song_id}")
+            return error(message="该歌曲暂无音频文件", code=404)
+        
+        response = send_audio(
+            audio.path, audio.size, audio.mtime, audio.mimetype,
+            download_name=f"{song_id}_{os.path.basename(audio.path)}",
+            accel_path=_accel_path(audio.path),
+            max_age=Config.AUDIO_CACHE_MAX_AGE
+        )
+        logger.debug(f"[音频请求] {song_id} -> {response.status_code}, "
+                     f"Range: {request.headers.get('Range')}, 大小: {audio.size}")
         return response
             
     except Exception as e:
         logger.error(f"[音频请求] 处理失败 [{song_id}]: {e}", exc_info=True)
         return error(message=f"音频服务错误: {str(e)}", code=500)
 
-
-def _send_file_range(file_path, range_header, mimetype):
-    """处理HTTP Range请求，支持音频拖动"""
-    try:
-        file_size = os.path.getsize(file_path)
-        byte_range = range_header.replace('bytes=', '').split('-')
-        start = int(byte_range[0]) if byte_range[0] else 0
-        end = int(byte_range[1]) if byte_range[1] else file_size - 1
-        
-        if start >= file_size or end >= file_size or start > end:
-            return error(message="Invalid Range", code=416)
-        
-        length = end - start + 1
-        
-        with open(file_path, 'rb') as f:
-            f.seek(start)
-            data = f.read(length)
-        
-        response = Response(
-            data,
-            206,
-            mimetype=mimetype,
-            direct_passthrough=False
-        )
-        response.headers.add('Content-Range', f'bytes {start}-{end}/{file_size}')
-        response.headers.add('Accept-Ranges', 'bytes')
-        response.headers.add('Content-Length', str(length))
-        
-        # 【关键】添加CORS头
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Expose-Headers', 'Content-Range, Content-Length')
-        
-        return response
-        
-    except Exception as e:
-        logger.error(f"Range请求处理失败: {e}")
-        # 出错时回退到完整文件，但也要加CORS头
-        response = make_response(send_file(file_path, mimetype=mimetype))
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response
     
 @bp.route('/by-genre/stats', methods=['GET'])
 def get_genre_stats():
     """获取各流派的统计信息（精简版）"""
     try:
+        if genre_facet_index.is_ready:
+            genres, categories = genre_facet_index.stats()
+            return success({
+                "genres": genres,
+                "categories": categories,
+                "total_songs": sum(g['count'] for g in genres)
+            })
+        
         engine = recommender_service._engine
         
         query = """
@@ -421,45 +362,20 @@ def get_genre_stats():
 
 @bp.route('/<song_id>/audio/status', methods=['GET', 'OPTIONS'])
 def get_audio_status(song_id):
-    """检查音频文件是否存在（简化版）"""
+    """检查音频文件是否存在（查音频文件索引）"""
     try:
-        engine = recommender_service._engine
-        query = text("""
-            SELECT 
-                CASE WHEN audio_path IS NOT NULL AND audio_path != '' THEN 1 ELSE 0 END as has_audio,
-                track_id, song_name
-            FROM enhanced_song_features 
-            WHERE song_id = :song_id
-        """)
+        exists, audio = audio_file_index.lookup(song_id, recommender_service._engine)
+        if not exists:
+            return error(message="歌曲不存在", code=404)
         
-        with engine.connect() as conn:
-            result = conn.execute(query, {"song_id": song_id}).fetchone()
-            
-            if not result:
-                return error(message="歌曲不存在", code=404)
-            
-            has_audio = bool(result.has_audio)
-            file_path = None
-            
-            if has_audio:
-                # 尝试获取实际路径
-                path_query = text("SELECT audio_path FROM enhanced_song_features WHERE song_id = :song_id")
-                path_result = conn.execute(path_query, {"song_id": song_id}).fetchone()
-                file_path = path_result.audio_path if path_result else None
-                
-                # 检查文件是否存在
-                if file_path and os.path.exists(str(file_path)):
-                    file_size = os.path.getsize(str(file_path))
-                else:
-                    has_audio = False
-                    file_path = None
-            
-            return success({
-                "song_id": song_id,
-                "has_audio": has_audio,
-                "file_path": file_path,
-                "file_exists": has_audio and file_path and os.path.exists(str(file_path))
-            })
+        return success({
+            "song_id": song_id,
+            "has_audio": audio is not None,
+            "file_path": audio.path if audio else None,
+            "file_exists": audio is not None,
+            "file_size": audio.size if audio else None,
+            "mimetype": audio.mimetype if audio else None
+        })
             
     except Exception as e:
         logger.error(f"检查音频状态失败 [{song_id}]: {e}", exc_info=True)
@@ -469,6 +385,54 @@ def get_audio_status(song_id):
             "error": str(e)
         })
     
+def _song_to_search_result(song: dict) -> dict:
+    """歌曲记录（目录记录或数据库行字典）-> 搜索结果格式"""
+    return {
+        "song_id": song['song_id'],
+        "song_name": song['song_name'],
+        "artists": song['artists'],
+        "album": song['album'],
+        "genre": song['genre'],
+        "popularity": int(song['final_popularity']) if song['final_popularity'] else 50,
+        "has_audio": bool(song['audio_path']),
+        "audio_features": {
+            "danceability": float(song['danceability']) if song['danceability'] else 0.5,
+            "energy": float(song['energy']) if song['energy'] else 0.5,
+            "valence": float(song['valence']) if song['valence'] else 0.5,
+            "tempo": float(song['tempo']) if song['tempo'] else 120
+        }
+    }
+
+
+def _search_songs_sql(query: str, limit: int, offset: int, cursor: str = None):
+    """LIKE 全表扫描搜索（搜索索引未就绪时使用），返回 (songs, next_cursor)"""
+    engine = recommender_service._engine
+    cursor_clause, cursor_params = SEARCH_KEYSET.where(cursor)
+    query_sql = text(f"""
+        SELECT 
+            song_id, song_name, artists, album, genre,
+            final_popularity, danceability, energy, valence, tempo, audio_path,
+            {SEARCH_KEYSET.select_sql()}
+        FROM enhanced_song_features
+        WHERE 
+            (song_name LIKE :pattern OR
+            artists LIKE :pattern OR
+            album LIKE :pattern OR
+            genre LIKE :pattern) AND {cursor_clause}
+        ORDER BY 
+            {SEARCH_KEYSET.order_sql()}
+        OFFSET :offset ROWS
+        FETCH NEXT :limit ROWS ONLY
+    """)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            query_sql,
+            {"pattern": f"%{query}%", **cursor_params,
+             "offset": 0 if cursor else offset, "limit": limit + 1}
+        ).fetchall()
+    rows, next_cursor = SEARCH_KEYSET.split(rows, limit)
+    return [_song_to_search_result(dict(row._mapping)) for row in rows], next_cursor
+
 # 在song.py中添加搜索API
 # 在song.py的bp路由中添加
 @bp.route('/search', methods=['GET'])
@@ -481,72 +445,78 @@ def search_songs():
         
         limit = min(request.args.get('limit', 50, type=int), 100)
         offset = request.args.get('offset', 0, type=int)
-        
-        engine = recommender_service._engine
-        
-        # 构建搜索查询
-        search_pattern = f"%{query}%"
-        
-        query_sql = text("""
-            SELECT 
-                song_id, song_name, artists, album, genre,
-                final_popularity as popularity,
-                danceability, energy, valence, tempo,
-                audio_path,
-                CASE 
-                    WHEN audio_path IS NOT NULL AND audio_path != '' THEN 1 
-                    ELSE 0 
-                END as has_audio
-            FROM enhanced_song_features
-            WHERE 
-                song_name LIKE :pattern OR
-                artists LIKE :pattern OR
-                album LIKE :pattern OR
-                genre LIKE :pattern
-            ORDER BY 
-                final_popularity DESC
-            OFFSET :offset ROWS
-            FETCH NEXT :limit ROWS ONLY
-        """)
-        
-        with engine.connect() as conn:
-            result = conn.execute(
-                query_sql, 
-                {"pattern": search_pattern, "offset": offset, "limit": limit}
-            )
-            
-            songs = [{
-                "song_id": row.song_id,
-                "song_name": row.song_name,
-                "artists": row.artists,
-                "album": row.album,
-                "genre": row.genre,
-                "popularity": int(row.popularity) if row.popularity else 50,
-                "has_audio": bool(row.has_audio),
-                "audio_features": {
-                    "danceability": float(row.danceability) if row.danceability else 0.5,
-                    "energy": float(row.energy) if row.energy else 0.5,
-                    "valence": float(row.valence) if row.valence else 0.5,
-                    "tempo": float(row.tempo) if row.tempo else 120
-                }
-            } for row in result]
+        cursor = request.args.get('cursor', '').strip()
+        # 游标为上一页最后一首的排序键：内存索引为 [quality, popularity, song_id]，
+        # 数据库回退为 [popularity, song_id]；两条路径排序不同，游标不能混用
+        use_index = song_search_index.is_ready
+        try:
+            after = decode_cursor(cursor, (NUMBER, NUMBER, str) if use_index else (NUMBER, str)) if cursor else None
+        except ValueError:
+            return error(message="分页游标无效或已过期，请重新搜索", code=400)
+        
+        # 优先使用内存索引，索引未就绪时回退到数据库 LIKE 查询
+        if use_index:
+            song_ids, total, next_key = song_search_index.search(query, limit=limit, offset=offset, after=after)
+            next_cursor = encode_cursor(next_key) if next_key else None
+            records = (song_catalog.get(sid) for sid in song_ids)
+            songs = [_song_to_search_result(r) for r in records if r is not None]
+        else:
+            songs, next_cursor = _search_songs_sql(query, limit, offset, cursor)
+            total = None
         
         logger.info(f"[搜索] 查询: '{query}'，返回 {len(songs)} 个结果")
         
         return success({
             "query": query,
             "songs": songs,
-            "count": len(songs)
+            "count": len(songs),
+            "total": total,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         })
         
     except Exception as e:
         logger.error(f"[搜索错误] {e}", exc_info=True)
         return error(message=f"搜索失败: {str(e)}", code=500)
     
+@bp.route('/suggest', methods=['GET'])
+def suggest_songs():
+    """搜索联想：按前缀返回歌名/艺术家/专辑，按流行度排序"""
+    try:
+        query = request.args.get('q', '').strip()
+        n = max(1, min(request.args.get('n', 10, type=int), Config.SUGGEST_MAX_RESULTS))
+        if not query:
+            return success({"query": query, "suggestions": []})
+        
+        if song_suggest_index.is_ready:
+            suggestions = [s._asdict() for s in song_suggest_index.suggest(query, k=n)]
+        elif song_search_index.is_ready and len(query) >= 2:
+            # 联想索引仍在后台构建：用搜索结果的歌名临时代替
+            song_ids = song_search_index.search(query, limit=n)[0]
+            records = (song_catalog.get(sid) for sid in song_ids)
+            suggestions = [{"text": r['song_name'], "type": "song", "song_id": r['song_id'],
+                            "popularity": float(r['final_popularity'] or 0)}
+                           for r in records if r is not None]
+        else:
+            suggestions = []
+        
+        return success({"query": query, "suggestions": suggestions})
+        
+    except Exception as e:
+        logger.error(f"[联想错误] {e}", exc_info=True)
+        return error(message=f"联想失败: {str(e)}", code=500)
+
 @bp.route('/hot/stats', methods=['GET'])
 def get_hot_stats():
-    """获取热门歌曲分类统计"""
+    """获取热门歌曲分类统计；支持 ETag / If-None-Match"""
     try:
+        if hot_songs.is_ready:
+            stats, etag = hot_songs.stats()
+            return success_with_etag({
+                "stats": stats,
+                "total": sum(s['count'] for s in stats)
+            }, etag)
+        
         engine = recommender_service._engine
         
         query = text("""
@@ -0,0 +1,278 @@
+"""
+歌曲全文搜索：基于字符二元组（bigram）的内存倒排索引
+
+- 歌名、艺术家、专辑、流派统一做 NFKC + 小写归一化后切成字符二元组，
+  中文标题无需分词即可做子串匹配；安装 pypinyin 时额外索引歌名/艺术家的全拼与首字母
+- 倒排表在全量构建时压成有序 int32 数组；管理员编辑产生的增量写入小的 set 增量表，
+  累计到阈值后整体重建
+- 候选集 = 各二元组倒排表求交，再逐条校验子串并按 匹配质量 > 流行度 > song_id 排序，全程不访问数据库
+- 游标为上一页最后一首的排序键 [匹配质量, 流行度, song_id]，按键比较定位，
+  该歌曲被编辑或不再命中（缓存已重算）时也能从正确位置继续
+"""
+import logging
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from importlib.util import find_spec
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from song_catalog import SongCatalog, song_catalog
+
+logger = logging.getLogger(__name__)
+
+PINYIN_AVAILABLE = find_spec('pypinyin') is not None
+if PINYIN_AVAILABLE:
+    from pypinyin import lazy_pinyin
+
+# 字段权重：命中歌名优先于艺术家、专辑、流派，拼音命中排在原文命中之后
+FIELD_WEIGHTS = {
+    'song_name': 4.0,
+    'artists': 3.0,
+    'album': 2.0,
+    'genre': 1.0,
+    'song_name_pinyin': 2.5,
+    'artists_pinyin': 2.0,
+}
+# 匹配方式系数：完全相等 > 前缀 > 词首 > 任意位置
+MATCH_EXACT, MATCH_PREFIX, MATCH_WORD, MATCH_ANY = 3.0, 2.0, 1.5, 1.0
+WORD_SEPARATORS = ' /,&·、，()（）-'
+
+# 增量更新累计到该数量后整体重建倒排表
+REBUILD_THRESHOLD = 2000
+# 缓存的查询结果数（索引变更后整体失效）
+SEARCH_CACHE_SIZE = 512
+
+
+def normalize_text(value) -> str:
+    """NFKC 归一化（全角转半角）、忽略大小写、合并连续空白"""
+    if value is None:
+        return ''
+    return ' '.join(unicodedata.normalize('NFKC', str(value)).casefold().split())
+
+
+def bigrams(text: str) -> set:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def has_cjk(text: str) -> bool:
+    return any('一' <= ch <= '鿿' for ch in text)
+
+
+def pinyin_forms(text: str) -> List[str]:
+    """全拼与首字母两种形式，如 周杰伦 -> ['zhoujielun', 'zjl']"""
+    syllables = [s for s in lazy_pinyin(text) if s.strip()]
+    return [''.join(syllables), ''.join(s[0] for s in syllables)]
+
+
+def song_fields(record: Dict) -> Tuple[Tuple[str, str], ...]:
+    """歌曲记录 -> ((字段名, 归一化文本), ...)"""
+    fields = []
+    for name in ('song_name', 'artists', 'album', 'genre'):
+        text = normalize_text(record.get(name))
+        if text:
+            fields.append((name, text))
+            if PINYIN_AVAILABLE and name in ('song_name', 'artists') and has_cjk(text):
+                fields.extend((f'{name}_pinyin', form) for form in pinyin_forms(text) if form)
+    return tuple(fields)
+
+
+def match_quality(term: str, fields) -> float:
+    """单个查询词在各字段中的最佳匹配得分，未命中为 0"""
+    best = 0.0
+    for name, text in fields:
+        pos = text.find(term)
+        if pos < 0:
+            continue
+        if pos == 0:
+            factor = MATCH_EXACT if len(text) == len(term) else MATCH_PREFIX
+        elif text[pos - 1] in WORD_SEPARATORS:
+            factor = MATCH_WORD
+        else:
+            factor = MATCH_ANY
+        best = max(best, FIELD_WEIGHTS[name] * factor)
+    return best
+
+
+class SongSearchIndex:
+    """订阅 SongCatalog 的搜索索引，目录重载时重建、编辑时增量更新"""
+
+    def __init__(self, catalog: SongCatalog, rebuild_threshold: int = REBUILD_THRESHOLD):
+        self._catalog = catalog
+        self._lock = threading.RLock()
+        self._rebuild_threshold = rebuild_threshold
+        # doc_id -> (song_id, fields, popularity)；删除的文档置为 None
+        self._docs: List[Optional[Tuple]] = []
+        self._doc_of: Dict[str, int] = {}
+        self._postings: Dict[str, np.ndarray] = {}
+        self._delta: Dict[str, set] = defaultdict(set)
+        self._delta_docs = 0
+        # 查询 -> 排好序的 (song_id, 匹配质量, 流行度) 数组
+        self._cache: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self.built_at: Optional[float] = None
+        catalog.subscribe(self._on_catalog_change)
+
+    @property
+    def is_ready(self) -> bool:
+        return self.built_at is not None
+
+    # ---------- 构建与增量更新 ----------
+
+    def _on_catalog_change(self, event, song_id, record):
+        if event == 'reload':
+            self.rebuild()
+        elif event == 'update':
+            self.update(record)
+        elif event == 'remove':
+            self.remove(song_id)
+
+    @staticmethod
+    def _make_doc(record: Dict) -> Tuple:
+        return (record['song_id'], song_fields(record), float(record.get('final_popularity') or 0))
+
+    def rebuild(self):
+        start = time.time()
+        docs, doc_of = [], {}
+        grams_to_docs = defaultdict(list)
+        for record in self._catalog.songs():
+            doc = self._make_doc(record)
+            doc_id = len(docs)
+            docs.append(doc)
+            doc_of[doc[0]] = doc_id
+            grams = set()
+            for _, text in doc[1]:
+                grams |= bigrams(text)
+            for gram in grams:
+                grams_to_docs[gram].append(doc_id)
+        # 文档按顺序编号，列表天然有序
+        postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in grams_to_docs.items()}
+
+        with self._lock:
+            self._docs, self._doc_of, self._postings = docs, doc_of, postings
+            self._delta = defaultdict(set)
+            self._delta_docs = 0
+            self._invalidate()
+            self.built_at = time.time()
+        logger.info(f"搜索索引已构建: {len(docs)} 首歌曲, {len(postings)} 个二元组, "
+                    f"耗时 {time.time() - start:.2f}秒")
+
+    def update(self, record: Dict):
+        """新增或修改一首歌曲；旧二元组留在倒排表中，查询时由子串校验过滤"""
+        doc = self._make_doc(record)
+        with self._lock:
+            doc_id = self._doc_of.get(doc[0])
+            if doc_id is None:
+                doc_id = len(self._docs)
+                self._docs.append(doc)
+                self._doc_of[doc[0]] = doc_id
+            else:
+                self._docs[doc_id] = doc
+            for _, text in doc[1]:
+                for gram in bigrams(text):
+                    self._delta[gram].add(doc_id)
+            self._delta_docs += 1
+            self._invalidate()
+            needs_rebuild = self._delta_docs >= self._rebuild_threshold
+        if needs_rebuild:
+            self.rebuild()
+
+    def remove(self, song_id: str):
+        with self._lock:
+            doc_id = self._doc_of.pop(str(song_id), None)
+            if doc_id is not None:
+                self._docs[doc_id] = None
+                self._invalidate()
+
+    def _invalidate(self):
+        self._cache.clear()
+
+    # ---------- 查询 ----------
+
+    def _posting(self, gram: str) -> np.ndarray:
+        base = self._postings.get(gram)
+        delta = self._delta.get(gram)
+        if not delta:
+            return base if base is not None else np.empty(0, dtype=np.int32)
+        delta = np.fromiter(delta, dtype=np.int32, count=len(delta))
+        return delta if base is None else np.union1d(base, delta)
+
+    def _candidates(self, terms: List[str]) -> Optional[np.ndarray]:
+        """各查询词二元组倒排表的交集；全部是单字查询词时返回 None（需逐条校验）"""
+        grams = set()
+        for term in terms:
+            grams |= bigrams(term)
+        if not grams:
+            return None
+        postings = sorted((self._posting(g) for g in grams), key=len)
+        result = postings[0]
+        for posting in postings[1:]:
+            if len(result) == 0:
+                break
+            result = np.intersect1d(result, posting, assume_unique=True)
+        return result
+
+    def search(self, query: str, limit: int = 50, offset: int = 0,
+               after: Optional[list] = None) -> Tuple[List[str], int, Optional[list]]:
+        """返回 (按相关度排序的 song_id 列表, 命中总数, 下一页游标键)
+
+        查询按空白拆成多个词，每个词都须命中某个字段（AND 语义）。
+        完整排序结果按查询缓存（索引变更时清空），翻页和重复输入不再重新计算。
+        after 为上一页最后一首的排序键 [quality, popularity, song_id]，给出时忽略 offset。
+        """
+        terms = normalize_text(query).split()
+        if not terms:
+            return [], 0, None
+        with self._lock:
+            key = ' '.join(terms)
+            ranked = self._cache.get(key)
+            if ranked is None:
+                ranked = self._rank(terms)
+                if len(self._cache) >= SEARCH_CACHE_SIZE:
+                    self._cache.pop(next(iter(self._cache)))
+                self._cache[key] = ranked
+        song_ids, quality, popularity = ranked
+        if after is not None:
+            last_quality, last_popularity, last_song = float(after[0]), float(after[1]), str(after[2])
+            # 排在游标（含）之前的歌曲数即起始位置
+            offset = int(np.count_nonzero(
+                (quality > last_quality) | ((quality == last_quality) & (
+                    (popularity > last_popularity) | ((popularity == last_popularity) & (song_ids <= last_song))))))
+        end = offset + limit
+        next_key = None
+        if limit > 0 and end < len(song_ids):
+            last = end - 1
+            next_key = [float(quality[last]), float(popularity[last]), str(song_ids[last])]
+        return song_ids[offset:end].tolist(), len(song_ids), next_key
+
+    def _rank(self, terms: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        candidates = self._candidates(terms)
+        docs = self._docs
+        doc_ids = np.arange(len(docs)) if candidates is None else candidates
+        quality = np.zeros(len(doc_ids))
+        popularity = np.zeros(len(doc_ids))
+        for i, doc_id in enumerate(doc_ids.tolist()):
+            doc = docs[doc_id]
+            if doc is None:
+                continue
+            fields = doc[1]
+            total = 0.0
+            for term in terms:
+                q = match_quality(term, fields)
+                if q == 0.0:
+                    total = 0.0
+                    break
+                total += q
+            quality[i] = total
+            popularity[i] = doc[2]
+        hit = quality > 0
+        doc_ids, quality, popularity = doc_ids[hit], quality[hit], popularity[hit]
+        song_ids = np.array([docs[d][0] for d in doc_ids.tolist()], dtype=str)
+        # 匹配质量优先，其次流行度，同分按 song_id，保证游标可按键比较
+        order = np.lexsort((song_ids, -popularity, -quality))
+        return song_ids[order], quality[order], popularity[order]
+
+
+# 全局搜索索引（随 song_catalog 加载自动构建）
+song_search_index = SongSearchIndex(song_catalog)
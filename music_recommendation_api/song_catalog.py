@@ -0,0 +1,109 @@
+"""
+歌曲目录：enhanced_song_features 的进程内副本
+
+启动时一次性读入歌曲的展示字段，搜索、联想等内存索引订阅目录变更：
+    - load()          全量重载，通知 ('reload', None, None)
+    - refresh_song()  管理员编辑后按主键重读一行，通知 ('update', song_id, record)
+    - remove()        删除歌曲，通知 ('remove', song_id, None)
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+CATALOG_COLUMNS = [
+    'song_id', 'song_name', 'artists', 'album', 'genre', 'genre_clean', 'final_popularity',
+    'popularity', 'popularity_tier', 'danceability', 'energy', 'valence', 'tempo', 'audio_path', 'track_id'
+]
+
+
+class SongCatalog:
+    """线程安全的歌曲目录，记录以 song_id 为键的字典"""
+
+    def __init__(self):
+        self._songs: Dict[str, Dict] = {}
+        self._lock = threading.RLock()
+        self._listeners: List[Callable] = []
+        self.version = 0
+        self.loaded_at: Optional[float] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def __len__(self):
+        return len(self._songs)
+
+    def subscribe(self, callback: Callable):
+        """注册变更回调 callback(event, song_id, record)；目录已加载时立即补发一次 reload"""
+        with self._lock:
+            self._listeners.append(callback)
+            if self.is_loaded:
+                callback('reload', None, None)
+
+    def _notify(self, event: str, song_id: Optional[str], record: Optional[Dict]):
+        self.version += 1
+        for callback in self._listeners:
+            try:
+                callback(event, song_id, record)
+            except Exception as e:
+                logger.error(f"歌曲目录回调失败 ({event}): {e}", exc_info=True)
+
+    @staticmethod
+    def _to_record(row) -> Dict:
+        record = dict(row._mapping)
+        record['song_id'] = str(record['song_id'])
+        return record
+
+    def load(self, engine) -> int:
+        """从数据库全量读取歌曲目录"""
+        start = time.time()
+        query = text(f"SELECT {', '.join(CATALOG_COLUMNS)} FROM enhanced_song_features")
+        with engine.connect() as conn:
+            songs = {}
+            for row in conn.execute(query):
+                record = self._to_record(row)
+                songs[record['song_id']] = record
+        with self._lock:
+            self._songs = songs
+            self.loaded_at = time.time()
+            self._notify('reload', None, None)
+        logger.info(f"歌曲目录已加载: {len(songs)} 首，耗时 {time.time() - start:.2f}秒")
+        return len(songs)
+
+    def refresh_song(self, engine, song_id: str):
+        """按主键重读一首歌曲（编辑后调用），数据库中已不存在时从目录移除"""
+        if not self.is_loaded:
+            return
+        query = text(f"SELECT {', '.join(CATALOG_COLUMNS)} FROM enhanced_song_features "
+                     f"WHERE song_id = :song_id")
+        with engine.connect() as conn:
+            row = conn.execute(query, {"song_id": song_id}).fetchone()
+        if row is None:
+            self.remove(song_id)
+            return
+        record = self._to_record(row)
+        with self._lock:
+            self._songs[record['song_id']] = record
+            self._notify('update', record['song_id'], record)
+
+    def remove(self, song_id: str):
+        with self._lock:
+            if self._songs.pop(str(song_id), None) is not None:
+                self._notify('remove', str(song_id), None)
+
+    def get(self, song_id: str) -> Optional[Dict]:
+        return self._songs.get(str(song_id))
+
+    def songs(self) -> List[Dict]:
+        """当前目录快照（列表本身可随意修改，记录请视为只读）"""
+        with self._lock:
+            return list(self._songs.values())
+
+
+# 全局歌曲目录（RecommenderService 初始化时加载）
+song_catalog = SongCatalog()
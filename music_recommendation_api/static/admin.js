@@ -3,6 +3,8 @@ const API_BASE_URL = "http://127.0.0.1:5000/api/v1";
 let adminToken = localStorage.getItem('admin_token');
 let currentPage = { songs: 1, users: 1 };
 let totalPages = { songs: 1, users: 1 };
+// 游标分页：pageCursors[type][p - 1] 为加载第 p 页的游标（第 1 页为 null），随“下一页”逐页记录
+let pageCursors = { songs: [null], users: [null], comments: [null] };
 let songsData = [];
 let usersData = [];
 let sortConfig = { field: 'song_id', direction: 'asc' };
@@ -1941,6 +1943,7 @@ async function loadUsersList(page = 1) {
         
         if (keyword) params.append('keyword', keyword);
         if (activity) params.append('activity_level', activity);
+        applyPageCursor(params, 'users', page);
         
         const url = `${API_BASE_URL}/admin/users?${params.toString()}`;
         console.log('Fetching URL:', url);
@@ -1960,8 +1963,9 @@ async function loadUsersList(page = 1) {
             usersData = result.data.users || [];
             const total = result.data.total || 0;
             totalPages.users = Math.ceil(total / 10) || 1;
+            rememberNextCursor('users', page, result.data.next_cursor);
             renderUsersTable();
-            renderPagination('users', totalPages.users, page);
+            renderPagination('users', totalPages.users, page, result.data.has_more);
         } else {
             throw new Error(result.message);
         }
@@ -2200,7 +2204,18 @@ function refreshUsers() {
 }
 
 // ==================== 分页组件 ====================
-function renderPagination(type, total, current) {
+// 第 1 页重新开始记录游标；已走过的页用游标翻页，直接跳到未走过的页时回退为 page 参数
+function applyPageCursor(params, type, page) {
+    if (page === 1) pageCursors[type] = [null];
+    const cursor = pageCursors[type][page - 1];
+    if (cursor) params.set('cursor', cursor);
+}
+
+function rememberNextCursor(type, page, nextCursor) {
+    pageCursors[type][page] = nextCursor || null;
+}
+
+function renderPagination(type, total, current, hasMore = current < total) {
     const container = document.getElementById(`${type}-pagination`);
     if (!container) return;
     
@@ -2233,7 +2248,7 @@ function renderPagination(type, total, current) {
         html += `<button class="page-btn" onclick="load${type.charAt(0).toUpperCase() + type.slice(1)}List(${total})">${total}</button>`;
     }
     
-    html += `<button class="page-btn" onclick="load${type.charAt(0).toUpperCase() + type.slice(1)}List(${current + 1})" ${current === total ? 'disabled' : ''}><i class="fas fa-chevron-right"></i></button>`;
+    html += `<button class="page-btn" onclick="load${type.charAt(0).toUpperCase() + type.slice(1)}List(${current + 1})" ${!hasMore ? 'disabled' : ''}><i class="fas fa-chevron-right"></i></button>`;
     html += `<span class="page-info">共 ${total} 页</span>`;
     
     container.innerHTML = html;
@@ -2758,6 +2773,7 @@ async function loadSongsList(page = 1) {
         
         if (keyword) params.append('keyword', keyword);
         if (genreFilterValue) params.append('genre', genreFilterValue);
+        applyPageCursor(params, 'songs', page);
         
         const url = `${API_BASE_URL}/admin/songs?${params.toString()}`;
         console.log('Fetching songs URL:', url);
@@ -2777,8 +2793,9 @@ async function loadSongsList(page = 1) {
             songsData = result.data.songs || [];
             const total = result.data.total || 0;
             totalPages.songs = Math.ceil(total / 20) || 1;
+            rememberNextCursor('songs', page, result.data.next_cursor);
             renderSongsTable();
-            renderPagination('songs', totalPages.songs, page);
+            renderPagination('songs', totalPages.songs, page, result.data.has_more);
         } else {
             throw new Error(result.message);
         }
@@ -2887,7 +2904,9 @@ async function loadSongComments(songId, page = 1) {
     currentCommentsPage = page;
     
     try {
-        const res = await fetch(`${API_BASE_URL}/admin/songs/${songId}/comments?page=${page}&per_page=10`, {
+        const params = new URLSearchParams({ page: page, per_page: 10 });
+        applyPageCursor(params, 'comments', page);
+        const res = await fetch(`${API_BASE_URL}/admin/songs/${songId}/comments?${params.toString()}`, {
             headers: {'Authorization': `Bearer ${adminToken}`}
         });
         
@@ -2897,9 +2916,10 @@ async function loadSongComments(songId, page = 1) {
             currentSongComments = result.data.comments;
             const total = result.data.pagination.total;
             commentsTotalPages = result.data.pagination.pages;
+            rememberNextCursor('comments', page, result.data.pagination.next_cursor);
             
             renderCommentsTable();
-            renderCommentsPagination(total, page);
+            renderCommentsPagination(total, page, result.data.pagination.has_more);
             
             // 确保展开按钮工作正常
             setTimeout(() => {
@@ -3098,7 +3118,7 @@ async function deleteCommentAdmin(commentId) {
 }
 
 // ==================== 评论分页 ====================
-function renderCommentsPagination(total, current) {
+function renderCommentsPagination(total, current, hasMore = current < commentsTotalPages) {
     const container = document.getElementById('comments-pagination');
     if (!container) return;
     
@@ -3131,7 +3151,7 @@ function renderCommentsPagination(total, current) {
         html += `<button class="page-btn" onclick="loadCommentsPage(${commentsTotalPages})">${commentsTotalPages}</button>`;
     }
     
-    html += `<button class="page-btn" onclick="loadCommentsPage(${current + 1})" ${current === commentsTotalPages ? 'disabled' : ''}><i class="fas fa-chevron-right"></i></button>`;
+    html += `<button class="page-btn" onclick="loadCommentsPage(${current + 1})" ${!hasMore ? 'disabled' : ''}><i class="fas fa-chevron-right"></i></button>`;
     html += `<span class="page-info">共 ${commentsTotalPages} 页，${total} 条评论</span>`;
     
     container.innerHTML = html;
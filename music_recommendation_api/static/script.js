@@ -3592,6 +3592,9 @@ let currentSearchQuery = '';
 let searchResults = [];
 let searchOffset = 0;
 const SEARCH_PAGE_SIZE = 20;
+const SUGGEST_DEBOUNCE_MS = 150;
+let suggestTimer = null;
+let suggestController = null;
 
 // 初始化搜索
 function initSearch() {
@@ -3623,12 +3626,57 @@ function initSearch() {
         }
     });
     
+    // 输入联想（防抖，只保留最新一次请求的结果）
+    searchInput.addEventListener('input', () => {
+        clearTimeout(suggestTimer);
+        suggestTimer = setTimeout(() => fetchSuggestions(searchInput.value.trim()), SUGGEST_DEBOUNCE_MS);
+    });
+    
     // 清除搜索
     if (clearBtn) {
         clearBtn.addEventListener('click', clearSearch);
     }
 }
 
+// 获取搜索联想并填充到 datalist
+async function fetchSuggestions(query) {
+    const datalist = document.getElementById('explore-search-suggestions');
+    if (!datalist) return;
+    
+    if (suggestController) suggestController.abort();
+    if (!query) {
+        datalist.innerHTML = '';
+        return;
+    }
+    
+    suggestController = new AbortController();
+    try {
+        const response = await fetch(
+            `${API_BASE_URL}/songs/suggest?q=${encodeURIComponent(query)}&n=8`,
+            { signal: suggestController.signal }
+        );
+        if (!response.ok) return;
+        const data = await response.json();
+        if (!data.success) return;
+        
+        const typeLabels = { song: '歌曲', artist: '艺术家', album: '专辑' };
+        datalist.innerHTML = '';
+        const seen = new Set();
+        for (const item of data.data.suggestions) {
+            if (seen.has(item.text)) continue;
+            seen.add(item.text);
+            const option = document.createElement('option');
+            option.value = item.text;
+            option.label = typeLabels[item.type] || item.type;
+            datalist.appendChild(option);
+        }
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            console.warn('[联想] 获取失败:', error);
+        }
+    }
+}
+
 // 执行搜索
 async function performSearch(query) {
     console.log(`[搜索] 执行搜索: "${query}"`);
@@ -0,0 +1,169 @@
+"""
+搜索联想（typeahead）：排序数组 + 二分查找的前缀索引
+
+- 联想词来自歌名、艺术家（按分隔符拆成单人）和专辑，归一化方式与搜索索引一致，
+  安装 pypinyin 时中文联想词额外以全拼和首字母作为前缀键
+- 所有前缀键排成一个有序列表，查询用 bisect 定位前缀区间后按流行度取 top-k；
+  1~2 个字符的短前缀区间很大，构建时预先算好各自的 top-k
+- 条目总数受 SUGGEST_MAX_ENTRIES 限制（保留最热门的），内存有上界
+- 歌曲目录变更后在后台线程重建，构建期间继续使用旧快照
+"""
+import heapq
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Optional
+
+from config import Config
+from search_index import PINYIN_AVAILABLE, has_cjk, pinyin_forms, normalize_text
+from song_catalog import SongCatalog, song_catalog
+
+logger = logging.getLogger(__name__)
+
+# 预先计算 top-k 的短前缀长度
+SHORT_PREFIX_LEN = 2
+# 长前缀区间最多扫描的键数（超出部分按键序截断）
+MAX_SCAN = 20000
+ARTIST_SEPARATORS = re.compile(r'\s*[/,&、，;；]\s*')
+
+
+class Suggestion(NamedTuple):
+    text: str
+    type: str                 # song / artist / album
+    song_id: Optional[str]    # 仅歌曲联想有值（同名歌曲中最热门的一首）
+    popularity: float
+
+
+class _Snapshot(NamedTuple):
+    keys: List[str]               # 有序前缀键
+    refs: List[int]               # keys[i] 对应的联想条目下标
+    suggestions: List[Suggestion]
+    short_top: Dict[str, List[int]]
+
+
+def _search_keys(text: str) -> List[str]:
+    key = normalize_text(text)
+    if not key:
+        return []
+    keys = [key]
+    if PINYIN_AVAILABLE and has_cjk(key):
+        keys.extend(form for form in pinyin_forms(key) if form)
+    return keys
+
+
+def build_snapshot(songs: List[Dict], max_entries: int, top_k: int) -> _Snapshot:
+    """由歌曲记录构建联想快照"""
+    # (类型, 归一化文本) -> [展示文本, song_id, 流行度]；同名条目合并，保留最热门的一条
+    entries: Dict[tuple, list] = {}
+
+    def add(identity, text, song_id, popularity):
+        entry = entries.get(identity)
+        if entry is None or popularity > entry[2]:
+            entries[identity] = [text, song_id, popularity]
+
+    for song in songs:
+        popularity = float(song.get('final_popularity') or 0)
+        if song.get('song_name'):
+            add(('song', normalize_text(song['song_name'])), str(song['song_name']),
+                song['song_id'], popularity)
+        for artist in ARTIST_SEPARATORS.split(str(song.get('artists') or '').strip()):
+            if artist:
+                add(('artist', normalize_text(artist)), artist, None, popularity)
+        if song.get('album'):
+            add(('album', normalize_text(song['album'])), str(song['album']), None, popularity)
+
+    items = list(entries.items())
+    if len(items) > max_entries:
+        items = heapq.nlargest(max_entries, items, key=lambda item: item[1][2])
+    suggestions = [Suggestion(text, kind, song_id, popularity)
+                   for (kind, _), (text, song_id, popularity) in items]
+
+    rows = []
+    for idx, s in enumerate(suggestions):
+        for key in _search_keys(s.text):
+            rows.append((key, -s.popularity, idx))
+    rows.sort()
+
+    short_candidates: Dict[str, set] = {}
+    for key, _, idx in rows:
+        for length in range(1, min(SHORT_PREFIX_LEN, len(key)) + 1):
+            short_candidates.setdefault(key[:length], set()).add(idx)
+    short_top = {
+        prefix: heapq.nlargest(top_k, ids, key=lambda i: suggestions[i].popularity)
+        for prefix, ids in short_candidates.items()
+    }
+    return _Snapshot([r[0] for r in rows], [r[2] for r in rows], suggestions, short_top)
+
+
+class SongSuggestIndex:
+    """订阅 SongCatalog 的联想索引，目录变更时在后台重建"""
+
+    def __init__(self, catalog: SongCatalog,
+                 max_entries: int = Config.SUGGEST_MAX_ENTRIES,
+                 top_k: int = Config.SUGGEST_MAX_RESULTS):
+        self._catalog = catalog
+        self._max_entries = max_entries
+        self._top_k = top_k
+        self._snapshot: Optional[_Snapshot] = None
+        self._state_lock = threading.Lock()
+        self._building = False
+        self._pending = False
+        self.built_at: Optional[float] = None
+        catalog.subscribe(lambda event, song_id, record: self.schedule_rebuild())
+
+    @property
+    def is_ready(self) -> bool:
+        return self._snapshot is not None
+
+    def schedule_rebuild(self):
+        """请求后台重建；构建中再次请求只会在当前构建结束后再重建一次"""
+        with self._state_lock:
+            if self._building:
+                self._pending = True
+                return
+            self._building = True
+        threading.Thread(target=self._rebuild_loop, name='suggest-index-rebuild', daemon=True).start()
+
+    def _rebuild_loop(self):
+        while True:
+            with self._state_lock:
+                self._pending = False
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"联想索引构建失败: {e}", exc_info=True)
+            with self._state_lock:
+                if not self._pending:
+                    self._building = False
+                    return
+
+    def rebuild(self):
+        start = time.time()
+        snapshot = build_snapshot(self._catalog.songs(), self._max_entries, self._top_k)
+        # 单次赋值原子替换，进行中的查询继续使用旧快照
+        self._snapshot = snapshot
+        self.built_at = time.time()
+        logger.info(f"联想索引已构建: {len(snapshot.suggestions)} 个条目, {len(snapshot.keys)} 个前缀键, "
+                    f"耗时 {time.time() - start:.2f}秒")
+
+    def suggest(self, query: str, k: int = 10) -> List[Suggestion]:
+        snapshot = self._snapshot
+        prefix = normalize_text(query)
+        if snapshot is None or not prefix:
+            return []
+        k = min(k, self._top_k)
+
+        if len(prefix) <= SHORT_PREFIX_LEN:
+            ids = snapshot.short_top.get(prefix, [])[:k]
+        else:
+            lo = bisect_left(snapshot.keys, prefix)
+            hi = bisect_left(snapshot.keys, prefix + '\U0010ffff', lo, min(lo + MAX_SCAN, len(snapshot.keys)))
+            ids = heapq.nlargest(k, set(snapshot.refs[lo:hi]),
+                                 key=lambda i: snapshot.suggestions[i].popularity)
+        return [snapshot.suggestions[i] for i in ids]
+
+
+# 全局联想索引（随 song_catalog 加载在后台构建）
+song_suggest_index = SongSuggestIndex(song_catalog)
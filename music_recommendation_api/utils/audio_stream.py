@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频文件发送工具
+
+- 完整文件与单个 Range 交给 send_file：文件对象经 wsgi.file_wrapper 发送（服务器支持时零拷贝），
+  If-Range / 416 由 Werkzeug 的条件请求处理完成；ETag / Last-Modified 命中时直接返回 304
+- 多段 Range 以 multipart/byteranges 分块流式返回，不整段读入内存；后缀形式 bytes=-N 两条路径都支持
+- 配置了 X-Accel-Redirect 内部路径时只返回响应头，由 nginx 发送文件并处理 Range
+"""
+import os
+import uuid
+from typing import Iterator, List, Optional, Tuple
+
+from flask import Response, request, send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+
+AUDIO_MIMETYPES = {
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.ogg': 'audio/ogg',
+    '.m4a': 'audio/mp4',
+    '.flac': 'audio/flac'
+}
+# 单次请求最多接受的 Range 段数，超出按完整文件返回
+MAX_RANGES = 16
+CHUNK_SIZE = 64 * 1024
+EXPOSE_HEADERS = 'Content-Range, Content-Length, Accept-Ranges, ETag, Last-Modified'
+
+
+def audio_mimetype(path: str) -> str:
+    return AUDIO_MIMETYPES.get(os.path.splitext(path)[1].lower(), 'application/octet-stream')
+
+
+def audio_etag(size: int, mtime: float) -> str:
+    """由文件大小和修改时间生成 ETag，文件替换后随之变化"""
+    return f"{int(mtime * 1000):x}-{size:x}"
+
+
+def parse_ranges(header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    """解析 Range 头为 [(start, end)]（闭区间，已排序合并）
+
+    返回 None 表示忽略 Range（缺失、格式不合法或段数过多），按完整文件返回；
+    返回空列表表示所有段都无法满足（416）。
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    specs = [s.strip() for s in header[6:].split(',') if s.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+    ranges = []
+    for spec in specs:
+        first, sep, last = spec.partition('-')
+        if not sep:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else None
+                # 起点超出文件的段不可满足，跳过（开放区间的终点按文件末尾算，不能拿来比较）
+                if start >= size:
+                    continue
+                if end is None:
+                    end = size - 1
+                elif start > end:
+                    return None
+            else:
+                # 后缀形式：最后 N 个字节
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def iter_file_range(path: str, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """按块读取 [start, end] 字节"""
+    remaining = end - start + 1
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _range_response(path: str, size: int, mimetype: str, start: int, end: int, status: int = 206) -> Response:
+    response = Response(iter_file_range(path, start, end), status, mimetype=mimetype,
+                        direct_passthrough=True)
+    response.headers['Content-Length'] = str(end - start + 1)
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def _multi_range_response(path: str, size: int, mimetype: str, ranges: Optional[List[Tuple[int, int]]]) -> Response:
+    """多段 Range：合并后仍为多段时返回 multipart/byteranges"""
+    if ranges is None:
+        return _range_response(path, size, mimetype, 0, size - 1, status=200)
+    if not ranges:
+        response = Response(status=416)
+        response.headers['Content-Range'] = f'bytes */{size}'
+        return response
+    if len(ranges) == 1:
+        return _range_response(path, size, mimetype, *ranges[0])
+
+    boundary = uuid.uuid4().hex
+    heads = [(f"--{boundary}\r\nContent-Type: {mimetype}\r\n"
+              f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode('ascii')
+             for start, end in ranges]
+    tail = f"\r\n--{boundary}--\r\n".encode('ascii')
+    length = sum(len(h) + (end - start + 1) for h, (start, end) in zip(heads, ranges))
+    length += 2 * (len(ranges) - 1) + len(tail)
+
+    def generate():
+        for i, (head, (start, end)) in enumerate(zip(heads, ranges)):
+            if i:
+                yield b"\r\n"
+            yield head
+            yield from iter_file_range(path, start, end)
+        yield tail
+
+    response = Response(generate(), 206, mimetype=f'multipart/byteranges; boundary={boundary}',
+                        direct_passthrough=True)
+    response.headers['Content-Length'] = str(length)
+    return response
+
+
+def send_audio(path: str, size: int, mtime: float, mimetype: str,
+               download_name: Optional[str] = None, accel_path: Optional[str] = None,
+               max_age: int = 3600) -> Response:
+    """发送音频文件，支持条件请求与（多段）Range"""
+    etag = audio_etag(size, mtime)
+
+    if accel_path:
+        # nginx 内部重定向：由 nginx 读取文件并处理 Range / 条件请求
+        response = Response(status=200, mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = accel_path
+        response.set_etag(etag)
+        response.last_modified = mtime
+    else:
+        range_header = request.headers.get('Range', '')
+        if_range = request.headers.get('If-Range')
+        range_valid = not if_range or if_range.strip('"') == etag
+        fresh = request.if_none_match.contains(etag) or (
+            not request.if_none_match and request.if_modified_since is not None
+            and int(mtime) <= request.if_modified_since.timestamp())
+
+        if fresh:
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.last_modified = mtime
+        elif ',' in range_header and range_valid:
+            # Werkzeug 只处理单段 Range，多段自行分块返回
+            response = _multi_range_response(path, size, mimetype, parse_ranges(range_header, size))
+            response.set_etag(etag)
+            response.last_modified = mtime
+        else:
+            # 完整文件与单段 Range（含 If-Range）由 send_file 的条件请求处理
+            try:
+                response = send_file(path, mimetype=mimetype, as_attachment=False,
+                                     download_name=download_name, conditional=True,
+                                     etag=etag, last_modified=mtime, max_age=max_age)
+            except RequestedRangeNotSatisfiable as e:
+                response = e.get_response()
+
+    response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Access-Control-Expose-Headers'] = EXPOSE_HEADERS
+    return response
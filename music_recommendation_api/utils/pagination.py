@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+游标（keyset）分页工具
+
+游标是排序键（上一页最后一条记录的各排序字段）经 JSON + URL 安全 base64 编码的不透明字符串，
+客户端只需原样回传 next_cursor。数据库列表用 Keyset 生成
+    WHERE (k1 < :v1) OR (k1 = :v1 AND k2 < :v2) ...
+代替 OFFSET，深翻页与第一页代价相同；总数由 CountCache 按筛选条件缓存。
+多个接口共用的总数（如各歌曲评论数）放在本模块的共享缓存中，任一写入路径都能使其失效。
+"""
+import base64
+import json
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from config import Config
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"无法编码到游标: {value!r}")
+
+
+def _json_hook(obj):
+    if set(obj) == {"dt"}:
+        return datetime.fromisoformat(obj["dt"])
+    if set(obj) == {"d"}:
+        return date.fromisoformat(obj["d"])
+    return obj
+
+
+def encode_cursor(key) -> str:
+    """排序键（list/tuple）-> 游标字符串"""
+    raw = json.dumps(list(key), ensure_ascii=False, separators=(',', ':'),
+                     default=_json_default).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+# 游标中数值排序键允许的类型
+NUMBER = (int, float)
+
+
+def decode_cursor(cursor: str, types: Optional[Sequence] = None) -> list:
+    """游标字符串 -> 排序键；给出 types（如 (int, NUMBER, str)）时同时校验长度与各项类型。
+    格式不合法时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'),
+                         object_hook=_json_hook)
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+    if not isinstance(key, list):
+        raise ValueError(f"无效的分页游标: {cursor}")
+    if types is not None and (len(key) != len(types) or not all(
+            isinstance(value, t) and not isinstance(value, bool) for value, t in zip(key, types))):
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return key
+
+
+class Keyset:
+    """一组排序键 [(SQL 表达式, 'ASC'/'DESC'), ...]，最后一项须唯一（通常是主键）
+
+    可为空的列请用 COALESCE 给出哨兵值，否则 NULL 行无法参与比较。
+    """
+
+    def __init__(self, sort_keys: Sequence[Tuple[str, str]]):
+        self.sort_keys = [(expr, 'DESC' if direction.upper() == 'DESC' else 'ASC')
+                          for expr, direction in sort_keys]
+
+    def select_sql(self) -> str:
+        """附加到 SELECT 列表的排序键列（_sort0, _sort1, ...）"""
+        return ", ".join(f"{expr} AS _sort{i}" for i, (expr, _) in enumerate(self.sort_keys))
+
+    def order_sql(self) -> str:
+        return ", ".join(f"{expr} {direction}" for expr, direction in self.sort_keys)
+
+    def where(self, cursor: Optional[str]) -> Tuple[str, Dict]:
+        """游标 -> (WHERE 条件, 参数)；无游标时返回恒真条件。游标不合法时抛出 ValueError"""
+        if not cursor:
+            return "1=1", {}
+        values = decode_cursor(cursor)
+        if len(values) != len(self.sort_keys):
+            raise ValueError(f"无效的分页游标: {cursor}")
+        branches = []
+        for i, (expr, direction) in enumerate(self.sort_keys):
+            terms = [f"{prev} = :_cursor{j}" for j, (prev, _) in enumerate(self.sort_keys[:i])]
+            terms.append(f"{expr} {'<' if direction == 'DESC' else '>'} :_cursor{i}")
+            branches.append("(" + " AND ".join(terms) + ")")
+        params = {f"_cursor{i}": value for i, value in enumerate(values)}
+        return "(" + " OR ".join(branches) + ")", params
+
+    def split(self, rows: List, limit: int) -> Tuple[List, Optional[str]]:
+        """按 limit + 1 条查询的结果 -> (本页记录, 下一页游标)"""
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        last = rows[-1]._mapping
+        return rows, encode_cursor([last[f"_sort{i}"] for i in range(len(self.sort_keys))])
+
+    @staticmethod
+    def record(row) -> Dict:
+        """数据库行 -> 去掉排序键列的字典"""
+        return {k: v for k, v in row._mapping.items() if not k.startswith('_sort')}
+
+
+class CountCache:
+    """按筛选条件缓存列表总数，过期前翻页直接返回缓存值（近似总数）"""
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._counts: Dict[Hashable, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], int]) -> int:
+        now = time.time()
+        with self._lock:
+            cached = self._counts.get(key)
+        if cached is not None and now - cached[1] < self._ttl:
+            return cached[0]
+        count = int(compute())
+        with self._lock:
+            if len(self._counts) >= self._max_entries:
+                self._counts.pop(next(iter(self._counts)))
+            self._counts[key] = (count, now)
+        return count
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None):
+        """清除全部或满足 predicate 的缓存项（增删记录后调用）"""
+        with self._lock:
+            if predicate is None:
+                self._counts.clear()
+            else:
+                for key in [k for k in self._counts if predicate(k)]:
+                    del self._counts[key]
+
+
+# 各歌曲评论总数（键为 song_id）：用户评论列表与管理后台评论列表共用，发表/删除评论时失效
+song_comment_counts = CountCache(Config.PAGINATION_COUNT_TTL)
@@ -3,7 +3,7 @@
 """
 统一响应格式工具
 """
-from flask import jsonify
+from flask import jsonify, make_response, request
 
 def success(data=None, message="success", code=200):
     """成功响应"""
@@ -23,4 +23,14 @@ def error(message="error", code=400, data=None):
         "message": message,
         "data": data
     }
-    return jsonify(response), code
\ No newline at end of file
+    return jsonify(response), code
+
+def success_with_etag(data, etag, message="success"):
+    """带 ETag 的成功响应；客户端 If-None-Match 命中时返回 304 空响应"""
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response, _ = success(data, message=message)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,326 @@
+"""
+SQL方言适配层
+
+路由中的查询按 SQL Server (T-SQL) 编写。本地基准测试改用 SQLite 时，
+install(engine) 会在每条 text() 语句执行前把 T-SQL 写法改写为 SQLite 等价写法，
+路由代码无需区分数据库：
+
+    TOP n / TOP (:n)                  -> LIMIT n（追加到该 SELECT 所在括号层级末尾）
+    OFFSET :o ROWS FETCH NEXT :l ROWS ONLY -> LIMIT :l OFFSET :o
+    ISNULL / LEN / TRY_CAST           -> IFNULL / LENGTH / CAST
+    CAST(x AS DATE) / CONVERT(DATE, x) -> DATE(x)
+    CONVERT(VARCHAR(5), x, 110)       -> strftime('%m-%d', x)
+    sys.tables / SCOPE_IDENTITY()     -> sqlite_master / last_insert_rowid()
+    IF NOT EXISTS ... CREATE TABLE    -> CREATE TABLE IF NOT EXISTS
+
+GETDATE() / DATEADD() / YEAR() 在连接建立时注册为同名 SQLite 函数。
+MERGE 无法机械改写，需要 upsert 的地方通过 get_dialect(engine).upsert_sql() 生成语句，
+批量写入用 upsert_many()（多行 VALUES，一条语句写一批）。
+"""
+import re
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, text
+from sqlalchemy.sql.elements import TextClause
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class SqlDialect:
+    """SQL Server 方言：语句原样执行"""
+    name = 'mssql'
+    # 单条语句的参数个数上限（SQL Server 为 2100）
+    max_params = 2000
+
+    def rewrite(self, sql: str) -> str:
+        return sql
+
+    def upsert_sql(self, table, key_columns, update_columns, touch_column=None) -> str:
+        """按 key_columns 插入或更新一行，参数名与列名一致；touch_column 在更新时写入当前时间"""
+        columns = list(key_columns) + list(update_columns)
+        source = ", ".join(f":{c} AS {c}" for c in key_columns)
+        on = " AND ".join(f"target.{c} = source.{c}" for c in key_columns)
+        assignments = [f"{c} = :{c}" for c in update_columns]
+        if touch_column:
+            assignments.append(f"{touch_column} = GETDATE()")
+        return (
+            f"MERGE {table} AS target "
+            f"USING (SELECT {source}) AS source ON {on} "
+            f"WHEN MATCHED THEN UPDATE SET {', '.join(assignments)} "
+            f"WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) "
+            f"VALUES ({', '.join(':' + c for c in columns)});"
+        )
+
+    def upsert_many_sql(self, table, key_columns, update_columns, row_count, touch_column=None) -> str:
+        """一条语句插入或更新 row_count 行，第 i 行的参数名为 {列名}_{i}"""
+        columns = list(key_columns) + list(update_columns)
+        values = ", ".join("(" + ", ".join(f":{c}_{i}" for c in columns) + ")" for i in range(row_count))
+        on = " AND ".join(f"target.{c} = source.{c}" for c in key_columns)
+        assignments = [f"{c} = source.{c}" for c in update_columns]
+        if touch_column:
+            assignments.append(f"{touch_column} = GETDATE()")
+        return (
+            f"MERGE {table} AS target "
+            f"USING (VALUES {values}) AS source ({', '.join(columns)}) ON {on} "
+            f"WHEN MATCHED THEN UPDATE SET {', '.join(assignments)} "
+            f"WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) "
+            f"VALUES ({', '.join('source.' + c for c in columns)});"
+        )
+
+    def upsert_many(self, conn, table, key_columns, update_columns, rows, touch_column=None) -> int:
+        """按参数上限分批执行 upsert_many_sql；rows 为以列名为键的字典，返回写入行数"""
+        columns = list(key_columns) + list(update_columns)
+        batch_size = max(1, self.max_params // len(columns))
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = {f"{c}_{i}": row[c] for i, row in enumerate(batch) for c in columns}
+            conn.execute(text(self.upsert_many_sql(table, key_columns, update_columns,
+                                                   len(batch), touch_column)), params)
+        return len(rows)
+
+
+class SQLiteDialect(SqlDialect):
+    """SQLite 方言：改写 T-SQL 专有语法"""
+    name = 'sqlite'
+    # 兼容旧版 SQLite 的 SQLITE_MAX_VARIABLE_NUMBER
+    max_params = 999
+
+    _TOP = re.compile(r'\bSELECT(\s+DISTINCT)?\s+TOP\s*(\(\s*[^()]+?\s*\)|\d+|:\w+)\s*', re.I)
+    _OFFSET_FETCH = re.compile(
+        r'\bOFFSET\s+(\S+)\s+ROWS?\s+FETCH\s+(?:NEXT|FIRST)\s+(\S+)\s+ROWS?\s+ONLY', re.I)
+    _IF_NOT_EXISTS_CREATE = re.compile(
+        r'IF\s+NOT\s+EXISTS\s*\(\s*SELECT\s+\*\s+FROM\s+sys\.tables\s+WHERE\s+name\s*=\s*\'\w+\'\s*\)\s*'
+        r'CREATE\s+TABLE\s+', re.I)
+    _SUBSTITUTIONS = [
+        (re.compile(r'\bISNULL\s*\(', re.I), 'IFNULL('),
+        (re.compile(r'\bLEN\s*\(', re.I), 'LENGTH('),
+        (re.compile(r'\bTRY_CAST\s*\(', re.I), 'CAST('),
+        (re.compile(r'\bSCOPE_IDENTITY\s*\(\s*\)', re.I), 'last_insert_rowid()'),
+        (re.compile(r'\bsys\.tables\s+WHERE\s+name\b', re.I), "sqlite_master WHERE type = 'table' AND name"),
+        (re.compile(r'\bDATEADD\s*\(\s*(\w+)\s*,', re.I), r"DATEADD('\1',"),
+        (re.compile(r'\bCAST\s*\(\s*GETDATE\(\)\s*-\s*(\d+)\s+AS\s+DATE\s*\)', re.I),
+         r"DATE(GETDATE(), '-\1 days')"),
+        (re.compile(r'\bINT\s+IDENTITY\s*\(\s*1\s*,\s*1\s*\)\s+PRIMARY\s+KEY', re.I),
+         'INTEGER PRIMARY KEY AUTOINCREMENT'),
+        (re.compile(r'\bDEFAULT\s+GETDATE\(\)', re.I), "DEFAULT (datetime('now', 'localtime'))"),
+        # 同一批次中未用分号分隔的 DDL
+        (re.compile(r'\)\s*\n(\s*CREATE\s+(?:UNIQUE\s+)?(?:INDEX|TABLE)\b)', re.I), r');\n\1'),
+    ]
+
+    def upsert_sql(self, table, key_columns, update_columns, touch_column=None) -> str:
+        columns = list(key_columns) + list(update_columns)
+        assignments = [f"{c} = excluded.{c}" for c in update_columns]
+        if touch_column:
+            assignments.append(f"{touch_column} = GETDATE()")
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(':' + c for c in columns)}) "
+            f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {', '.join(assignments)}"
+        )
+
+    def upsert_many_sql(self, table, key_columns, update_columns, row_count, touch_column=None) -> str:
+        columns = list(key_columns) + list(update_columns)
+        values = ", ".join("(" + ", ".join(f":{c}_{i}" for c in columns) + ")" for i in range(row_count))
+        assignments = [f"{c} = excluded.{c}" for c in update_columns]
+        if touch_column:
+            assignments.append(f"{touch_column} = GETDATE()")
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values} "
+            f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {', '.join(assignments)}"
+        )
+
+    def rewrite(self, sql: str) -> str:
+        sql = self._IF_NOT_EXISTS_CREATE.sub('CREATE TABLE IF NOT EXISTS ', sql)
+        for pattern, repl in self._SUBSTITUTIONS:
+            sql = pattern.sub(repl, sql)
+        sql = self._OFFSET_FETCH.sub(r'LIMIT \2 OFFSET \1', sql)
+        sql = self._rewrite_calls(sql, 'CAST', self._cast_date)
+        sql = self._rewrite_calls(sql, 'CONVERT', self._convert)
+        return self._rewrite_top(sql)
+
+    # ---------- 括号匹配的改写 ----------
+
+    @staticmethod
+    def _closing_paren(sql, open_pos):
+        """返回与 open_pos 处 '(' 匹配的 ')' 位置（跳过字符串字面量）"""
+        depth, i, n = 0, open_pos, len(sql)
+        while i < n:
+            ch = sql[i]
+            if ch == "'":
+                j = sql.find("'", i + 1)
+                i = n if j < 0 else j
+            elif ch == '(':
+                depth += 1
+            elif ch == ')':
+                depth -= 1
+                if depth == 0:
+                    return i
+            i += 1
+        return -1
+
+    @classmethod
+    def _rewrite_calls(cls, sql, func, transform):
+        """对 func(...) 调用逐个应用 transform(参数文本)，返回 None 表示保持原样"""
+        pattern = re.compile(rf'\b{func}\s*\(', re.I)
+        pos = 0
+        while True:
+            m = pattern.search(sql, pos)
+            if not m:
+                return sql
+            close = cls._closing_paren(sql, m.end() - 1)
+            if close < 0:
+                return sql
+            replacement = transform(sql[m.end():close])
+            if replacement is None:
+                pos = m.end()
+                continue
+            sql = sql[:m.start()] + replacement + sql[close + 1:]
+            pos = m.start() + len(replacement)
+
+    @staticmethod
+    def _cast_date(args):
+        m = re.fullmatch(r'\s*(.+?)\s+AS\s+DATE\s*', args, re.I | re.S)
+        return f"DATE({m.group(1)})" if m else None
+
+    @staticmethod
+    def _convert(args):
+        m = re.fullmatch(r'\s*DATE\s*,\s*(.+?)\s*', args, re.I | re.S)
+        if m:
+            return f"DATE({m.group(1)})"
+        # 样式 110 为 mm-dd-yyyy，VARCHAR(5) 截取后即 mm-dd
+        m = re.fullmatch(r'\s*VARCHAR\s*\(\s*5\s*\)\s*,\s*(.+?)\s*,\s*110\s*', args, re.I | re.S)
+        if m:
+            return f"strftime('%m-%d', {m.group(1)})"
+        return None
+
+    def _rewrite_top(self, sql):
+        """SELECT TOP n ... -> SELECT ... LIMIT n，LIMIT 放在该 SELECT 所在括号层级的末尾"""
+        while True:
+            m = self._TOP.search(sql)
+            if not m:
+                return sql
+            limit = m.group(2).strip()
+            if limit.startswith('('):
+                limit = limit[1:-1].strip()
+            head = sql[:m.start()] + 'SELECT' + (m.group(1) or '') + ' '
+            rest = sql[m.end():]
+            end = self._scope_end(rest)
+            body = rest[:end].rstrip()
+            tail = rest[end:]
+            if body.endswith(';'):
+                body, tail = body[:-1].rstrip(), ';' + tail
+            sql = f"{head}{body} LIMIT {limit}{tail}"
+
+    @staticmethod
+    def _scope_end(sql):
+        """当前括号层级结束的位置（遇到未匹配的 ')' 或字符串末尾）"""
+        depth, i, n = 0, 0, len(sql)
+        while i < n:
+            ch = sql[i]
+            if ch == "'":
+                j = sql.find("'", i + 1)
+                i = n if j < 0 else j
+            elif ch == '(':
+                depth += 1
+            elif ch == ')':
+                if depth == 0:
+                    return i
+                depth -= 1
+            i += 1
+        return n
+
+
+_DIALECTS = {'mssql': SqlDialect(), 'sqlite': SQLiteDialect()}
+
+
+def get_dialect(engine) -> SqlDialect:
+    """按引擎类型返回方言对象（未知类型按 SQL Server 处理）"""
+    return _DIALECTS.get(engine.dialect.name, _DIALECTS['mssql'])
+
+
+# ---------- SQLite 函数：模拟 T-SQL 内置函数 ----------
+
+def _getdate():
+    return datetime.now().strftime(DATETIME_FORMAT)
+
+
+def _parse_datetime(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value
+    text = str(value)
+    for fmt in (DATETIME_FORMAT, '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return datetime.fromisoformat(text)
+
+
+def as_date(value):
+    """DATE 列的查询结果转为 date（SQL Server 返回 date/datetime，SQLite 返回字符串）"""
+    if value is None or (isinstance(value, date) and not isinstance(value, datetime)):
+        return value
+    return _parse_datetime(str(value)[:10] if isinstance(value, str) else value).date()
+
+
+def _dateadd(unit, number, value):
+    base = _parse_datetime(value)
+    if base is None or number is None:
+        return None
+    unit = unit.lower()
+    if unit in ('day', 'dd', 'd'):
+        delta = timedelta(days=number)
+    elif unit in ('hour', 'hh'):
+        delta = timedelta(hours=number)
+    elif unit in ('minute', 'mi', 'n'):
+        delta = timedelta(minutes=number)
+    elif unit in ('week', 'wk', 'ww'):
+        delta = timedelta(weeks=number)
+    else:
+        raise ValueError(f"不支持的 DATEADD 单位: {unit}")
+    return (base + delta).strftime(DATETIME_FORMAT)
+
+
+def _year(value):
+    base = _parse_datetime(value)
+    return base.year if base else None
+
+
+def install(engine):
+    """为 SQLite 引擎注册 T-SQL 兼容函数与语句改写；SQL Server 引擎不做任何处理"""
+    dialect = get_dialect(engine)
+    if dialect.name != 'sqlite':
+        return engine
+
+    @event.listens_for(engine, 'connect')
+    def _register_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function('GETDATE', 0, _getdate)
+        dbapi_connection.create_function('DATEADD', 3, _dateadd)
+        dbapi_connection.create_function('YEAR', 1, _year)
+
+    @event.listens_for(engine, 'before_execute', retval=True)
+    def _rewrite_statement(conn, clauseelement, multiparams, params, execution_options):
+        if isinstance(clauseelement, TextClause):
+            rewritten = dialect.rewrite(clauseelement.text)
+            if rewritten != clauseelement.text:
+                clauseelement = clauseelement._generate()
+                clauseelement.text = rewritten
+        elif isinstance(clauseelement, str):
+            clauseelement = dialect.rewrite(clauseelement)
+        return clauseelement, multiparams, params
+
+    def _execute_batch(cursor, statement, parameters, context=None):
+        # sqlite3 一次只能执行一条语句；无参数的 DDL 批次拆开逐条执行
+        if parameters or statement.strip().rstrip(';').count(';') == 0:
+            return None
+        for part in statement.split(';'):
+            if part.strip():
+                cursor.execute(part)
+        return True
+
+    event.listen(engine, 'do_execute', _execute_batch)
+    event.listen(engine, 'do_execute_no_params',
+                 lambda cursor, statement, context: _execute_batch(cursor, statement, None, context))
+    return engine
@@ -0,0 +1,246 @@
+"""
+本地 SQLite 数据库：建表并从导出的数据目录导入数据
+
+数据目录结构与 separated_processed_data（或 synthetic_data_generator.py 的输出）一致，
+导入后即可在无 SQL Server 的环境下跑通完整的请求链路（配合 DB_BACKEND=sqlite）。
+
+用法:
+    python -m utils.sqlite_backend --data-dir ../数据集/数据集汇总/separated_processed_data
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SOURCES = ('internal', 'external')
+
+# 与 数据集汇总/数据库建表.txt 对应的 SQLite 表结构，另含路由用到的评论、配置、音频等表
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS enhanced_song_features (
+    song_id TEXT PRIMARY KEY,
+    song_name TEXT, artists TEXT, album TEXT, duration_ms INTEGER, genre TEXT,
+    popularity REAL DEFAULT 0.0, language TEXT, publish_year INTEGER,
+    tag_score_mean REAL, tag_count INTEGER, avg_sentiment REAL, comment_count INTEGER,
+    total_likes INTEGER, avg_similarity REAL, max_similarity REAL, similar_songs_count INTEGER,
+    playlist_count INTEGER, avg_playlist_order REAL,
+    danceability REAL DEFAULT 0.5, energy REAL DEFAULT 0.5, "key" INTEGER, loudness REAL,
+    mode INTEGER, speechiness REAL DEFAULT 0, acousticness REAL DEFAULT 0,
+    instrumentalness REAL DEFAULT 0, liveness REAL DEFAULT 0, valence REAL DEFAULT 0.5,
+    tempo REAL DEFAULT 120, time_signature INTEGER DEFAULT 4,
+    song_age INTEGER, duration_minutes REAL, popularity_group TEXT, energy_dance REAL,
+    mood_score REAL, final_popularity REAL, final_popularity_norm REAL, recency_score REAL,
+    genre_clean TEXT, popularity_tier TEXT, source TEXT, track_id TEXT, audio_path TEXT,
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    updated_at TEXT DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS enhanced_user_features (
+    user_id TEXT PRIMARY KEY,
+    nickname TEXT, gender INTEGER, age INTEGER, province TEXT, city TEXT,
+    listen_songs INTEGER DEFAULT 0, source TEXT,
+    unique_songs INTEGER DEFAULT 0, total_interactions INTEGER DEFAULT 0,
+    total_weight_sum REAL DEFAULT 0.0, avg_weight REAL DEFAULT 0.0, weight_std REAL,
+    age_group TEXT, activity_level TEXT, diversity_ratio REAL DEFAULT 0.0,
+    top_genre_1 TEXT, top_genre_2 TEXT, top_genre_3 TEXT,
+    avg_popularity_pref REAL, popularity_bias REAL, role TEXT DEFAULT 'user',
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    updated_at TEXT DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS filtered_interactions (
+    interaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL, song_id TEXT NOT NULL,
+    total_weight REAL DEFAULT 0.0, interaction_types TEXT,
+    created_at TEXT DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS train_interactions (
+    train_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL, song_id TEXT NOT NULL,
+    total_weight REAL DEFAULT 0.0, interaction_types TEXT,
+    created_at TEXT DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS test_interactions (
+    test_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL, song_id TEXT NOT NULL,
+    total_weight REAL DEFAULT 0.0, interaction_types TEXT,
+    created_at TEXT DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS recommendations (
+    recommendation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL, song_id TEXT NOT NULL,
+    recommendation_score REAL DEFAULT 0.0, algorithm_type TEXT, rank_position INTEGER DEFAULT 0,
+    is_viewed INTEGER DEFAULT 0, is_clicked INTEGER DEFAULT 0, is_listened INTEGER DEFAULT 0,
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    expires_at TEXT,
+    UNIQUE (user_id, song_id, created_at)
+);
+
+CREATE TABLE IF NOT EXISTS recommendation_daily_buckets (
+    bucket_date TEXT NOT NULL, algorithm_type TEXT NOT NULL,
+    total_recommendations INTEGER NOT NULL DEFAULT 0, views INTEGER NOT NULL DEFAULT 0,
+    clicks INTEGER NOT NULL DEFAULT 0, listens INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT DEFAULT (datetime('now', 'localtime')),
+    PRIMARY KEY (bucket_date, algorithm_type)
+);
+
+CREATE TABLE IF NOT EXISTS user_song_interaction (
+    interaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL, song_id TEXT NOT NULL,
+    behavior_type TEXT, "weight" REAL DEFAULT 1.0,
+    "timestamp" TEXT DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS song_comments (
+    comment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    unified_song_id TEXT NOT NULL, original_user_id TEXT, user_nickname TEXT,
+    content TEXT, liked_count INTEGER DEFAULT 0, comment_time TEXT,
+    sentiment_score REAL, is_positive INTEGER,
+    created_at TEXT DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS comment_likes (
+    like_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    comment_id INTEGER NOT NULL, user_id TEXT NOT NULL,
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (comment_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS system_config (
+    config_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    config_key TEXT NOT NULL UNIQUE, config_value TEXT NOT NULL,
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    updated_at TEXT DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS algorithm_performance_stats (
+    stat_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    algorithm_type TEXT NOT NULL, metric_date TEXT NOT NULL,
+    recall_rate REAL, precision_rate REAL, diversity_score REAL, coverage_rate REAL, ctr_rate REAL, listen_rate REAL,
+    total_recommendations INTEGER, clicks INTEGER, listens INTEGER,
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (algorithm_type, metric_date)
+);
+
+CREATE TABLE IF NOT EXISTS audio_files (
+    track_id TEXT PRIMARY KEY, genre TEXT, filename TEXT, file_path TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_songs_genre_clean ON enhanced_song_features(genre_clean);
+CREATE INDEX IF NOT EXISTS idx_songs_popularity ON enhanced_song_features(final_popularity);
+CREATE INDEX IF NOT EXISTS idx_songs_artists ON enhanced_song_features(artists);
+CREATE INDEX IF NOT EXISTS idx_users_source ON enhanced_user_features(source);
+CREATE INDEX IF NOT EXISTS idx_interactions_user_song ON filtered_interactions(user_id, song_id);
+CREATE INDEX IF NOT EXISTS idx_interactions_song ON filtered_interactions(song_id);
+CREATE INDEX IF NOT EXISTS idx_train_user ON train_interactions(user_id);
+CREATE INDEX IF NOT EXISTS idx_test_user ON test_interactions(user_id);
+CREATE INDEX IF NOT EXISTS idx_recommendations_user ON recommendations(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_recommendations_created ON recommendations(created_at);
+CREATE INDEX IF NOT EXISTS idx_usi_user_time ON user_song_interaction(user_id, "timestamp");
+CREATE INDEX IF NOT EXISTS idx_comments_song ON song_comments(unified_song_id);
+"""
+
+# 表名 -> (导出文件名, 主键)；交互表在 internal/、external/ 下各有一份
+FILE_TABLES = {
+    'enhanced_user_features': ('user_features', 'user_id'),
+    'filtered_interactions': ('interaction_matrix', None),
+    'train_interactions': ('train_interactions', None),
+    'test_interactions': ('test_interactions', None),
+}
+CHUNK_SIZE = 200_000
+
+
+def _read_chunks(stem):
+    """优先读取 .parquet，其次分块读取 .csv；文件不存在时不产出任何数据"""
+    if os.path.exists(stem + '.parquet'):
+        yield pd.read_parquet(stem + '.parquet')
+    elif os.path.exists(stem + '.csv'):
+        yield from pd.read_csv(stem + '.csv', chunksize=CHUNK_SIZE, encoding='utf-8',
+                               dtype={'user_id': str, 'song_id': str})
+
+
+def _append(conn, table, df, key=None):
+    """追加写入；数据中多出的列先补到表结构上，主键重复的行保留第一条"""
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+    for col in df.columns:
+        if col not in existing:
+            conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{col}"')
+            existing.add(col)
+    if key:
+        df = df.drop_duplicates(subset=[key])
+        placeholders = ", ".join("?" * len(df.columns))
+        columns = ", ".join(f'"{c}"' for c in df.columns)
+        conn.executemany(
+            f'INSERT OR IGNORE INTO "{table}" ({columns}) VALUES ({placeholders})',
+            df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+    else:
+        df.to_sql(table, conn, if_exists='append', index=False)
+    return len(df)
+
+
+def bootstrap_sqlite(db_path, data_dir, force=False) -> dict:
+    """建表并导入数据目录；数据库已存在且 force=False 时直接返回"""
+    db_path = Path(db_path)
+    if db_path.exists() and not force:
+        return {}
+    if not os.path.isdir(data_dir):
+        raise FileNotFoundError(f"数据目录不存在: {data_dir}")
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    if db_path.exists():
+        db_path.unlink()
+
+    start = time.time()
+    counts = {}
+    conn = sqlite3.connect(str(db_path))
+    try:
+        # 导入期间不需要崩溃保护，导入完成后恢复默认
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+
+        for df in _read_chunks(os.path.join(data_dir, 'all_song_features')):
+            counts['enhanced_song_features'] = counts.get('enhanced_song_features', 0) + \
+                _append(conn, 'enhanced_song_features', df, key='song_id')
+
+        for source in SOURCES:
+            for table, (filename, key) in FILE_TABLES.items():
+                for df in _read_chunks(os.path.join(data_dir, source, filename)):
+                    if table == 'enhanced_user_features' and 'source' not in df.columns:
+                        df['source'] = source
+                    counts[table] = counts.get(table, 0) + _append(conn, table, df, key=key)
+        conn.commit()
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute("ANALYZE")
+    except Exception:
+        conn.close()
+        db_path.unlink(missing_ok=True)
+        raise
+    conn.close()
+
+    logger.info(f"SQLite 数据库已初始化: {db_path} ({time.time() - start:.1f}s) {counts}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从导出的数据目录初始化本地 SQLite 数据库")
+    parser.add_argument('--data-dir', required=True,
+                        help="数据目录（separated_processed_data 或合成数据目录）")
+    parser.add_argument('--db', default=str(Path(__file__).resolve().parent.parent / 'local_db' / 'music_recommendation.db'))
+    parser.add_argument('--force', action='store_true', help="删除已有数据库后重新导入")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    counts = bootstrap_sqlite(args.db, args.data_dir, force=args.force)
+    if not counts:
+        print(f"数据库已存在: {args.db}（使用 --force 重新导入）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# file: benchmark_recommender.py
+"""
+推荐引擎基准测试：同时记录各召回路径的推荐质量与性能
+
+- 数据来自 separated_processed_data 导出目录或合成数据（FileDataLoader），不依赖SQL Server
+- 对 SourceSpecificRecommender 的每一路召回以及混合推荐，分别统计
+  NDCG/Recall/Precision/HitRate@K 与 p50/p95/p99 延迟、吞吐量、峰值内存
+- 未安装依赖（如 lightfm）或加载失败的组件不参与测试，报告中记为 {"skipped": ...}
+- 结果写入键有序的JSON报告，可在不同提交之间直接 diff
+
+用法:
+    python benchmark_recommender.py --data-dir separated_processed_data --n-users 200 --k 10
+    python benchmark_recommender.py --synthetic-interactions 1000000   # 先生成合成数据再测试
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from separated_music_recommender import (
+    FileDataLoader, SeparatedMusicRecommender, SeparatedRecommenderEvaluator, SOURCES
+)
+
+# 召回路径名 -> 调用方式（混合推荐使用评估器的默认权重，不做MMR重排以便与离线评估对齐）
+ALGORITHMS = {
+    'itemcf': lambda rec, uid, k: rec.item_based_cf(uid, n=k),
+    'usercf': lambda rec, uid, k: rec.user_based_cf(uid, n=k),
+    'content': lambda rec, uid, k: rec.content_based(uid, n=k),
+    'mf': lambda rec, uid, k: rec.matrix_factorization_rec(uid, n=k),
+    'sentiment': lambda rec, uid, k: rec.sentiment_based_rec(uid, n=k),
+    'artist': lambda rec, uid, k: rec.artist_based_rec(uid, n=k),
+    'lightfm': lambda rec, uid, k: rec.lightfm_rec(uid, n=k),
+    'hybrid': lambda rec, uid, k: rec.hybrid_recommendation_parallel(uid, n=k, use_mmr=False),
+    'hybrid_mmr': lambda rec, uid, k: rec.hybrid_recommendation_parallel(uid, n=k, use_mmr=True),
+}
+
+
+def peak_rss_mb():
+    """进程峰值常驻内存（MB）；无法获取时返回 None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为KB，macOS 为字节
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def sample_users(recommender, n_users, min_interactions, seed):
+    """与离线评估相同的抽样规则：训练交互数足够且有测试数据的用户"""
+    user_counts = recommender.train_interactions.groupby('user_id', observed=True).size()
+    valid_users = set(user_counts[user_counts >= min_interactions].index)
+    test_users = [u for u in recommender.test_interactions['user_id'].unique() if u in valid_users]
+    rng = random.Random(seed)
+    return rng.sample(test_users, min(n_users, len(test_users)))
+
+
+def latency_summary(latencies):
+    ms = np.asarray(latencies) * 1000
+    return {
+        'p50': round(float(np.percentile(ms, 50)), 3),
+        'p95': round(float(np.percentile(ms, 95)), 3),
+        'p99': round(float(np.percentile(ms, 99)), 3),
+        'mean': round(float(ms.mean()), 3),
+        'max': round(float(ms.max()), 3),
+    }
+
+
+def benchmark_algorithm(evaluator, recommender, name, users, test_index, k, warmup):
+    call = ALGORITHMS[name]
+    for uid in users[:warmup]:
+        call(recommender, uid, k)
+
+    latencies, user_recs, errors = [], [], 0
+    start = time.perf_counter()
+    for uid in users:
+        t0 = time.perf_counter()
+        try:
+            recs = call(recommender, uid, k)
+        except Exception as e:
+            errors += 1
+            print(f"    {name} 用户 {uid} 失败: {e}")
+            continue
+        latencies.append(time.perf_counter() - t0)
+        if recs:
+            user_recs.append((uid, recs))
+    wall = time.perf_counter() - start
+
+    metrics = evaluator._batch_metrics(recommender, user_recs, test_index, k)
+    mean = lambda values: round(float(np.mean(values)), 6) if len(values) else 0.0
+    return {
+        'quality': {
+            f'NDCG@{k}': mean(metrics['ndcg']),
+            f'Recall@{k}': mean(metrics['recall']),
+            f'Precision@{k}': mean(metrics['precision']),
+            f'HitRate@{k}': mean(metrics['hit']),
+            'Coverage': round(len(metrics['coverage']) / recommender.n_songs, 6) if recommender.n_songs else 0.0,
+        },
+        'latency_ms': latency_summary(latencies) if latencies else None,
+        'throughput_qps': round(len(latencies) / wall, 2) if wall > 0 else None,
+        'n_users': len(users),
+        'n_nonempty': len(user_recs),
+        'errors': errors,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def prepare_synthetic_data(args):
+    """生成（或复用已生成的）合成数据目录，返回目录路径"""
+    from synthetic_data_generator import SyntheticDataGenerator
+    data_dir = os.path.join(args.cache_dir, f"synthetic_{args.synthetic_interactions}_seed{args.seed}")
+    stats_file = os.path.join(data_dir, 'data_stats.json')
+    stats = {}
+    if os.path.exists(stats_file):
+        with open(stats_file, encoding='utf-8') as f:
+            stats = json.load(f)
+    generator = SyntheticDataGenerator(args.synthetic_interactions, seed=args.seed)
+    # 旧版本生成器按合并前的交互数抽样，行数与目标不符时重新生成，并丢弃基于旧数据的模型缓存
+    if any(stats.get(f'{source}_interactions') != generator.source_interactions(source) for source in SOURCES):
+        print(f"生成合成数据: {args.synthetic_interactions:,} 条交互 -> {data_dir}")
+        shutil.rmtree(os.path.join(data_dir, 'model_cache'), ignore_errors=True)
+        SyntheticDataGenerator.save(generator.generate(), data_dir, fmt='parquet')
+    return data_dir
+
+
+def run_benchmark(args):
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    if args.synthetic_interactions:
+        args.data_dir = prepare_synthetic_data(args)
+        # 模型缓存按数据集区分，避免不同规模互相复用
+        args.cache_dir = os.path.join(args.data_dir, 'model_cache')
+
+    print("=" * 80)
+    print(f"推荐引擎基准测试 (data_dir={args.data_dir}, n_users={args.n_users}, k={args.k})")
+    print("=" * 80)
+
+    start = time.perf_counter()
+    system = SeparatedMusicRecommender(data_dir=args.data_dir, cache_dir=args.cache_dir,
+                                       lazy=False, parallel=not args.serial_build,
+                                       data_loader=FileDataLoader(args.data_dir))
+    build_time = time.perf_counter() - start
+    evaluator = SeparatedRecommenderEvaluator(system)
+
+    report = {
+        'meta': {
+            'git_revision': git_revision(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'data_dir': os.path.abspath(args.data_dir),
+            'synthetic_interactions': args.synthetic_interactions,
+            # 实际参与构建的交互行数（训练 + 测试）
+            'interactions': {source: len(getattr(system, f'{source}_recommender').train_interactions)
+                             + len(getattr(system, f'{source}_recommender').test_interactions)
+                             for source in SOURCES},
+            'n_users': args.n_users,
+            'k': args.k,
+            'seed': args.seed,
+        },
+        'build': {
+            'total_sec': round(build_time, 3),
+            'stages_sec': {stage: round(sec, 3) for stage, sec in system.init_timings.items()},
+            'peak_rss_mb': peak_rss_mb(),
+        },
+        'sources': {},
+    }
+
+    for source_type in args.sources:
+        recommender = getattr(system, f'{source_type}_recommender')
+        users = sample_users(recommender, args.n_users, args.min_interactions, args.seed)
+        test_index = evaluator._build_test_index(recommender)
+        print(f"\n▶ {source_type.upper()}: {len(users)} 个评估用户")
+        results = {}
+        for name in args.algorithms:
+            if name == 'sentiment' and source_type != 'internal':
+                continue
+            # 未安装依赖或加载失败的延迟组件不计时，报告中标记为跳过，避免空结果被当成 NDCG=0 的高吞吐
+            status = recommender.component_status.get(name)
+            if status in ('disabled', 'failed'):
+                results[name] = {'skipped': f'component {status}'}
+                print(f"  {name:<11} 跳过（组件 {status}）")
+                continue
+            results[name] = benchmark_algorithm(evaluator, recommender, name, users,
+                                                test_index, args.k, args.warmup)
+            r = results[name]
+            lat = r['latency_ms'] or {}
+            print(f"  {name:<11} NDCG={r['quality'][f'NDCG@{args.k}']:.4f} "
+                  f"Recall={r['quality'][f'Recall@{args.k}']:.4f} | "
+                  f"p50={lat.get('p50', 0):.2f}ms p95={lat.get('p95', 0):.2f}ms "
+                  f"p99={lat.get('p99', 0):.2f}ms | {r['throughput_qps']} qps")
+        report['sources'][source_type] = results
+
+    output = args.output or f"benchmark_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+    print(f"\n✓ 基准报告已保存: {output}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推荐引擎质量与延迟基准测试")
+    parser.add_argument('--data-dir', default='separated_processed_data',
+                        help="数据目录（music_data_processor_separated.py 或 synthetic_data_generator.py 的输出）")
+    parser.add_argument('--synthetic-interactions', type=int, default=None,
+                        help="改用指定交互规模的合成数据（生成到 cache-dir 下，已存在则复用）")
+    parser.add_argument('--cache-dir', default='benchmark_cache',
+                        help="模型缓存目录（与线上 recommender_cache 分开）")
+    parser.add_argument('--n-users', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--min-interactions', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=5, help="每个算法正式计时前的预热用户数")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--sources', nargs='+', default=list(SOURCES), choices=list(SOURCES))
+    parser.add_argument('--algorithms', nargs='+', default=list(ALGORITHMS), choices=list(ALGORITHMS))
+    parser.add_argument('--serial-build', action='store_true', help="顺序构建两个来源的推荐器")
+    parser.add_argument('--output', default=None, help="JSON报告路径（默认带时间戳）")
+    run_benchmark(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@
 - 权重自动调优（5算法）+ 固定Artist/LightFM权重
 - 文本特征 + 冷启动优化
 """
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
 from scipy.sparse import csr_matrix, save_npz, load_npz
@@ -21,42 +21,93 @@ import warnings
 warnings.filterwarnings('ignore')
 import os
 import pickle
+import threading
+import multiprocessing
 import time
 import random
 from datetime import datetime, timedelta
-from collections import Counter
+from collections import Counter, namedtuple
 import hashlib
+import importlib
+import json
+from importlib.util import find_spec
 
-# 尝试导入 Faiss
-try:
-    import faiss
-    FAISS_AVAILABLE = True
-except ImportError:
-    FAISS_AVAILABLE = False
+# 可选依赖只检测是否安装，真正的导入推迟到首次使用（sentence_transformers 会连带导入 torch）
+FAISS_AVAILABLE = find_spec('faiss') is not None
+if not FAISS_AVAILABLE:
     print("Faiss not installed, using original MF method.")
 
-# 尝试导入 Sentence-Transformers
-try:
-    from sentence_transformers import SentenceTransformer
-    TEXT_MODEL_AVAILABLE = True
-except ImportError:
-    TEXT_MODEL_AVAILABLE = False
+TEXT_MODEL_AVAILABLE = find_spec('sentence_transformers') is not None
+if not TEXT_MODEL_AVAILABLE:
     print("sentence-transformers not installed, text features disabled.")
 
-# 尝试导入 LightFM
-try:
-    from lightfm import LightFM
-    from lightfm.data import Dataset
-    LIGHTFM_AVAILABLE = True
-except ImportError:
-    LIGHTFM_AVAILABLE = False
+LIGHTFM_AVAILABLE = find_spec('lightfm') is not None
+if not LIGHTFM_AVAILABLE:
     print("lightfm not installed, LightFM disabled.")
 
+# 延迟导入的耗时记录 {模块名: 秒}，用于启动耗时报告
+IMPORT_TIMINGS = {}
+_import_lock = threading.Lock()
+
+
+def _lazy_import(name):
+    """首次使用时导入可选依赖并记录耗时"""
+    with _import_lock:
+        start_time = time.time()
+        module = importlib.import_module(name)
+        IMPORT_TIMINGS.setdefault(name, time.time() - start_time)
+        return module
+
+
+def _import_faiss():
+    return _lazy_import('faiss')
+
+
+def _import_sentence_transformer():
+    return _lazy_import('sentence_transformers').SentenceTransformer
+
+
+def _import_lightfm():
+    lightfm = _lazy_import('lightfm')
+    return lightfm.LightFM, _lazy_import('lightfm.data').Dataset
+
 # ---------------------------- 数据加载器 ----------------------------
+# 各表实际用到的列：刷新快照时只查询这些列（与表结构取交集，缺失列由字段修复补齐）
+AUDIO_COLUMNS = ['danceability', 'energy', 'valence', 'tempo', 'loudness',
+                 'speechiness', 'acousticness', 'instrumentalness', 'liveness']
+INTERACTION_COLUMNS = ['user_id', 'song_id', 'total_weight']
+INTERACTION_TABLES = ('filtered_interactions', 'train_interactions', 'test_interactions')
+SOURCES = ('internal', 'external')
+# 快照布局版本：交互表按来源拆分存储（<table>.<source>），布局变化时旧快照失效
+SNAPSHOT_LAYOUT = 2
+SNAPSHOT_TABLE_COLUMNS = {
+    'enhanced_song_features': ['song_id', 'song_name', 'artists', 'genre', 'genre_clean', 'source',
+                               'popularity', 'final_popularity', 'final_popularity_norm',
+                               'avg_sentiment', 'recency_score', 'song_age'] + AUDIO_COLUMNS,
+    'enhanced_user_features': ['user_id', 'source', 'unique_songs', 'total_interactions',
+                               'total_weight_sum', 'avg_weight', 'weight_std', 'popularity_bias',
+                               'avg_popularity_pref', 'diversity_ratio', 'age', 'gender',
+                               'province', 'city', 'activity_level',
+                               'top_genre_1', 'top_genre_2', 'top_genre_3'],
+    'filtered_interactions': INTERACTION_COLUMNS,
+    'train_interactions': INTERACTION_COLUMNS,
+    'test_interactions': INTERACTION_COLUMNS,
+}
+ID_COLUMNS = ('user_id', 'song_id')
+
+# 快照优先使用 Parquet（需 pyarrow 或 fastparquet），否则回退为 pickle
+PARQUET_AVAILABLE = find_spec('pyarrow') is not None or find_spec('fastparquet') is not None
+
+
 class SeparatedDataLoader:
-    """分离式数据加载器 - 从SQL Server读取数据（增强字段修复）"""
+    """分离式数据加载器 - 从SQL Server读取数据（增强字段修复）
+
+    读取结果按表保存为本地快照（typed columns + 行数/CHECKSUM_AGG 水位），
+    下次启动时数据库水位未变化则直接读取快照。
+    """
+    source_label = 'SQL Server'
     
-    def __init__(self, base_dir=None):
+    def __init__(self, base_dir=None, use_snapshot=True, chunksize=200000):
         self.db_config = {
             'server': 'localhost',
             'database': 'MusicRecommendationDB',
@@ -64,6 +115,10 @@ class SeparatedDataLoader:
             'password': '123456',   # 改为你的密码
             'driver': 'ODBC Driver 18 for SQL Server'
         }
+        self.use_snapshot = use_snapshot
+        self.chunksize = chunksize
+        self.snapshot_dir = os.path.join(base_dir or '.', 'sql_snapshot')
+        self.manifest_file = os.path.join(self.snapshot_dir, 'manifest.json')
     
     def _get_engine(self):
         from sqlalchemy import create_engine
@@ -72,14 +127,197 @@ class SeparatedDataLoader:
                     f"?driver={self.db_config['driver'].replace(' ', '+')}&Encrypt=no")
         return create_engine(conn_str, echo=False)
     
+    # ------------------------ 快照缓存 ------------------------
+    def _table_watermarks(self, engine):
+        """各表的行数 + CHECKSUM_AGG 水位，任一表变化即需要刷新快照"""
+        from sqlalchemy import text
+        watermarks = {}
+        with engine.connect() as conn:
+            for table in SNAPSHOT_TABLE_COLUMNS:
+                row = conn.execute(text(
+                    f"SELECT COUNT_BIG(*), CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM {table}"
+                )).fetchone()
+                watermarks[table] = [int(row[0]), None if row[1] is None else int(row[1])]
+        return watermarks
+
+    def _select_columns(self, engine, table):
+        """需要的列与表实际存在的列取交集（保持需要列的顺序）"""
+        from sqlalchemy import text
+        with engine.connect() as conn:
+            existing = {r[0] for r in conn.execute(text(
+                "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = :t"
+            ), {"t": table})}
+        return [c for c in SNAPSHOT_TABLE_COLUMNS[table] if c in existing]
+
+    def _select_sql(self, engine, table):
+        columns = self._select_columns(engine, table)
+        if not columns:
+            raise ValueError(f"表 {table} 不存在或缺少所需列")
+        return columns, f"SELECT {', '.join(f'[{c}]' for c in columns)} FROM {table}"
+
+    def _query_table(self, engine, table):
+        _, sql = self._select_sql(engine, table)
+        df = pd.read_sql(sql, engine)
+        for col in ID_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype(str)
+        return df
+
+    @staticmethod
+    def _infer_user_source(user_df):
+        """缺少source列时根据ID前缀推断（兼容旧数据）"""
+        if 'source' not in user_df.columns:
+            user_df['source'] = user_df['user_id'].apply(
+                lambda x: 'internal' if str(x).startswith('U') and len(str(x)) <= 7 else 'external'
+            )
+        return user_df
+
+    def _stream_interactions(self, engine, table, user_source):
+        """分块读取交互表，逐块按用户来源拆分
+
+        每块的 id 转为 category、权重转为 float32 后再缓存，
+        结束时用 union_categoricals 合并，避免整表 object 列和多份拷贝同时驻留内存。
+        返回 {'<table>.internal': df, '<table>.external': df}
+        """
+        from pandas.api.types import union_categoricals
+        columns, sql = self._select_sql(engine, table)
+        buffers = {source: [] for source in SOURCES}
+        n_rows = 0
+        for chunk in pd.read_sql(sql, engine, chunksize=self.chunksize):
+            n_rows += len(chunk)
+            for col in ID_COLUMNS:
+                if col in chunk.columns:
+                    chunk[col] = chunk[col].astype(str)
+            if 'total_weight' in chunk.columns:
+                chunk['total_weight'] = pd.to_numeric(
+                    chunk['total_weight'], errors='coerce').fillna(0).astype(np.float32)
+            chunk_source = chunk['user_id'].map(user_source).values
+            for source, parts in buffers.items():
+                part = chunk[chunk_source == source]
+                if len(part):
+                    part = part.reset_index(drop=True)
+                    for col in ID_COLUMNS:
+                        if col in part.columns:
+                            part[col] = part[col].astype('category')
+                    parts.append(part)
+
+        result = {}
+        for source, parts in buffers.items():
+            if not parts:
+                df = pd.DataFrame({c: pd.Series(dtype='category' if c in ID_COLUMNS else 'float32')
+                                   for c in columns})
+            else:
+                df = pd.DataFrame({
+                    col: (pd.Categorical(union_categoricals([p[col] for p in parts]))
+                          if col in ID_COLUMNS else np.concatenate([p[col].values for p in parts]))
+                    for col in columns
+                })
+            buffers[source] = None
+            result[f"{table}.{source}"] = df
+        print(f"  {table}: {n_rows:,} 行（分块 {self.chunksize:,}）")
+        return result
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_file):
+            return None
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def _snapshot_path(self, table, fmt):
+        return os.path.join(self.snapshot_dir, f"{table}.{fmt}")
+
+    def _read_snapshot(self, manifest):
+        fmt = manifest['format']
+        tables = {}
+        for table in manifest['rows']:
+            path = self._snapshot_path(table, fmt)
+            tables[table] = pd.read_parquet(path) if fmt == 'parquet' else pd.read_pickle(path)
+        return tables
+
+    def _write_snapshot(self, tables, watermarks):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        # 先删除清单，写入中途失败时不会出现“清单有效但数据不完整”的快照
+        if os.path.exists(self.manifest_file):
+            os.remove(self.manifest_file)
+
+        def write_all(fmt):
+            for table, df in tables.items():
+                tmp_path = self._snapshot_path(table, fmt) + '.tmp'
+                if fmt == 'parquet':
+                    df.to_parquet(tmp_path, index=False)
+                else:
+                    df.to_pickle(tmp_path)
+                os.replace(tmp_path, self._snapshot_path(table, fmt))
+
+        fmt = 'parquet' if PARQUET_AVAILABLE else 'pkl'
+        try:
+            write_all(fmt)
+        except Exception as e:
+            if fmt != 'parquet':
+                raise
+            print(f"  Parquet快照写入失败，改用pickle: {e}")
+            fmt = 'pkl'
+            write_all(fmt)
+
+        with open(self.manifest_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': fmt,
+                'layout': SNAPSHOT_LAYOUT,
+                'created_at': datetime.now().isoformat(),
+                'watermarks': watermarks,
+                'columns': {t: list(df.columns) for t, df in tables.items()},
+                'rows': {t: len(df) for t, df in tables.items()}
+            }, f, ensure_ascii=False, indent=2)
+        print(f"  SQL快照已保存({fmt}): {self.snapshot_dir}")
+
+    def _load_tables(self, engine):
+        """读取所有表：数据库水位与快照一致时读快照，否则只查询所需列并刷新快照"""
+        watermarks = None
+        if self.use_snapshot:
+            try:
+                watermarks = self._table_watermarks(engine)
+            except Exception as e:
+                print(f"  获取表水位失败，跳过快照: {e}")
+
+            manifest = self._read_manifest()
+            if (watermarks is not None and manifest and manifest.get('layout') == SNAPSHOT_LAYOUT
+                    and manifest.get('watermarks') == watermarks):
+                try:
+                    tables = self._read_snapshot(manifest)
+                    print(f"  数据库未变化，从快照加载({manifest['format']}, {manifest['created_at']})")
+                    return tables
+                except Exception as e:
+                    print(f"  快照读取失败，重新查询数据库: {e}")
+
+        # 用户表先读，得到用户来源映射后流式拆分交互表
+        tables = {
+            'enhanced_song_features': self._query_table(engine, 'enhanced_song_features'),
+            'enhanced_user_features': self._infer_user_source(
+                self._query_table(engine, 'enhanced_user_features'))
+        }
+        user_df = tables['enhanced_user_features']
+        user_source = pd.Series(user_df['source'].values, index=user_df['user_id'].values)
+        user_source = user_source[~user_source.index.duplicated()]
+        for table in INTERACTION_TABLES:
+            tables.update(self._stream_interactions(engine, table, user_source))
+        if watermarks is not None:
+            try:
+                self._write_snapshot(tables, watermarks)
+            except Exception as e:
+                print(f"  SQL快照保存失败: {e}")
+        return tables
+
     def load_all_data(self):
         print("="*80)
-        print("从SQL Server加载分离式数据...")
+        print(f"从{self.source_label}加载分离式数据...")
         engine = self._get_engine()
+        tables = self._load_tables(engine)
         
         # ----- 1. 歌曲特征（含字段修复）-----
-        song_df = pd.read_sql("SELECT * FROM enhanced_song_features", engine)
-        song_df['song_id'] = song_df['song_id'].astype(str)
+        song_df = tables['enhanced_song_features']
         
         # 修复final_popularity
         if 'final_popularity' not in song_df.columns:
@@ -125,8 +363,7 @@ class SeparatedDataLoader:
         print(f"  歌曲特征: {len(song_df):,} (内部{len(self.internal_songs):,}, 外部{len(self.external_songs):,})")
         
         # ----- 2. 用户特征（含字段修复）-----
-        user_df = pd.read_sql("SELECT * FROM enhanced_user_features", engine)
-        user_df['user_id'] = user_df['user_id'].astype(str)
+        user_df = tables['enhanced_user_features']
         
         # 修复数值列
         numeric_cols = ['unique_songs', 'total_interactions', 'total_weight_sum', 'avg_weight',
@@ -137,42 +374,25 @@ class SeparatedDataLoader:
             else:
                 user_df[col] = 0 if col != 'avg_popularity_pref' else 50.0
         
-        # 修复source
-        if 'source' not in user_df.columns:
-            # 根据ID前缀推断（兼容旧数据）
-            user_df['source'] = user_df['user_id'].apply(
-                lambda x: 'internal' if str(x).startswith('U') and len(str(x)) <= 7 else 'external'
-            )
-        
-        # ----- 3. 交互数据 -----
-        interaction_df = pd.read_sql("SELECT * FROM filtered_interactions", engine)
-        interaction_df['user_id'] = interaction_df['user_id'].astype(str)
-        interaction_df['song_id'] = interaction_df['song_id'].astype(str)
-        
-        train_df = pd.read_sql("SELECT * FROM train_interactions", engine)
-        train_df['user_id'] = train_df['user_id'].astype(str)
-        train_df['song_id'] = train_df['song_id'].astype(str)
-        
-        test_df = pd.read_sql("SELECT * FROM test_interactions", engine)
-        test_df['user_id'] = test_df['user_id'].astype(str)
-        test_df['song_id'] = test_df['song_id'].astype(str)
-        
-        # ----- 4. 按来源拆分 -----
-        internal_users = set(user_df[user_df['source'] == 'internal']['user_id'])
-        external_users = set(user_df[user_df['source'] == 'external']['user_id'])
+        # 修复source（快照中已推断，这里兼容直接传入的数据）
+        self._infer_user_source(user_df)
         
+        # ----- 3. 交互数据（读取时已按来源拆分）-----
+        # 每个来源携带自己的歌曲切片，两侧推荐器可并行构建且互不修改共享的DataFrame
         self.internal_data = {
+            'songs': self.internal_songs,
             'user_features': user_df[user_df['source'] == 'internal'].copy(),
-            'interaction_matrix': interaction_df[interaction_df['user_id'].isin(internal_users)].copy(),
-            'train_interactions': train_df[train_df['user_id'].isin(internal_users)].copy(),
-            'test_interactions': test_df[test_df['user_id'].isin(internal_users)].copy()
+            'interaction_matrix': tables['filtered_interactions.internal'],
+            'train_interactions': tables['train_interactions.internal'],
+            'test_interactions': tables['test_interactions.internal']
         }
         
         self.external_data = {
+            'songs': self.external_songs,
             'user_features': user_df[user_df['source'] == 'external'].copy(),
-            'interaction_matrix': interaction_df[interaction_df['user_id'].isin(external_users)].copy(),
-            'train_interactions': train_df[train_df['user_id'].isin(external_users)].copy(),
-            'test_interactions': test_df[test_df['user_id'].isin(external_users)].copy()
+            'interaction_matrix': tables['filtered_interactions.external'],
+            'train_interactions': tables['train_interactions.external'],
+            'test_interactions': tables['test_interactions.external']
         }
         
         print(f"\n数据分离统计:")
@@ -186,12 +406,117 @@ class SeparatedDataLoader:
         }
 
 
+class FileDataLoader(SeparatedDataLoader):
+    """从导出的数据目录加载数据（无需SQL Server）
+
+    目录结构与 music_data_processor_separated.py / synthetic_data_generator.py 的输出一致：
+    all_song_features，以及 internal/、external/ 下的 user_features、interaction_matrix、
+    train_interactions、test_interactions。每张表优先读取 .parquet，其次 .csv。
+    读出的表与SQL路径同名同类型，字段修复和来源拆分沿用 load_all_data。
+    """
+    source_label = '数据文件'
+    # 交互表名 -> 导出文件名（不含扩展名）
+    INTERACTION_FILES = {
+        'filtered_interactions': 'interaction_matrix',
+        'train_interactions': 'train_interactions',
+        'test_interactions': 'test_interactions',
+    }
+
+    def __init__(self, data_dir="separated_processed_data"):
+        super().__init__(base_dir=data_dir, use_snapshot=False)
+        self.data_dir = data_dir
+
+    def _get_engine(self):
+        return None
+
+    def _read_table(self, stem, table):
+        wanted = SNAPSHOT_TABLE_COLUMNS[table]
+        if os.path.exists(stem + '.parquet'):
+            df = pd.read_parquet(stem + '.parquet')
+            df = df[[c for c in df.columns if c in wanted]]
+            for col in ID_COLUMNS:
+                if col in df.columns:
+                    df[col] = df[col].astype(str)
+        else:
+            df = pd.read_csv(stem + '.csv', usecols=lambda c: c in set(wanted),
+                             dtype={col: str for col in ID_COLUMNS}, encoding='utf-8')
+        if 'total_weight' in df.columns:
+            df['total_weight'] = pd.to_numeric(df['total_weight'], errors='coerce').fillna(0).astype(np.float32)
+        return df
+
+    def _load_tables(self, engine):
+        tables = {'enhanced_song_features': self._read_table(
+            os.path.join(self.data_dir, 'all_song_features'), 'enhanced_song_features')}
+        users = []
+        for source in SOURCES:
+            source_dir = os.path.join(self.data_dir, source)
+            user_df = self._read_table(os.path.join(source_dir, 'user_features'), 'enhanced_user_features')
+            if 'source' not in user_df.columns:
+                user_df['source'] = source
+            users.append(user_df)
+            for table, filename in self.INTERACTION_FILES.items():
+                df = self._read_table(os.path.join(source_dir, filename), table)
+                for col in ID_COLUMNS:
+                    df[col] = df[col].astype('category')
+                tables[f"{table}.{source}"] = df
+                print(f"  {table}.{source}: {len(df):,} 行")
+        tables['enhanced_user_features'] = pd.concat(users, ignore_index=True)
+        return tables
+
+
+# ---------------------------- ID 词表 ----------------------------
+class IdVocabulary:
+    """字符串ID <-> 连续 int32 编码的双向词表
+
+    ids 为按编码排列的数组（idx -> id），index 为字典（id -> idx）。
+    引擎内部召回/融合/重排均使用编码，字符串只在对外返回时还原。
+    """
+
+    def __init__(self, ids):
+        self.ids = np.asarray(list(ids), dtype=object)
+        self.index = {v: i for i, v in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return item_id in self.index
+
+    def encode(self, item_id, default=-1):
+        return self.index.get(item_id, default)
+
+    def encode_many(self, item_ids):
+        """批量编码，未知ID编码为 -1"""
+        get = self.index.get
+        return np.fromiter((get(i, -1) for i in item_ids), dtype=np.int32, count=len(item_ids))
+
+    def decode(self, idx):
+        return self.ids[idx]
+
+    def decode_many(self, idxs):
+        return self.ids[np.asarray(idxs, dtype=np.int64)].tolist()
+
+    def extend(self, item_ids):
+        """追加新ID（已存在的忽略），已有编码保持不变"""
+        new_ids = [i for i in dict.fromkeys(item_ids) if i not in self.index]
+        if new_ids:
+            start = len(self.ids)
+            self.ids = np.concatenate([self.ids, np.asarray(new_ids, dtype=object)])
+            for offset, item_id in enumerate(new_ids):
+                self.index[item_id] = start + offset
+        return self
+
+
 # ---------------------------- 特定来源推荐器（含完整缓存） ----------------------------
 # ---------------------------- 特定来源推荐器 ----------------------------
 class SourceSpecificRecommender:
     """特定来源推荐器 - 包含所有算法"""
+
+    # 可延迟加载的重型召回组件（按加载顺序）
+    LAZY_COMPONENTS = ('usercf', 'content', 'lightfm')
     
-    def __init__(self, source_data, song_features, source_type, cache_dir="recommender_cache"):
+    def __init__(self, source_data, song_features, source_type, cache_dir="recommender_cache",
+                 lazy=False):
         self.source_type = source_type
         self.song_features = song_features
         self.user_features = source_data['user_features']
@@ -263,25 +588,141 @@ class SourceSpecificRecommender:
         print(f"  歌曲数: {len(self.source_songs):,}")
         print(f"  交互数: {len(self.interaction_matrix):,}")
 
-        self.build_matrices()
-        self.calculate_matrix_factorization()
+        # ---------- 核心组件：矩阵、MF、热门分层（同步加载）----------
+        self.init_timings = {}
+        self._timed('matrices', self.build_matrices)
+        self._timed('mf', self.calculate_matrix_factorization)
+        self._timed('popular', self._calculate_popular_songs)
 
-        # ---------- 文本 embedding（可选，需在计算内容相似度之前加载）----------
+        # ---------- 重型组件默认空状态，未就绪前对应召回返回空列表 ----------
+        self.user_similarities = {}
+        self.similar_user_items = {}
+        self.user_cf_scores = {}
+        self.user_cf_index = {}
+        self.content_similarities = {}
+        self.content_nn_idx = None
+        self.content_nn_sim = None
         self.text_embeddings = None
         self.use_text = False
-        if TEXT_MODEL_AVAILABLE:
-            self._load_text_embeddings()
-
-        self.calculate_similarities()
-
-        # LightFM 模型（可选）
         self.lightfm_model = None
+        self.lightfm_item_song_idx = None
         self.lightfm_user_features = None
         self.lightfm_item_features = None
         self.lightfm_user_mapping = None
         self.lightfm_item_mapping = None
-        if LIGHTFM_AVAILABLE:
-            self._train_lightfm()
+
+        # lazy=True 时在后台线程加载，加载完成的组件自动加入混合推荐
+        self.component_status = {name: 'pending' for name in self.LAZY_COMPONENTS}
+        self._lazy_thread = None
+        if lazy:
+            self._lazy_thread = threading.Thread(
+                target=self.load_lazy_components, kwargs={'background': True},
+                name=f"{source_type}-lazy-components", daemon=True
+            )
+            self._lazy_thread.start()
+        else:
+            self.load_lazy_components()
+
+    # ------------------------ 延迟加载组件 ------------------------
+    def load_lazy_components(self, background=False):
+        """依次加载 UserCF表、文本embedding+内容相似度、LightFM；后台模式下单个组件失败不影响其他组件"""
+        loaders = {
+            'usercf': self._load_usercf_component,
+            'content': self._load_content_component,
+            'lightfm': self._load_lightfm_component if LIGHTFM_AVAILABLE else None,
+        }
+        for name in self.LAZY_COMPONENTS:
+            loader = loaders[name]
+            if loader is None:
+                self.component_status[name] = 'disabled'
+                continue
+            self.component_status[name] = 'loading'
+            start_time = time.time()
+            try:
+                loader()
+            except Exception as e:
+                self.component_status[name] = 'failed'
+                if not background:
+                    raise
+                print(f"  {self.source_type} 组件 {name} 加载失败: {e}")
+                continue
+            self.init_timings[name] = time.time() - start_time
+            if name == 'lightfm' and self.lightfm_model is None:
+                self.component_status[name] = 'disabled'
+            else:
+                self.component_status[name] = 'ready'
+            if background:
+                print(f"  {self.source_type} 组件 {name} 就绪，耗时 {time.time() - start_time:.1f}s")
+
+    def _timed(self, stage, func, *args):
+        """执行初始化阶段并记录耗时到 init_timings"""
+        start_time = time.time()
+        try:
+            return func(*args)
+        finally:
+            self.init_timings[stage] = time.time() - start_time
+
+    def _load_usercf_component(self):
+        self._calculate_user_similarities()
+        self._index_user_cf_scores()
+
+    def _load_content_component(self):
+        """文本 embedding（可选）需在计算内容相似度之前加载"""
+        if TEXT_MODEL_AVAILABLE:
+            self._load_text_embeddings()
+        self._calculate_content_similarities()
+        self._index_content_similarities()
+
+    def _load_lightfm_component(self):
+        self._train_lightfm()
+        if self.lightfm_model is not None:
+            # LightFM 内部物品索引 -> 歌曲编码（-1 表示不在词表中）
+            item_ids = sorted(self.lightfm_item_mapping, key=self.lightfm_item_mapping.get)
+            self.lightfm_item_song_idx = self.song_vocab.encode_many(item_ids)
+
+    def _index_user_cf_scores(self):
+        """UserCF 预聚合得分转为 {用户编码: (歌曲编码数组, 得分数组)}，按得分降序
+
+        缓存文件仍为字符串键字典，转换后释放字典。
+        """
+        index = {}
+        for user_id, scores in self.user_cf_scores.items():
+            user_idx = self.user_vocab.encode(user_id)
+            if user_idx < 0 or not scores:
+                continue
+            song_idx = self.song_vocab.encode_many(list(scores.keys()))
+            values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+            valid = song_idx >= 0
+            order = np.argsort(-values[valid], kind='stable')
+            index[user_idx] = (song_idx[valid][order], values[valid][order])
+        self.user_cf_index = index
+        self.user_cf_scores = {}
+
+    def _index_content_similarities(self):
+        """内容相似度字典转为按歌曲编码索引的近邻数组（content_nn_idx 以 -1 填充）"""
+        n = len(self.song_vocab)
+        k = max((len(v) for v in self.content_similarities.values()), default=0)
+        nn_idx = np.full((n, max(k, 1)), -1, dtype=np.int32)
+        nn_sim = np.zeros((n, max(k, 1)), dtype=np.float32)
+        for song_id, sims in self.content_similarities.items():
+            i = self.song_vocab.encode(song_id)
+            if i < 0 or not sims:
+                continue
+            nn_idx[i, :len(sims)] = self.song_vocab.encode_many(list(sims.keys()))
+            nn_sim[i, :len(sims)] = np.fromiter(sims.values(), dtype=np.float32, count=len(sims))
+        nn_sim[nn_idx < 0] = 0
+        self.content_nn_idx = nn_idx
+        self.content_nn_sim = nn_sim
+
+    def is_component_ready(self, name):
+        return self.component_status.get(name) == 'ready'
+
+    def wait_for_components(self, timeout=None):
+        """等待后台组件加载结束（离线评估/调参前调用），返回是否全部结束"""
+        if self._lazy_thread is not None:
+            self._lazy_thread.join(timeout)
+            return not self._lazy_thread.is_alive()
+        return True
     
     def _prepare_features(self):
         """字段兼容处理（与之前相同）"""
@@ -316,7 +757,7 @@ class SourceSpecificRecommender:
     
     # ------------------------ 矩阵构建与缓存 ------------------------
     def build_matrices(self):
-        """构建用户-歌曲矩阵（带缓存）"""
+        """构建用户-歌曲矩阵（带缓存），并建立用户/歌曲ID词表"""
         cache_file = os.path.join(self.cache_dir, "user_song_matrix.npz")
         mapping_file = os.path.join(self.cache_dir, "mappings.pkl")
         
@@ -325,45 +766,77 @@ class SourceSpecificRecommender:
             self.user_song_matrix = load_npz(cache_file)
             with open(mapping_file, 'rb') as f:
                 mappings = pickle.load(f)
-                self.user_to_idx = mappings['user_to_idx']
-                self.idx_to_user = mappings['idx_to_user']
-                self.song_to_idx = mappings['song_to_idx']
-                self.idx_to_song = mappings['idx_to_song']
+            if 'user_ids' in mappings:
+                user_ids, song_ids = mappings['user_ids'], mappings['song_ids']
+            else:
+                # 兼容旧缓存（idx -> id 字典）
+                user_ids = [mappings['idx_to_user'][i] for i in range(len(mappings['idx_to_user']))]
+                song_ids = [mappings['idx_to_song'][i] for i in range(len(mappings['idx_to_song']))]
         else:
             print(f"  构建{self.source_type}用户-歌曲矩阵...")
-            all_users = self.train_interactions['user_id'].unique().tolist()
-            all_songs = self.train_interactions['song_id'].unique().tolist()
-            
-            self.user_to_idx = {u: i for i, u in enumerate(all_users)}
-            self.idx_to_user = {i: u for i, u in enumerate(all_users)}
-            self.song_to_idx = {s: i for i, s in enumerate(all_songs)}
-            self.idx_to_song = {i: s for i, s in enumerate(all_songs)}
-            
-            rows = [self.user_to_idx[uid] for uid in self.train_interactions['user_id']]
-            cols = [self.song_to_idx[sid] for sid in self.train_interactions['song_id']]
+            # factorize 按首次出现顺序编码，与原先 unique() 的顺序一致
+            rows, user_ids = pd.factorize(self.train_interactions['user_id'])
+            cols, song_ids = pd.factorize(self.train_interactions['song_id'])
+            user_ids, song_ids = list(user_ids), list(song_ids)
             data = self.train_interactions['total_weight'].values
             
             self.user_song_matrix = csr_matrix((data, (rows, cols)),
-                                              shape=(len(all_users), len(all_songs)))
+                                              shape=(len(user_ids), len(song_ids)))
             
             save_npz(cache_file, self.user_song_matrix)
             with open(mapping_file, 'wb') as f:
-                pickle.dump({
-                    'user_to_idx': self.user_to_idx,
-                    'idx_to_user': self.idx_to_user,
-                    'song_to_idx': self.song_to_idx,
-                    'idx_to_song': self.idx_to_song
-                }, f)
+                pickle.dump({'user_ids': user_ids, 'song_ids': song_ids}, f)
         
         self.n_users, self.n_songs = self.user_song_matrix.shape
+        # 歌曲词表 = 训练集歌曲（编码 < n_songs，对应矩阵列）+ 本来源其余歌曲
+        self.user_vocab = IdVocabulary(user_ids)
+        self.song_vocab = IdVocabulary(song_ids).extend(self.source_songs['song_id'].tolist())
+        self.user_to_idx = self.user_vocab.index
+        self.idx_to_user = self.user_vocab.ids
+        self.song_to_idx = self.song_vocab.index
+        self.idx_to_song = self.song_vocab.ids
+        
+        # ItemCF 使用的二值矩阵（行切片用CSR，列切片用CSC）
+        self.user_song_binary = (self.user_song_matrix != 0).astype(np.float32).tocsr()
+        self.user_song_binary_csc = self.user_song_binary.tocsc()
+        self._build_song_arrays()
+        
         density = self.user_song_matrix.nnz / (self.n_users * self.n_songs) * 100
-        print(f"    矩阵: {self.n_users}x{self.n_songs}, 密度: {density:.4f}%")
+        print(f"    矩阵: {self.n_users}x{self.n_songs}, 密度: {density:.4f}%, 歌曲词表: {len(self.song_vocab)}")
+    
+    def _build_song_arrays(self):
+        """按歌曲编码排列的特征数组（非本来源歌曲取默认值）"""
+        n = len(self.song_vocab)
+        idx = self.song_vocab.encode_many(self.source_songs['song_id'].tolist())
+        
+        self.song_in_source = np.zeros(n, dtype=bool)
+        self.song_in_source[idx] = True
+        
+        self.song_pop_arr = np.full(n, 50.0)
+        self.song_pop_arr[idx] = pd.to_numeric(
+            self.source_songs['final_popularity'], errors='coerce').fillna(50).values
+        
+        self.song_sentiment_arr = np.full(n, np.nan)
+        if 'avg_sentiment' in self.source_songs.columns:
+            self.song_sentiment_arr[idx] = pd.to_numeric(
+                self.source_songs['avg_sentiment'], errors='coerce').values
+        
+        # 流派/艺术家编码：-1 表示未知，不参与相等比较
+        genre_codes, self.genre_names = pd.factorize(self.source_songs['genre_clean'])
+        self.song_genre_code = np.full(n, -1, dtype=np.int32)
+        self.song_genre_code[idx] = genre_codes
+        
+        artists = self.source_songs['artists'].where(self.source_songs['artists'] != '未知')
+        artists = artists.where(artists.astype(bool))
+        artist_codes, self.artist_names = pd.factorize(artists)
+        self.song_artist_code = np.full(n, -1, dtype=np.int32)
+        self.song_artist_code[idx] = artist_codes
     
     # ------------------------ 相似度计算（带缓存） ------------------------
     def calculate_similarities(self):
         self._calculate_popular_songs()
-        self._calculate_user_similarities()
-        self._calculate_content_similarities()
+        self._load_usercf_component()
+        self._load_content_component()
     
     def _calculate_popular_songs(self):
         """热门歌曲分层"""
@@ -392,9 +865,10 @@ class SourceSpecificRecommender:
             ) & (self.source_songs['final_popularity'] < q33)]['song_id'].tolist()
         }
         
-        self.song_popularity = {}
-        for _, row in self.source_songs.iterrows():
-            self.song_popularity[row['song_id']] = row.get('final_popularity', 50)
+        self.tiered_idx = {tier: self.song_vocab.encode_many(songs)
+                           for tier, songs in self.tiered_songs.items()}
+        
+        self.song_popularity = dict(zip(self.source_songs['song_id'], self.source_songs['final_popularity']))
     
     def _calculate_user_similarities(self, batch_size=500):
         """用户相似度 - 全量计算（MF向量+余弦相似度）并预构建UserCF缓存"""
@@ -621,6 +1095,7 @@ class SourceSpecificRecommender:
         
         print(f"    生成{self.source_type}文本embedding（使用Sentence-BERT）...")
         try:
+            SentenceTransformer = _import_sentence_transformer()
             model = SentenceTransformer('all-MiniLM-L6-v2')
             texts = (self.source_songs['song_name'].fillna('') + ' ' + self.source_songs['artists'].fillna('')).tolist()
             batch_size = 256
@@ -674,6 +1149,7 @@ class SourceSpecificRecommender:
         # 构建Faiss索引（如果可用）
         self.faiss_index = None
         if FAISS_AVAILABLE and self.song_factors is not None:
+            faiss = _import_faiss()
             if os.path.exists(faiss_index_file):
                 try:
                     self.faiss_index = faiss.read_index(faiss_index_file)
@@ -692,158 +1168,225 @@ class SourceSpecificRecommender:
                 print(f"      Faiss索引构建完成，包含{self.faiss_index.ntotal}个向量")
     
     # ------------------------ 核心推荐算法 ------------------------
+    # 各召回的 *_idx 方法以用户编码为输入，返回 (歌曲编码数组, 得分数组)，按得分降序；
+    # 对外的同名推荐方法只负责编码/解码字符串ID。
+    _EMPTY = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64))
+
+    @staticmethod
+    def _top_k(idx, scores, n):
+        """按得分降序取前n，同分按歌曲编码升序
+
+        argpartition 只用来求第n名的得分，与它同分的候选全部保留后再排序，
+        避免并列时由分区算法任意挑选，结果与完整排序一致。
+        """
+        if n <= 0 or len(scores) == 0:
+            return SourceSpecificRecommender._EMPTY
+        if len(scores) > n:
+            kth = -np.partition(-scores, n - 1)[n - 1]
+            keep = scores >= kth
+            idx, scores = idx[keep], scores[keep]
+        order = np.lexsort((idx, -scores))[:n]
+        return idx[order], scores[order]
+
+    def _to_pairs(self, idx, scores):
+        """编码结果还原为 [(song_id, score)]"""
+        return list(zip(self.song_vocab.decode_many(idx), np.asarray(scores).tolist()))
+
+    def _user_row(self, user_idx):
+        """用户交互过的歌曲编码及权重（CSR行切片）"""
+        m = self.user_song_matrix
+        start, end = m.indptr[user_idx], m.indptr[user_idx + 1]
+        indices, data = m.indices[start:end], m.data[start:end]
+        nonzero = data != 0
+        return indices[nonzero], data[nonzero]
+
+    def _recall_by_user(self, method, user_id, n):
+        user_idx = self.user_vocab.encode(user_id)
+        if user_idx < 0:
+            return []
+        return self._to_pairs(*method(user_idx, n))
+
+    def _itemcf_idx(self, user_idx, n=20):
+        """ItemCF：与目标用户有共同歌曲的用户，其每首未听歌曲按共同歌曲数累加得分"""
+        liked, _ = self._user_row(user_idx)
+        if len(liked) == 0:
+            return self._EMPTY
+        # 每个用户与目标用户共同交互的歌曲数
+        co_rows = self.user_song_binary_csc[:, liked].indices
+        co_counts = np.bincount(co_rows, minlength=self.n_users).astype(np.float64)
+        users = np.flatnonzero(co_counts)
+        scores = self.user_song_binary[users].T @ co_counts[users]
+        scores[liked] = 0
+        cand = np.flatnonzero(scores)
+        return self._top_k(cand.astype(np.int32), scores[cand], n)
+
+    def _usercf_idx(self, user_idx, n=20):
+        if not self.is_component_ready('usercf') or user_idx not in self.user_cf_index:
+            return self._EMPTY
+        song_idx, scores = self.user_cf_index[user_idx]
+        return song_idx[:n], scores[:n]
+
+    def _content_idx(self, user_idx, n=20):
+        """基于内容：最多取30首历史歌曲，累加其内容近邻的相似度"""
+        if not self.is_component_ready('content'):
+            return self._EMPTY
+        interacted, _ = self._user_row(user_idx)
+        if len(interacted) == 0:
+            return self._EMPTY
+        sample = interacted[:30]
+        neighbors = self.content_nn_idx[sample].ravel()
+        sims = self.content_nn_sim[sample].ravel()
+        valid = neighbors >= 0
+        if not valid.any():
+            return self._EMPTY
+        cand, inverse = np.unique(neighbors[valid], return_inverse=True)
+        scores = np.bincount(inverse, weights=sims[valid])
+        return self._top_k(cand.astype(np.int32), scores, n)
+
+    def _mf_idx(self, user_idx, n=20):
+        if self.user_factors is None:
+            return self._EMPTY
+        interacted, _ = self._user_row(user_idx)
+        return self._mf_search_idx(self.user_factors[user_idx], interacted, n)
+
+    def _mf_search_idx(self, user_vec, interacted, n=20):
+        """在MF空间中检索与用户向量最匹配的歌曲（排除已交互）"""
+        if self.faiss_index is not None:
+            norm = np.linalg.norm(user_vec)
+            if norm == 0:
+                return self._EMPTY
+            user_vec_norm = (user_vec / norm).astype(np.float32).reshape(1, -1)
+            k = min(n + 50, self.faiss_index.ntotal)
+            scores, indices = self.faiss_index.search(user_vec_norm, k)
+            scores, indices = scores[0], indices[0]
+            keep = (indices >= 0) & ~np.isin(indices, interacted)
+            return indices[keep][:n].astype(np.int32), scores[keep][:n].astype(np.float64)
+        else:
+            all_scores = self.song_factors @ user_vec
+            all_scores[interacted] = 0
+            cand = np.flatnonzero(all_scores > 0)
+            if len(cand) == 0:
+                return self._EMPTY
+            scores = all_scores[cand] / all_scores[cand].max()
+            return self._top_k(cand.astype(np.int32), scores, n)
+
+    def _sentiment_idx(self, user_idx, n=20):
+        """基于用户历史歌曲的情感偏好进行推荐（仅内部）"""
+        if self.source_type != 'internal' or 'avg_sentiment' not in self.source_songs.columns:
+            return self._EMPTY
+        interacted, weights = self._user_row(user_idx)
+        if len(interacted) == 0:
+            return self._EMPTY
+        
+        # 权重最高的30首历史歌曲的情感分数
+        top_songs = interacted[np.argsort(weights)[-30:]]
+        sents = self.song_sentiment_arr[top_songs]
+        sents = sents[~np.isnan(sents)]
+        if len(sents) == 0:
+            return self._EMPTY
+        # 与原实现一致：以0.5为初值累加后除以有效歌曲数
+        user_sentiment = (0.5 + sents.sum()) / len(sents)
+        
+        # 候选：训练集中属于本来源、未交互的歌曲
+        sim = 1 - np.abs(user_sentiment - self.song_sentiment_arr[:self.n_songs])
+        mask = np.nan_to_num(sim, nan=0.0) > 0.6
+        mask[interacted] = False
+        cand = np.flatnonzero(mask)
+        return self._top_k(cand.astype(np.int32), sim[cand], n)
+
+    def _artist_idx(self, user_idx, n=20):
+        """基于艺术家：用户历史中出现最多的前3位艺术家的其他歌曲"""
+        interacted, _ = self._user_row(user_idx)
+        if len(interacted) == 0:
+            return self._EMPTY
+        codes = self.song_artist_code[interacted]
+        codes = codes[codes >= 0]
+        if len(codes) == 0:
+            return self._EMPTY
+        # 次数降序、次数相同按首次出现顺序（与 Counter.most_common 一致）
+        artists, first_pos, counts = np.unique(codes, return_index=True, return_counts=True)
+        top_artists = artists[np.lexsort((first_pos, -counts))[:3]]
+        
+        mask = np.isin(self.song_artist_code[:self.n_songs], top_artists)
+        mask[interacted] = False
+        cand = np.flatnonzero(mask)
+        return self._top_k(cand.astype(np.int32), np.ones(len(cand)), n)
+
+    def _lightfm_idx(self, user_idx, n=20):
+        """使用 LightFM 模型推荐"""
+        if not self.is_component_ready('lightfm'):
+            return self._EMPTY
+        lightfm_user = self.lightfm_user_mapping.get(self.idx_to_user[user_idx])
+        if lightfm_user is None:
+            return self._EMPTY
+        interacted, _ = self._user_row(user_idx)
+        
+        item_song_idx = self.lightfm_item_song_idx
+        scores = self.lightfm_model.predict(lightfm_user, np.arange(len(item_song_idx), dtype=np.int32),
+                                            user_features=self.lightfm_user_features,
+                                            item_features=self.lightfm_item_features)
+        # 只保留训练集歌曲且过滤已交互
+        mask = (item_song_idx >= 0) & (item_song_idx < self.n_songs) & ~np.isin(item_song_idx, interacted)
+        return self._top_k(item_song_idx[mask], scores[mask].astype(np.float64), n)
+
     def item_based_cf(self, user_id, n=20):
         """基于物品的协同过滤"""
-        if user_id not in self.user_to_idx:
-            return []
-        user_idx = self.user_to_idx[user_id]
-        liked_songs = self.user_song_matrix[user_idx].nonzero()[1]
-        if len(liked_songs) == 0:
-            return []
-        
-        scores = {}
-        for song_idx in liked_songs:
-            other_users = self.user_song_matrix[:, song_idx].nonzero()[0]
-            for other_user_idx in other_users:
-                other_songs = self.user_song_matrix[other_user_idx].nonzero()[1]
-                for other_song_idx in other_songs:
-                    if other_song_idx not in liked_songs:
-                        other_song_id = self.idx_to_song[other_song_idx]
-                        scores[other_song_id] = scores.get(other_song_id, 0) + 1
-        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:n]
+        return self._recall_by_user(self._itemcf_idx, user_id, n)
     
     def user_based_cf(self, user_id, n=20):
-        if user_id not in self.user_cf_scores:
-            return []
-        scores = self.user_cf_scores[user_id]
-        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:n]
+        return self._recall_by_user(self._usercf_idx, user_id, n)
     
     def content_based(self, user_id, n=20):
         """基于内容的推荐"""
-        if user_id not in self.user_to_idx:
-            return []
-        user_idx = self.user_to_idx[user_id]
-        interacted = list(self.user_song_matrix[user_idx].nonzero()[1])
-        if not interacted:
-            return []
-        
-        scores = {}
-        interacted_sample = interacted[:30] if len(interacted) > 30 else interacted
-        for song_idx in interacted_sample:
-            song_id = self.idx_to_song[song_idx]
-            similar = self.content_similarities.get(song_id, {})
-            for sim_song, sim_score in similar.items():
-                scores[sim_song] = scores.get(sim_song, 0) + sim_score
-        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:n]
+        return self._recall_by_user(self._content_idx, user_id, n)
     
     def matrix_factorization_rec(self, user_id, n=20):
         """矩阵分解推荐 - 使用Faiss加速（若可用）"""
-        if self.user_factors is None or user_id not in self.user_to_idx:
-            return []
-        
-        user_idx = self.user_to_idx[user_id]
-        user_vec = self.user_factors[user_idx]
-        interacted = set(self.user_song_matrix[user_idx].nonzero()[1])
-        
-        if self.faiss_index is not None:
-            norm = np.linalg.norm(user_vec)
-            if norm == 0:
-                return []
-            user_vec_norm = (user_vec / norm).astype(np.float32).reshape(1, -1)
-            k = min(n + 50, self.faiss_index.ntotal)
-            scores, indices = self.faiss_index.search(user_vec_norm, k)
-            result = []
-            for score, idx in zip(scores[0], indices[0]):
-                if idx not in interacted:
-                    song_id = self.idx_to_song[idx]
-                    result.append((song_id, float(score)))
-                    if len(result) >= n:
-                        break
-            return result
-        else:
-            all_scores = np.dot(self.song_factors, user_vec)
-            scores = {}
-            for song_id, song_idx in self.song_to_idx.items():
-                if song_idx not in interacted and all_scores[song_idx] > 0:
-                    scores[song_id] = all_scores[song_idx]
-            if scores:
-                max_score = max(scores.values())
-                scores = {k: v/max_score for k, v in scores.items()}
-            return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:n]
+        return self._recall_by_user(self._mf_idx, user_id, n)
     
     def sentiment_based_rec(self, user_id, n=20):
         """基于用户历史歌曲的情感偏好进行推荐（仅内部）"""
-        if self.source_type != 'internal' or 'avg_sentiment' not in self.source_songs.columns:
-            return []
-        
-        if user_id not in self.user_to_idx:
-            return []
-        
-        user_idx = self.user_to_idx[user_id]
-        interacted = list(self.user_song_matrix[user_idx].nonzero()[1])
-        if len(interacted) == 0:
-            return []
-        
-        # 计算用户历史歌曲的平均情感分数
-        user_sentiment = 0.5
-        count = 0
-        weights = self.user_song_matrix[user_idx].data
-        indices = self.user_song_matrix[user_idx].indices
-        if len(weights) > 0:
-            top_k = min(30, len(weights))
-            top_indices = np.argsort(weights)[-top_k:]
-            for idx_pos in top_indices:
-                song_idx = indices[idx_pos]
-                song_id = self.idx_to_song.get(song_idx)
-                if song_id:
-                    row = self.source_songs[self.source_songs['song_id'] == song_id]
-                    if not row.empty and 'avg_sentiment' in row.columns:
-                        sent = row.iloc[0]['avg_sentiment']
-                        if pd.notna(sent):
-                            user_sentiment += sent
-                            count += 1
-        if count > 0:
-            user_sentiment /= count
-        else:
-            return []
-        
-        scores = {}
-        for _, row in self.source_songs.iterrows():
-            song_id = row['song_id']
-            if song_id in self.song_to_idx and self.song_to_idx[song_id] not in interacted:
-                song_sent = row.get('avg_sentiment', 0.5)
-                if pd.notna(song_sent):
-                    sim = 1 - abs(user_sentiment - song_sent)
-                    if sim > 0.6:
-                        scores[song_id] = sim
-        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:n]
+        return self._recall_by_user(self._sentiment_idx, user_id, n)
     
     def artist_based_rec(self, user_id, n=20):
         """基于艺术家相似度推荐"""
-        if user_id not in self.user_to_idx:
-            return []
-        user_idx = self.user_to_idx[user_id]
-        interacted = list(self.user_song_matrix[user_idx].nonzero()[1])
-        if not interacted:
-            return []
-        
-        artists = []
-        for song_idx in interacted:
-            song_id = self.idx_to_song[song_idx]
-            info = self.get_song_info(song_id)
-            if info and info.get('artists') and info['artists'] != '未知':
-                artists.append(info['artists'])
-        if not artists:
+        return self._recall_by_user(self._artist_idx, user_id, n)
+    
+    def lightfm_rec(self, user_id, n=20):
+        """使用 LightFM 模型推荐"""
+        return self._recall_by_user(self._lightfm_idx, user_id, n)
+    
+    def fold_in_user(self, song_weights, reg=0.1):
+        """
+        冷启动用户折叠（fold-in）：将用户近期交互投影到MF空间
+        求解岭回归 min ||r - V_I u||^2 + reg * ||u||^2，其中V_I为交互歌曲的song_factors
+        song_weights: {song_id: weight}
+        返回 (用户向量, 已交互歌曲编码数组)，无法投影时返回 (None, 空数组)
+        """
+        empty = np.empty(0, dtype=np.int32)
+        if self.song_factors is None or not song_weights:
+            return None, empty
+        
+        song_ids = list(song_weights.keys())
+        indices = self.song_vocab.encode_many(song_ids)
+        weights = np.array([float(song_weights[sid]) for sid in song_ids])
+        # 只有训练集歌曲（矩阵列）有 song_factors
+        valid = (indices >= 0) & (indices < self.n_songs) & (weights > 0)
+        if not valid.any():
+            return None, empty
+        
+        indices, weights = indices[valid], weights[valid]
+        V = self.song_factors[indices]
+        A = V.T @ V + reg * np.eye(V.shape[1])
+        user_vec = np.linalg.solve(A, V.T @ weights)
+        return user_vec, indices
+    
+    def fold_in_rec(self, song_weights, n=20, reg=0.1):
+        """基于折叠用户向量的MF推荐（新注册用户，无需重新训练）"""
+        user_vec, interacted = self.fold_in_user(song_weights, reg=reg)
+        if user_vec is None:
             return []
-        
-        top_artists = [a for a, _ in Counter(artists).most_common(3)]
-        scores = {}
-        for artist in top_artists:
-            artist_songs = self.source_songs[self.source_songs['artists'] == artist]['song_id'].tolist()
-            for sid in artist_songs:
-                if sid in self.song_to_idx and self.song_to_idx[sid] not in interacted:
-                    scores[sid] = scores.get(sid, 0) + 1
-        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:n]
+        return self._to_pairs(*self._mf_search_idx(user_vec, interacted, n))
     
     # ------------------------ LightFM 模型 ------------------------
     def _train_lightfm(self):
@@ -852,6 +1395,7 @@ class SourceSpecificRecommender:
         
         if os.path.exists(cache_file):
             print(f"    从缓存加载{self.source_type} LightFM模型...")
+            _import_lightfm()
             with open(cache_file, 'rb') as f:
                 d = pickle.load(f)
                 self.lightfm_model = d['model']
@@ -874,6 +1418,7 @@ class SourceSpecificRecommender:
             return
         
         print(f"    训练{self.source_type} LightFM模型（带特征，快速模式）...")
+        LightFM, Dataset = _import_lightfm()
         
         # ===== 快速参数设置（可调）=====
         no_components = 10      # 降维
@@ -987,40 +1532,6 @@ class SourceSpecificRecommender:
             }, f)
         print(f"      LightFM模型训练完成（带特征），保存至缓存")
     
-    def lightfm_rec(self, user_id, n=20):
-        """使用 LightFM 模型推荐"""
-        if self.lightfm_model is None or user_id not in self.lightfm_user_mapping:
-            return []
-        user_idx = self.lightfm_user_mapping.get(user_id)
-        if user_idx is None:
-            return []
-        
-        # 获取已交互歌曲
-        if user_id in self.user_to_idx:
-            interacted = set(self.user_song_matrix[self.user_to_idx[user_id]].nonzero()[1])
-        else:
-            interacted = set()
-        
-        # 对所有物品预测得分
-        n_items = len(self.lightfm_item_mapping)
-        item_indices = list(range(n_items))
-        scores = self.lightfm_model.predict(user_idx, item_indices,
-                                            user_features=self.lightfm_user_features,
-                                            item_features=self.lightfm_item_features)
-        
-        # 排序并过滤已交互
-        item_score_pairs = [(self._idx_to_item_id(i), scores[i]) for i in item_indices]
-        item_score_pairs = [(iid, s) for iid, s in item_score_pairs if iid in self.song_to_idx and self.song_to_idx[iid] not in interacted]
-        item_score_pairs.sort(key=lambda x: x[1], reverse=True)
-        return item_score_pairs[:n]
-    
-    def _idx_to_item_id(self, idx):
-        """根据 LightFM 内部索引获取歌曲ID（逆向映射）"""
-        for iid, i in self.lightfm_item_mapping.items():
-            if i == idx:
-                return iid
-        return None
-    
     # ------------------------ 冷启动与MMR ------------------------
     def get_cold_start_recs(self, profile=None, n=10):
         # 优先使用用户画像
@@ -1055,31 +1566,63 @@ class SourceSpecificRecommender:
         random.shuffle(selected)
         return [(sid, 0.5) for sid in selected]
     
+    def _similarity_to(self, cand_idx, nn_idx, nn_sim, cand_genre, song_idx):
+        """所有候选与某首已选歌曲的相似度：max(候选内容近邻中该歌曲的相似度, 同流派0.5)
+
+        nn_idx/nn_sim/cand_genre 为候选对应的近邻行和流派编码，按候选预先切好。
+        """
+        sim = np.zeros(len(cand_idx), dtype=np.float64)
+        if nn_idx is not None:
+            match = nn_idx == song_idx
+            # 每行近邻不重复，命中至多一列，按行求和即取出该列相似度
+            sim = np.where(match, nn_sim, 0).sum(axis=1, dtype=np.float64)
+        genre = self.song_genre_code[song_idx]
+        if genre >= 0:
+            np.maximum(sim, np.where(cand_genre == genre, 0.5, 0.0), out=sim)
+        return sim
+
+    def _mmr_rerank_idx(self, cand_idx, cand_scores, n=10, lambda_=0.6):
+        """MMR多样性重排（歌曲编码），返回 (编码数组, 得分数组)
+
+        维护每个候选与已选集合的最大相似度向量，每选中一首只用其内容近邻行
+        和流派编码更新一次，整体为 O(n × 候选数 × 近邻数) 的数组运算。
+        """
+        if len(cand_idx) <= n:
+            return cand_idx, cand_scores
+
+        if self.content_nn_idx is not None:
+            nn_idx = self.content_nn_idx[cand_idx]
+            nn_sim = self.content_nn_sim[cand_idx]
+        else:
+            nn_idx = nn_sim = None
+        cand_genre = self.song_genre_code[cand_idx]
+        relevance = lambda_ * np.asarray(cand_scores, dtype=np.float64)
+
+        available = np.ones(len(cand_idx), dtype=bool)
+        available[0] = False
+        selected = [0]
+        max_sim = self._similarity_to(cand_idx, nn_idx, nn_sim, cand_genre, cand_idx[0])
+
+        while len(selected) < n and available.any():
+            mmr_scores = np.where(available, relevance - (1 - lambda_) * max_sim, -np.inf)
+            best = int(np.argmax(mmr_scores))
+            selected.append(best)
+            available[best] = False
+            np.maximum(max_sim, self._similarity_to(cand_idx, nn_idx, nn_sim, cand_genre, cand_idx[best]),
+                       out=max_sim)
+        selected = np.asarray(selected)
+        return cand_idx[selected], cand_scores[selected]
+
     def mmr_rerank(self, candidates, user_id, n=10, lambda_=0.6):
         """MMR多样性重排"""
         if len(candidates) <= n:
             return candidates
-        
-        selected = [candidates[0]]
-        remaining = candidates[1:]
-        
-        while len(selected) < n and remaining:
-            best_score = -float('inf')
-            best_idx = -1
-            for i, (song_id, relevance) in enumerate(remaining):
-                max_sim = 0
-                for sel_id, _ in selected:
-                    content_sim = self.content_similarities.get(song_id, {}).get(sel_id, 0)
-                    genre_sim = 0.5 if self.get_song_info(sel_id) and self.get_song_info(song_id) and \
-                        self.get_song_info(sel_id).get('genre') == self.get_song_info(song_id).get('genre') else 0
-                    max_sim = max(max_sim, content_sim, genre_sim)
-                mmr_score = lambda_ * relevance - (1 - lambda_) * max_sim
-                if mmr_score > best_score:
-                    best_score = mmr_score
-                    best_idx = i
-            if best_idx >= 0:
-                selected.append(remaining.pop(best_idx))
-        return selected
+        cand_idx = self.song_vocab.encode_many([sid for sid, _ in candidates])
+        if (cand_idx < 0).any():
+            # 不在本来源词表中的歌曲无法比较相似度，保持原顺序截断
+            return candidates[:n]
+        cand_scores = np.array([score for _, score in candidates], dtype=np.float64)
+        return self._to_pairs(*self._mmr_rerank_idx(cand_idx, cand_scores, n, lambda_))
     
     # ------------------------ 混合推荐（全算法保留）-----------------------
     def hybrid_recommendation_parallel(self, user_id, n=10, use_mmr=True,
@@ -1088,11 +1631,34 @@ class SourceSpecificRecommender:
         """
         并行混合推荐（7种算法）
         - w_artist 和 w_lightfm 固定，其余5个可调优
+        - 召回、融合、重排均在歌曲编码上进行，返回前才还原为字符串ID
         """
-        # 外部用户禁用 sentiment
-        if self.source_type != 'internal':
+        weight_map = self._hybrid_weight_map(self.source_type, w_itemcf, w_usercf, w_content, w_mf,
+                                             w_sentiment, w_artist, w_lightfm)
+        
+        user_idx = self.user_vocab.encode(user_id)
+        if user_idx < 0:
+            return self.get_cold_start_recs(self.get_user_profile(user_id), n)
+        
+        recall_k = n * 5  # 可调
+        recalls = self._recall_all(user_idx, recall_k, with_sentiment=weight_map['sentiment'] > 0)
+        
+        cand_idx, cand_scores = self._rank_fused(recalls, weight_map, n, use_mmr,
+                                                 self.song_pop_arr, self._hot_idx())
+        if len(cand_idx) == 0:
+            return self.get_cold_start_recs(self.get_user_profile(user_id), n)
+        
+        if use_mmr:
+            return self._to_pairs(*self._mmr_rerank_idx(cand_idx, cand_scores, n))
+        else:
+            return self._to_pairs(cand_idx[:n], cand_scores[:n])
+
+    @staticmethod
+    def _hybrid_weight_map(source_type, w_itemcf, w_usercf, w_content, w_mf,
+                           w_sentiment, w_artist, w_lightfm):
+        """7路融合权重；外部来源禁用 sentiment 并将其余权重重新归一化"""
+        if source_type != 'internal':
             w_sentiment = 0.0
-            # 重新归一化
             total = w_itemcf + w_usercf + w_content + w_mf + w_artist + w_lightfm
             w_itemcf /= total
             w_usercf /= total
@@ -1100,22 +1666,7 @@ class SourceSpecificRecommender:
             w_mf /= total
             w_artist /= total
             w_lightfm /= total
-        
-        all_scores = {}
-        recall_k = n * 5  # 可调
-        
-        tasks = {
-            'itemcf': lambda: self.item_based_cf(user_id, n=recall_k),
-            'usercf': lambda: self.user_based_cf(user_id, n=recall_k),
-            'content': lambda: self.content_based(user_id, n=recall_k),
-            'mf': lambda: self.matrix_factorization_rec(user_id, n=recall_k),
-            'artist': lambda: self.artist_based_rec(user_id, n=recall_k),
-            'lightfm': lambda: self.lightfm_rec(user_id, n=recall_k)
-        }
-        if w_sentiment > 0:
-            tasks['sentiment'] = lambda: self.sentiment_based_rec(user_id, n=recall_k)
-        
-        weight_map = {
+        return {
             'itemcf': w_itemcf,
             'usercf': w_usercf,
             'content': w_content,
@@ -1124,57 +1675,143 @@ class SourceSpecificRecommender:
             'artist': w_artist,
             'lightfm': w_lightfm
         }
+
+    def _recall_all(self, user_idx, recall_k, with_sentiment=True):
+        """并行执行各路召回，返回 {算法: (歌曲编码数组, 得分数组)}"""
+        tasks = {
+            'itemcf': self._itemcf_idx,
+            'usercf': self._usercf_idx,
+            'content': self._content_idx,
+            'mf': self._mf_idx,
+            'artist': self._artist_idx,
+            'lightfm': self._lightfm_idx
+        }
+        if with_sentiment:
+            tasks['sentiment'] = self._sentiment_idx
         
+        recalls = {}
         with ThreadPoolExecutor(max_workers=4) as executor:
-            future_to_algo = {executor.submit(func): name for name, func in tasks.items()}
+            future_to_algo = {executor.submit(func, user_idx, recall_k): name for name, func in tasks.items()}
             for future in as_completed(future_to_algo):
                 algo = future_to_algo[future]
                 try:
-                    recs = future.result()
-                    if recs:
-                        max_score = max(r[1] for r in recs)
-                        weight = weight_map[algo]
-                        for sid, score in recs:
-                            all_scores[sid] = all_scores.get(sid, 0) + (score / max_score) * weight
+                    recalls[algo] = future.result()
                 except Exception as e:
                     print(f"      并行任务 {algo} 失败: {e}")
+        return recalls
+
+    def _hot_idx(self):
+        """热门+流行层歌曲编码（融合得分偏低时的补充来源）"""
+        return np.concatenate([self.tiered_idx.get('hit', self._EMPTY[0]),
+                               self.tiered_idx.get('popular', self._EMPTY[0])])
+
+    @staticmethod
+    def _rank_fused(recalls, weight_map, n, use_mmr, song_pop_arr, hot_idx):
+        """融合召回并排序：MMR 时返回完整有序候选，否则只保留前n；最高分偏低时补充热门歌曲
+
+        只依赖传入的数组，调权时可在子进程中直接复用。
+        """
+        cand_idx, cand_scores = SourceSpecificRecommender._fuse_recalls(recalls, weight_map, song_pop_arr)
+        if len(cand_idx) == 0:
+            return cand_idx, cand_scores
         
-        if not all_scores:
-            return self.get_cold_start_recs(self.get_user_profile(user_id), n)
-        
-        # 流行度惩罚
-        penalty_factor = 0.1
-        for sid in list(all_scores.keys()):
-            pop = self.song_popularity.get(sid, 50) / 100.0
-            all_scores[sid] -= penalty_factor * pop
-        
-        candidates = sorted(all_scores.items(), key=lambda x: x[1], reverse=True)
-        if candidates and candidates[0][1] < 0.3:
-            hot_songs = self.tiered_songs.get('hit', []) + self.tiered_songs.get('popular', [])
-            existing = {sid for sid, _ in candidates}
-            for sid in hot_songs:
-                if sid not in existing:
-                    candidates.append((sid, 0.2))
-                    existing.add(sid)
-                    if len(candidates) >= n * 2:
-                        break
-            candidates.sort(key=lambda x: x[1], reverse=True)
-        
+        all_candidates = cand_idx
         if use_mmr:
-            return self.mmr_rerank(candidates, user_id, n)
+            # MMR 需要完整的有序候选列表
+            order = np.argsort(-cand_scores, kind='stable')
         else:
-            return candidates[:n]
+            order = SourceSpecificRecommender._top_k(np.arange(len(cand_idx)), cand_scores, n)[0]
+        cand_idx, cand_scores = cand_idx[order], cand_scores[order]
+        
+        if cand_scores[0] < 0.3:
+            cand_idx, cand_scores = SourceSpecificRecommender._append_hot_songs(
+                cand_idx, cand_scores, n, all_candidates, hot_idx)
+        return cand_idx, cand_scores
+
+    @staticmethod
+    def _fuse_recalls(recalls, weight_map, song_pop_arr, penalty_factor=0.1):
+        """各路召回按最大值归一化后加权求和（np.add.at），再减去流行度惩罚
+
+        recalls: {算法: (歌曲编码数组, 得分数组)}
+        返回按歌曲编码升序的 (候选编码, 融合得分)
+        """
+        parts_idx, parts_val = [], []
+        for algo, (song_idx, scores) in recalls.items():
+            if len(song_idx) == 0:
+                continue
+            max_score = scores.max()
+            if max_score == 0:
+                continue
+            parts_idx.append(song_idx)
+            parts_val.append(scores * (weight_map[algo] / max_score))
+        if not parts_idx:
+            return SourceSpecificRecommender._EMPTY
+        
+        all_idx = np.concatenate(parts_idx)
+        cand_idx, inverse = np.unique(all_idx, return_inverse=True)
+        fused = np.zeros(len(cand_idx))
+        np.add.at(fused, inverse, np.concatenate(parts_val))
+        
+        # 流行度惩罚
+        fused -= penalty_factor * song_pop_arr[cand_idx] / 100.0
+        return cand_idx.astype(np.int32), fused
+
+    @staticmethod
+    def _append_hot_songs(cand_idx, cand_scores, n, all_candidates, hot_idx):
+        """融合最高分偏低时，以0.2分补充热门歌曲（至少补1首，候选总数补到2n），再稳定排序
+
+        all_candidates 为截断前的全部候选（非MMR时 cand_idx 只保留了前n）。
+        """
+        hot = hot_idx[(hot_idx >= 0) & ~np.isin(hot_idx, all_candidates)]
+        _, first = np.unique(hot, return_index=True)
+        hot = hot[np.sort(first)]
+        hot = hot[:max(1, n * 2 - len(all_candidates))]
+        if len(hot) == 0:
+            return cand_idx, cand_scores
+        cand_idx = np.concatenate([cand_idx, hot.astype(np.int32)])
+        cand_scores = np.concatenate([cand_scores, np.full(len(hot), 0.2)])
+        order = np.argsort(-cand_scores, kind='stable')
+        return cand_idx[order], cand_scores[order]
     
     # ------------------------ 权重调优（仅针对5个可变算法）-----------------------
-    def tune_weights(self, val_users, n=10, metric='ndcg'):
+    def tune_weights(self, val_users, n=10, metric='ndcg', search='grid', n_iter=200,
+                     workers=None, seed=42):
         """在验证集上搜索最优权重组合（ItemCF, UserCF, Content, MF, Sentiment），
-           Artist 和 LightFM 权重固定为 0.1"""
-        best_score = -1
-        best_weights = None
+           Artist 和 LightFM 权重固定为 0.1
+
+        每个验证用户的各路召回只计算一次并缓存，每组权重仅重新做融合与排序；
+        权重组合分发到进程池并行评估。search='random' 时在和为0.8的单纯形上随机采样 n_iter 组。
+        """
         # 固定权重
         w_artist_fixed = 0.1
         w_lightfm_fixed = 0.1
-        # 剩余 0.8 分配给 5 个算法
+        if search == 'random':
+            candidates = self._random_weight_grid(n_iter, seed)
+        else:
+            candidates = self._weight_grid()
+        
+        start_time = time.time()
+        task = self._build_tuning_task(val_users, n, metric, w_artist_fixed, w_lightfm_fixed)
+        print(f"    召回缓存完成: {len(task.users)} 用户，耗时 {time.time() - start_time:.1f}s；"
+              f"评估 {len(candidates)} 组权重")
+        
+        start_time = time.time()
+        scores = _run_weight_tuning(task, candidates, workers)
+        
+        best_score = -1
+        best_weights = None
+        for weights, score in zip(candidates, scores):
+            if score > best_score:
+                best_score = score
+                best_weights = weights
+                print(f"      新最佳: {best_weights} -> {metric}={score:.4f}")
+        print(f"    权重调优完成，最佳: {best_weights} (最佳{metric}={best_score:.4f})，"
+              f"评估耗时 {time.time() - start_time:.1f}s")
+        return best_weights
+
+    def _weight_grid(self):
+        """步长0.1的网格，5个可调权重之和为0.8（外部来源 sentiment 恒为0）"""
+        grid = []
         for w_item in np.arange(0.0, 0.5, 0.1):
             for w_user in np.arange(0.0, 0.4, 0.1):
                 for w_cont in np.arange(0.0, 0.4, 0.1):
@@ -1188,45 +1825,43 @@ class SourceSpecificRecommender:
                                 total = w_item + w_user + w_cont + w_mf
                                 if abs(total - 0.8) > 0.01:
                                     continue
-                            # 评估
-                            score = self._eval_weights(val_users, w_item, w_user, w_cont, w_mf, w_sent,
-                                                        w_artist_fixed, w_lightfm_fixed, n, metric)
-                            if score > best_score:
-                                best_score = score
-                                best_weights = (w_item, w_user, w_cont, w_mf, w_sent)
-                                print(f"      新最佳: {best_weights} -> {metric}={score:.4f}")
-        print(f"    权重调优完成，最佳: {best_weights} (最佳{metric}={best_score:.4f})")
-        return best_weights
-    
-    def _eval_weights(self, val_users, w_item, w_user, w_cont, w_mf, w_sent,
-                      w_artist, w_lightfm, n=10, metric='ndcg'):
-        scores = []
+                            grid.append((w_item, w_user, w_cont, w_mf, w_sent))
+        # 外部来源把 sentiment 置0后会产生重复组合，保序去重
+        return list(dict.fromkeys(grid))
+
+    def _random_weight_grid(self, n_iter, seed=42):
+        """在和为0.8的单纯形上均匀采样权重（外部来源 sentiment 恒为0）"""
+        rng = np.random.default_rng(seed)
+        n_free = 5 if self.source_type == 'internal' else 4
+        samples = np.round(rng.dirichlet(np.ones(n_free), size=n_iter) * 0.8, 3)
+        if n_free == 4:
+            samples = np.hstack([samples, np.zeros((n_iter, 1))])
+        return list(dict.fromkeys(tuple(float(w) for w in row) for row in samples))
+
+    def _build_tuning_task(self, val_users, n, metric, w_artist, w_lightfm):
+        """为验证用户缓存各路召回和测试集歌曲，生成可在子进程中独立评估的调权任务"""
+        test = self.test_interactions
+        test = test[test['user_id'].isin(set(val_users))]
+        # song_id 可能是 category 类型，agg 返回 set 会被转回该类型而报错，先取 unique 再建集合
+        test_songs = {uid: set(songs.tolist())
+                      for uid, songs in test.groupby('user_id', sort=False, observed=True)['song_id'].unique().items()}
+        
+        recall_k = n * 5
+        users = []
         for uid in val_users:
-            test_songs = set(self.test_interactions[self.test_interactions['user_id'] == uid]['song_id'].tolist())
-            if not test_songs:
-                continue
-            recs = self.hybrid_recommendation_parallel(uid, n=n, use_mmr=False,
-                                                        w_itemcf=w_item, w_usercf=w_user,
-                                                        w_content=w_cont, w_mf=w_mf,
-                                                        w_sentiment=w_sent,
-                                                        w_artist=w_artist,
-                                                        w_lightfm=w_lightfm)
-            if not recs:
+            songs = test_songs.get(uid)
+            if not songs:
                 continue
-            rec_songs = [r[0] for r in recs]
-            if metric == 'ndcg':
-                dcg = sum(1 / np.log2(idx+2) for idx, song in enumerate(rec_songs) if song in test_songs)
-                idcg = sum(1 / np.log2(idx+2) for idx in range(min(len(test_songs), n)))
-                score = dcg / idcg if idcg > 0 else 0
-            elif metric == 'precision':
-                hits = len(set(rec_songs) & test_songs)
-                score = hits / n
-            elif metric == 'hitrate':
-                score = 1 if len(set(rec_songs) & test_songs) > 0 else 0
-            else:
-                score = 0
-            scores.append(score)
-        return np.mean(scores) if scores else 0
+            user_idx = self.user_vocab.encode(uid)
+            recalls = self._recall_all(user_idx, recall_k) if user_idx >= 0 else {}
+            # 融合为空时回退的冷启动推荐与权重无关（且带随机性），只取一次
+            recs = self.get_cold_start_recs(self.get_user_profile(uid), n)
+            fallback = self.song_vocab.encode_many([sid for sid, _ in recs])
+            test_idx = self.song_vocab.encode_many(list(songs))
+            users.append(WeightTuningUser(recalls, fallback, frozenset(test_idx[test_idx >= 0].tolist()),
+                                          len(songs)))
+        return WeightTuningTask(users, self.song_pop_arr, self._hot_idx(), self.source_type,
+                                n, metric, w_artist, w_lightfm)
     
     # ------------------------ 辅助方法 ------------------------
     def get_user_history(self, user_id, n=5):
@@ -1245,7 +1880,7 @@ class SourceSpecificRecommender:
             top_song_indices = indices[top_indices]
             history = []
             for idx in top_song_indices:
-                song_id = self.idx_to_song.get(idx)
+                song_id = self.idx_to_song[idx]
                 if song_id:
                     info = self.get_song_info(song_id)
                     if info:
@@ -1272,60 +1907,126 @@ class SourceSpecificRecommender:
             'avg_popularity': float(row.get('avg_popularity_pref', 50)),
             'source': self.source_type
         }
-    def artist_based_rec(self, user_id, n=20):
-        """基于艺术家相似度推荐"""
-        if user_id not in self.user_to_idx:
-            return []
-        user_idx = self.user_to_idx[user_id]
-        interacted = list(self.user_song_matrix[user_idx].nonzero()[1])
-        if not interacted:
-            return []
-        
-        # 获取用户历史歌曲的艺术家
-        artists = []
-        for song_idx in interacted:
-            song_id = self.idx_to_song[song_idx]
-            info = self.get_song_info(song_id)
-            if info and info.get('artists') and info['artists'] != '未知':
-                artists.append(info['artists'])
-        if not artists:
-            return []
-        
-        # 统计出现次数最多的艺术家（取前3）
-        from collections import Counter
-        top_artists = [a for a, _ in Counter(artists).most_common(3)]
-        
-        # 找出这些艺术家的其他歌曲（未听过的）
-        scores = {}
-        for artist in top_artists:
-            artist_songs = self.source_songs[self.source_songs['artists'] == artist]['song_id'].tolist()
-            for sid in artist_songs:
-                if sid in self.song_to_idx and self.song_to_idx[sid] not in interacted:
-                    scores[sid] = scores.get(sid, 0) + 1
-        
-        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:n]
+
+
+# ---------------------------- 权重调优任务 ----------------------------
+# 单个验证用户的调权数据：各路召回、融合为空时的冷启动推荐、测试集歌曲编码及原始测试歌曲数
+WeightTuningUser = namedtuple('WeightTuningUser', ['recalls', 'fallback', 'test_idx', 'n_test'])
+
+
+class WeightTuningTask:
+    """调权评估任务：只持有召回缓存和融合所需数组，可被子进程独立评估"""
+
+    def __init__(self, users, song_pop_arr, hot_idx, source_type, n, metric, w_artist, w_lightfm):
+        self.users = users
+        self.song_pop_arr = song_pop_arr
+        self.hot_idx = hot_idx
+        self.source_type = source_type
+        self.n = n
+        self.metric = metric
+        self.w_artist = w_artist
+        self.w_lightfm = w_lightfm
+
+    def score(self, weights):
+        """与 hybrid_recommendation_parallel(use_mmr=False) 相同的融合排序，返回验证用户平均指标"""
+        weight_map = SourceSpecificRecommender._hybrid_weight_map(
+            self.source_type, *weights, self.w_artist, self.w_lightfm)
+        n = self.n
+        scores = []
+        for user in self.users:
+            recalls = user.recalls
+            if weight_map['sentiment'] <= 0 and 'sentiment' in recalls:
+                recalls = {algo: r for algo, r in recalls.items() if algo != 'sentiment'}
+            rec_idx = SourceSpecificRecommender._rank_fused(
+                recalls, weight_map, n, False, self.song_pop_arr, self.hot_idx)[0][:n]
+            if len(rec_idx) == 0:
+                rec_idx = user.fallback
+            if len(rec_idx) == 0:
+                continue
+            scores.append(self._metric(rec_idx.tolist(), user.test_idx, user.n_test))
+        return np.mean(scores) if scores else 0
+
+    def _metric(self, rec_idx, test_idx, n_test):
+        n = self.n
+        if self.metric == 'ndcg':
+            dcg = sum(1 / np.log2(idx+2) for idx, song in enumerate(rec_idx) if song in test_idx)
+            idcg = sum(1 / np.log2(idx+2) for idx in range(min(n_test, n)))
+            return dcg / idcg if idcg > 0 else 0
+        elif self.metric == 'precision':
+            return len(set(rec_idx) & test_idx) / n
+        elif self.metric == 'hitrate':
+            return 1 if len(set(rec_idx) & test_idx) > 0 else 0
+        return 0
+
+
+_TUNING_TASK = None
+
+
+def _init_tuning_worker(task):
+    global _TUNING_TASK
+    _TUNING_TASK = task
+
+
+def _score_weights(weights):
+    return _TUNING_TASK.score(weights)
+
+
+def _run_weight_tuning(task, candidates, workers=None):
+    """按顺序返回每组权重的得分；进程池不可用时退回单进程"""
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(candidates))
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_tuning_worker,
+                                     initargs=(task,)) as pool:
+                chunksize = max(1, len(candidates) // (workers * 4))
+                return list(pool.map(_score_weights, candidates, chunksize=chunksize))
+        except Exception as e:
+            print(f"    进程池调权失败，改为单进程评估: {e}")
+    return [task.score(weights) for weights in candidates]
+
+
+# 判断某来源缓存是否完整的核心缓存文件
+CORE_CACHE_FILES = ('user_song_matrix.npz', 'mappings.pkl', 'mf.pkl',
+                    'user_sim.pkl', 'user_sim_items.pkl', 'user_cf_scores.pkl', 'content_sim.pkl')
+
+
+def _warm_source_cache(source_data, song_features, source_type, cache_dir):
+    """在子进程中完整构建一次推荐器，只为写出缓存文件（CPU密集的SVD/相似度计算不受GIL限制）"""
+    SourceSpecificRecommender(source_data, song_features, source_type, cache_dir=cache_dir)
+    return source_type
 
 
 # ---------------------------- 分离式推荐系统主类 ----------------------------
 class SeparatedMusicRecommender:
     """分离式音乐推荐系统（全算法保留 + 优化）"""
     
-    def __init__(self, data_dir="separated_processed_data", cache_dir="recommender_cache"):
+    def __init__(self, data_dir="separated_processed_data", cache_dir="recommender_cache",
+                 lazy=False, parallel=True, data_loader=None, process_pool=True):
         self.data_dir = data_dir
         self.cache_dir = cache_dir
+        self.init_timings = {}
         
-        data_loader = SeparatedDataLoader(data_dir)
+        start_time = time.time()
+        # 默认从SQL Server读取；传入 FileDataLoader 等加载器可改为读文件
+        data_loader = data_loader or SeparatedDataLoader(data_dir)
         all_data = data_loader.load_all_data()
+        self.init_timings['load_data'] = time.time() - start_time
         
-        self.internal_recommender = SourceSpecificRecommender(
-            all_data['internal'], all_data['all_songs'], 'internal', 
-            cache_dir=os.path.join(cache_dir, 'internal')
-        )
-        
-        self.external_recommender = SourceSpecificRecommender(
-            all_data['external'], all_data['all_songs'], 'external',
-            cache_dir=os.path.join(cache_dir, 'external')
-        )
+        source_args = {
+            source: (all_data[source], all_data[source].get('songs', all_data['all_songs']),
+                     source, os.path.join(cache_dir, source))
+            for source in ('internal', 'external')
+        }
+        start_time = time.time()
+        if parallel:
+            recommenders = self._build_sources_parallel(source_args, lazy, process_pool)
+        else:
+            recommenders = {source: self._build_source(args, lazy)
+                            for source, args in source_args.items()}
+        self.init_timings['build_sources'] = time.time() - start_time
+        self.internal_recommender = recommenders['internal']
+        self.external_recommender = recommenders['external']
         
         self._load_cross_popular_songs()
         
@@ -1333,6 +2034,75 @@ class SeparatedMusicRecommender:
         print("分离式推荐系统初始化完成！")
         print("="*80)
     
+    @staticmethod
+    def _has_warm_cache(args):
+        source_type, cache_dir = args[2], args[3]
+        source_cache = os.path.join(cache_dir, source_type)
+        return all(os.path.exists(os.path.join(source_cache, f)) for f in CORE_CACHE_FILES)
+
+    def _build_sources_parallel(self, source_args, lazy, process_pool=True):
+        """两个来源并行构建：线程负责缓存加载，冷缓存的来源先在进程池中完整构建写出缓存
+
+        lazy 模式下重型组件本就在后台加载，不做进程预热，避免阻塞服务就绪。
+        进程池使用 spawn：在已有线程的进程（如 Web 服务）里 fork 会复制被占用的锁，子进程可能死锁。
+        在线服务传入 process_pool=False，只用线程构建，不复制整份数据到子进程。
+        """
+        cold = []
+        if process_pool and not lazy:
+            cold = [s for s, args in source_args.items() if not self._has_warm_cache(args)]
+        pool = None
+        if cold:
+            try:
+                pool = ProcessPoolExecutor(max_workers=len(cold),
+                                           mp_context=multiprocessing.get_context('spawn'))
+                print(f"  缓存未就绪的来源 {cold} 将在子进程中并行构建")
+            except Exception as e:
+                print(f"  无法创建进程池，改为线程内构建: {e}")
+        try:
+            with ThreadPoolExecutor(max_workers=len(source_args)) as executor:
+                futures = {
+                    source: executor.submit(self._build_source, args, lazy,
+                                            pool if source in cold else None)
+                    for source, args in source_args.items()
+                }
+                return {source: future.result() for source, future in futures.items()}
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    def _build_source(self, args, lazy, pool=None):
+        source_type = args[2]
+        start_time = time.time()
+        if pool is not None:
+            try:
+                pool.submit(_warm_source_cache, *args).result()
+            except Exception as e:
+                print(f"  {source_type} 子进程构建缓存失败，改为在当前进程构建: {e}")
+        recommender = SourceSpecificRecommender(*args, lazy=lazy)
+        self.init_timings[source_type] = time.time() - start_time
+        return recommender
+
+    def component_status(self):
+        """各来源重型召回组件的加载状态"""
+        return {
+            'internal': dict(self.internal_recommender.component_status),
+            'external': dict(self.external_recommender.component_status)
+        }
+
+    def startup_timings(self):
+        """启动耗时明细（秒）：延迟导入、系统级阶段、各来源的初始化阶段与后台组件"""
+        return {
+            'imports': dict(IMPORT_TIMINGS),
+            'system': dict(self.init_timings),
+            'internal': dict(self.internal_recommender.init_timings),
+            'external': dict(self.external_recommender.init_timings)
+        }
+
+    def wait_for_components(self, timeout=None):
+        internal_done = self.internal_recommender.wait_for_components(timeout)
+        external_done = self.external_recommender.wait_for_components(timeout)
+        return internal_done and external_done
+
     def _load_cross_popular_songs(self):
         """加载交叉热门歌曲"""
         internal_hits = self.internal_recommender.tiered_songs.get('hit', [])
@@ -1617,16 +2387,25 @@ class SeparatedMusicRecommender:
         return recs
     
     # ------------------------ 权重调优接口 ------------------------
-    def tune_weights_for_source(self, source_type='internal', n_val_users=200, n=10):
+    def tune_weights_for_source(self, source_type='internal', n_val_users=200, n=10, **tune_kwargs):
         recommender = getattr(self, f'{source_type}_recommender')
         val_users = random.sample(list(recommender.test_interactions['user_id'].unique()),
                                    min(n_val_users, len(recommender.test_interactions['user_id'].unique())))
-        best_weights = recommender.tune_weights(val_users, n=n)
+        best_weights = recommender.tune_weights(val_users, n=n, **tune_kwargs)
         print(f"{source_type} 最佳权重: {best_weights}")
         return best_weights
 
 
 # ---------------------------- 离线评估器（优化版） ----------------------------
+# fork 出的评估子进程从这里取已加载的推荐系统
+_EVAL_SYSTEM = None
+
+
+def _recommend_shard(source_type, users, k, weights):
+    recommender = getattr(_EVAL_SYSTEM, f'{source_type}_recommender')
+    return SeparatedRecommenderEvaluator._recommend_users(recommender, users, k, weights)
+
+
 class SeparatedRecommenderEvaluator:
     """分离式推荐系统评估器（支持权重传入）"""
     
@@ -1659,15 +2438,16 @@ class SeparatedRecommenderEvaluator:
     def evaluate(self, n_users=500, k=10, save_recs=False,
                 internal_weights=(0.15,0.0,0.15,0.25,0.1,0.1,0.15),
                 external_weights=(0.2,0.0,0.15,0.3,0.0,0.1,0.15),
-                min_interactions=5):
+                min_interactions=5, workers=1):
         """
         评估推荐系统，使用指定权重
         internal_weights: (w_itemcf, w_usercf, w_content, w_mf, w_sentiment, w_artist, w_lightfm)
         external_weights: 同上
         min_interactions: 只评估训练集中交互次数 >= 该值的用户
+        workers: 生成推荐的并行进程数（不支持 fork 的平台改用线程），1 为顺序执行
         """
         print("\n" + "="*80)
-        print(f"推荐系统评估 (n_users={n_users}, k={k})")
+        print(f"推荐系统评估 (n_users={n_users}, k={k}, workers={workers})")
         print(f"  内部权重: ItemCF={internal_weights[0]}, UserCF={internal_weights[1]}, Content={internal_weights[2]}, MF={internal_weights[3]}, Sentiment={internal_weights[4]}, Artist={internal_weights[5]}, LightFM={internal_weights[6]}")
         print(f"  外部权重: ItemCF={external_weights[0]}, UserCF={external_weights[1]}, Content={external_weights[2]}, MF={external_weights[3]}, Sentiment={external_weights[4]}, Artist={external_weights[5]}, LightFM={external_weights[6]}")
         if save_recs and self.save_to_sql:
@@ -1691,6 +2471,7 @@ class SeparatedRecommenderEvaluator:
             # 筛选交互次数足够的用户
             user_counts = recommender.train_interactions.groupby('user_id').size()
             valid_users = set(user_counts[user_counts >= min_interactions].index)
+            test_index = self._build_test_index(recommender)
             test_users = [u for u in recommender.test_interactions['user_id'].unique() if u in valid_users]
             if len(test_users) == 0:
                 print(f"⚠️ {source_type} 无有效测试用户（交互数≥{min_interactions}），跳过")
@@ -1700,88 +2481,25 @@ class SeparatedRecommenderEvaluator:
             total_eval = len(eval_users)
             print(f"\n▶ 开始评估 {source_type.upper()} 用户 (共{total_eval}人)")
             
-            metrics = {
-                'precision': [], 'recall': [], 'ndcg': [], 
-                'hit': [], 'diversity': [], 'coverage': set(),
-                'popularity': []
-            }
-            
-            recs_buffer = []
             source_start = datetime.now()
+            user_recs = self._generate_recs(source_type, eval_users, k, weights, workers)
             
-            for i, uid in enumerate(eval_users, 1):
-                test_songs = set(recommender.test_interactions[
-                    recommender.test_interactions['user_id'] == uid
-                ]['song_id'].tolist())
-                if not test_songs:
-                    continue
-                
-                try:
-                    recs = recommender.hybrid_recommendation_parallel(
-                        uid, n=k, use_mmr=False,
-                        w_itemcf=weights[0], w_usercf=weights[1],
-                        w_content=weights[2], w_mf=weights[3],
-                        w_sentiment=weights[4], w_artist=weights[5],
-                        w_lightfm=weights[6]
-                    )
-                except Exception as e:
-                    print(f"    用户 {uid} 推荐失败: {e}")
-                    continue
-                if not recs:
-                    continue
-                rec_songs = [r[0] for r in recs]
-                
-                if save_recs and self.save_to_sql and self.engine:
-                    recs_buffer.append((uid, recs))
-                    if len(recs_buffer) >= 200:
-                        self._flush_recs_buffer(recs_buffer, source_type)
-                        recs_buffer = []
-                
-                hits = len(set(rec_songs) & test_songs)
-                k_actual = len(rec_songs)
-                metrics['precision'].append(hits / k_actual if k_actual>0 else 0)
-                metrics['recall'].append(hits / len(test_songs) if test_songs else 0)
-                metrics['hit'].append(1 if hits>0 else 0)
-                
-                dcg = sum(1 / np.log2(idx+2) for idx, song in enumerate(rec_songs) if song in test_songs)
-                idcg = sum(1 / np.log2(idx+2) for idx in range(min(len(test_songs), k)))
-                metrics['ndcg'].append(dcg / idcg if idcg>0 else 0)
-                
-                genres = []
-                for song in rec_songs:
-                    info = recommender.get_song_info(song)
-                    if info and info.get('genre'):
-                        genres.append(info['genre'])
-                if genres:
-                    metrics['diversity'].append(len(set(genres)) / len(genres))
-                
-                metrics['coverage'].update(rec_songs)
-                
-                pops = [recommender.song_popularity.get(song, 50) for song in rec_songs]
-                metrics['popularity'].append(np.mean(pops) if pops else 50)
-                
-                if i % 50 == 0 or i == total_eval:
-                    elapsed = (datetime.now() - source_start).total_seconds()
-                    rate = i / elapsed if elapsed > 0 else 0
-                    remaining = (total_eval - i) / rate if rate > 0 else 0
-                    print(f"    {source_type.upper()} 进度: {i}/{total_eval} "
-                        f"({i/total_eval*100:.1f}%) | 耗时: {elapsed:.1f}s | "
-                        f"速度: {rate:.2f}用户/秒 | 预计剩余: {remaining:.1f}s")
+            if save_recs and self.save_to_sql and self.engine:
+                for start in range(0, len(user_recs), 200):
+                    self._flush_recs_buffer(user_recs[start:start + 200], source_type)
             
-            if save_recs and recs_buffer:
-                self._flush_recs_buffer(recs_buffer, source_type)
-                recs_buffer = []
+            metrics = self._batch_metrics(recommender, user_recs, test_index, k)
             
             source_elapsed = (datetime.now() - source_start).total_seconds()
             results[source_type] = {
-                'Precision@K': np.mean(metrics['precision']) if metrics['precision'] else 0,
-                'Recall@K': np.mean(metrics['recall']) if metrics['recall'] else 0,
-                'NDCG@K': np.mean(metrics['ndcg']) if metrics['ndcg'] else 0,
-                'HitRate': np.mean(metrics['hit']) if metrics['hit'] else 0,
-                'Diversity': np.mean(metrics['diversity']) if metrics['diversity'] else 0,
+                'Precision@K': np.mean(metrics['precision']) if len(metrics['precision']) else 0,
+                'Recall@K': np.mean(metrics['recall']) if len(metrics['recall']) else 0,
+                'NDCG@K': np.mean(metrics['ndcg']) if len(metrics['ndcg']) else 0,
+                'HitRate': np.mean(metrics['hit']) if len(metrics['hit']) else 0,
+                'Diversity': np.mean(metrics['diversity']) if len(metrics['diversity']) else 0,
                 'Coverage': len(metrics['coverage']) / recommender.n_songs if recommender.n_songs else 0,
-                'AvgPopularity': np.mean(metrics['popularity']) if metrics['popularity'] else 0,
-                'n_users': len(eval_users),
+                'AvgPopularity': np.mean(metrics['popularity']) if len(metrics['popularity']) else 0,
+                'n_users': total_eval,
                 'eval_time_sec': source_elapsed
             }
             
@@ -1796,6 +2514,175 @@ class SeparatedRecommenderEvaluator:
         print(f"\n⏱️ 总评估耗时: {overall_elapsed:.1f}秒")
         return results
     
+    @staticmethod
+    def _build_test_index(recommender):
+        """测试集索引：用户 → (留出歌曲编码数组, 留出歌曲数)，整个测试集只分组一次"""
+        grouped = recommender.test_interactions.groupby('user_id', sort=False)['song_id'].unique()
+        index = {}
+        for uid, songs in grouped.items():
+            codes = recommender.song_vocab.encode_many(list(songs))
+            index[uid] = (np.unique(codes[codes >= 0]), len(songs))
+        return index
+    
+    @staticmethod
+    def _recommend_users(recommender, users, k, weights):
+        """顺序为一批用户生成推荐，返回 [(user_id, recs)]（失败或为空的用户跳过）"""
+        user_recs = []
+        for uid in users:
+            try:
+                recs = recommender.hybrid_recommendation_parallel(
+                    uid, n=k, use_mmr=False,
+                    w_itemcf=weights[0], w_usercf=weights[1],
+                    w_content=weights[2], w_mf=weights[3],
+                    w_sentiment=weights[4], w_artist=weights[5],
+                    w_lightfm=weights[6]
+                )
+            except Exception as e:
+                print(f"    用户 {uid} 推荐失败: {e}")
+                continue
+            if recs:
+                user_recs.append((uid, recs))
+        return user_recs
+    
+    def _generate_recs(self, source_type, eval_users, k, weights, workers=1):
+        """按用户分片生成推荐，结果保持 eval_users 的顺序"""
+        from datetime import datetime
+        
+        global _EVAL_SYSTEM
+        recommender = getattr(self.rec, f'{source_type}_recommender')
+        total_eval = len(eval_users)
+        batch = 50
+        shards = [eval_users[i:i + batch] for i in range(0, total_eval, batch)]
+        source_start = datetime.now()
+        
+        def report(done):
+            elapsed = (datetime.now() - source_start).total_seconds()
+            rate = done / elapsed if elapsed > 0 else 0
+            remaining = (total_eval - done) / rate if rate > 0 else 0
+            print(f"    {source_type.upper()} 进度: {done}/{total_eval} "
+                f"({done/total_eval*100:.1f}%) | 耗时: {elapsed:.1f}s | "
+                f"速度: {rate:.2f}用户/秒 | 预计剩余: {remaining:.1f}s")
+        
+        executor = None
+        if workers > 1 and len(shards) > 1:
+            try:
+                if 'fork' in multiprocessing.get_all_start_methods():
+                    # fork 出的子进程直接继承已加载的推荐器，无需序列化
+                    _EVAL_SYSTEM = self.rec
+                    executor = ProcessPoolExecutor(max_workers=workers,
+                                                   mp_context=multiprocessing.get_context('fork'))
+                else:
+                    executor = ThreadPoolExecutor(max_workers=workers)
+            except Exception as e:
+                print(f"    无法创建并行评估池，改为顺序评估: {e}")
+        
+        if executor is not None:
+            user_recs = []
+            done = 0
+            try:
+                with executor:
+                    if isinstance(executor, ProcessPoolExecutor):
+                        futures = [executor.submit(_recommend_shard, source_type, shard, k, weights)
+                                   for shard in shards]
+                    else:
+                        futures = [executor.submit(self._recommend_users, recommender, shard, k, weights)
+                                   for shard in shards]
+                    for shard, future in zip(shards, futures):
+                        user_recs.extend(future.result())
+                        done += len(shard)
+                        report(done)
+                return user_recs
+            except Exception as e:
+                print(f"    并行评估失败，改为顺序评估: {e}")
+            finally:
+                _EVAL_SYSTEM = None
+        
+        user_recs = []
+        done = 0
+        for shard in shards:
+            user_recs.extend(self._recommend_users(recommender, shard, k, weights))
+            done += len(shard)
+            report(done)
+        return user_recs
+    
+    @staticmethod
+    def _song_lookups(recommender):
+        """按歌曲编码排列的流派编码（-1 表示无流派信息）和流行度（缺省50），与逐首查询结果一致"""
+        n = len(recommender.song_vocab)
+        genre_code = np.full(n, -1, dtype=np.int64)
+        popularity = np.full(n, 50.0)
+        genre_index = {}
+        for code, song_id in enumerate(recommender.song_vocab.ids):
+            info = recommender.get_song_info(song_id)
+            if info and info.get('genre'):
+                genre_code[code] = genre_index.setdefault(info['genre'], len(genre_index))
+            popularity[code] = recommender.song_popularity.get(song_id, 50)
+        return genre_code, popularity
+    
+    def _batch_metrics(self, recommender, user_recs, test_index, k):
+        """对整批推荐矩阵向量化计算各指标，返回按用户排列的指标数组
+
+        推荐矩阵以 -1 填充不足 k 首的行；求和顺序与逐用户的 Python 累加一致
+        （DCG 用 cumsum 顺序累加，均值按推荐长度分组计算），结果逐位相同。
+        """
+        m = len(user_recs)
+        metrics = {'precision': np.empty(0), 'recall': np.empty(0), 'ndcg': np.empty(0),
+                   'hit': np.empty(0), 'diversity': np.empty(0), 'coverage': set(),
+                   'popularity': np.empty(0)}
+        if m == 0:
+            return metrics
+        width = max(k, max(len(recs) for _, recs in user_recs))
+        
+        rec_matrix = np.full((m, width), -1, dtype=np.int64)
+        lengths = np.empty(m, dtype=np.int64)
+        n_test = np.empty(m, dtype=np.int64)
+        test_rows, test_codes = [], []
+        for row, (uid, recs) in enumerate(user_recs):
+            rec_songs = [r[0] for r in recs]
+            metrics['coverage'].update(rec_songs)
+            rec_matrix[row, :len(rec_songs)] = recommender.song_vocab.encode_many(rec_songs)
+            lengths[row] = len(rec_songs)
+            codes, n_test[row] = test_index[uid]
+            test_codes.append(codes)
+            test_rows.append(np.full(len(codes), row, dtype=np.int64))
+        
+        # 命中矩阵：(行号, 歌曲编码) 组合键与测试集组合键求交
+        n_vocab = len(recommender.song_vocab)
+        valid = rec_matrix >= 0
+        rec_keys = np.arange(m)[:, None] * n_vocab + rec_matrix
+        test_keys = np.concatenate(test_rows) * n_vocab + np.concatenate(test_codes)
+        hit_matrix = valid & np.isin(rec_keys, test_keys)
+        hits = hit_matrix.sum(axis=1)
+        
+        metrics['precision'] = hits / lengths
+        metrics['recall'] = hits / n_test
+        metrics['hit'] = (hits > 0).astype(np.int64)
+        
+        discounts = np.array([1 / np.log2(idx+2) for idx in range(width)])
+        dcg = np.cumsum(np.where(hit_matrix, discounts, 0.0), axis=1)[:, -1]
+        ideal = np.concatenate([[0.0], np.cumsum(discounts[:k])])
+        idcg = ideal[np.minimum(n_test, k)]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics['ndcg'] = np.where(idcg > 0, dcg / idcg, 0.0)
+        
+        genre_lookup, pop_lookup = self._song_lookups(recommender)
+        safe_codes = np.where(valid, rec_matrix, 0)
+        genres = np.where(valid, genre_lookup[safe_codes], -1)
+        n_genres = (genres >= 0).sum(axis=1)
+        sorted_genres = np.sort(genres, axis=1)
+        n_unique = ((sorted_genres[:, 1:] != sorted_genres[:, :-1]) & (sorted_genres[:, 1:] >= 0)).sum(axis=1) \
+            + (sorted_genres[:, 0] >= 0)
+        has_genre = n_genres > 0
+        metrics['diversity'] = n_unique[has_genre] / n_genres[has_genre]
+        
+        pops = pop_lookup[safe_codes]
+        popularity = np.empty(m)
+        for length in np.unique(lengths):
+            rows = lengths == length
+            popularity[rows] = pops[rows, :length].mean(axis=1)
+        metrics['popularity'] = popularity
+        return metrics
+    
     def _flush_recs_buffer(self, buffer, source_type=None):
         """批量刷新推荐结果到数据库"""
         if not buffer or not self.engine:
@@ -1857,7 +2744,7 @@ class SeparatedRecommenderEvaluator:
 
 
 # ---------------------------- 主函数 ----------------------------
-def main_separated():
+def main_separated(workers=1):
     print("="*80)
     print("分离式音乐推荐系统（全算法保留 + LightFM）")
     print("="*80)
@@ -1871,12 +2758,12 @@ def main_separated():
     print("\n" + "="*80)
     print("开始权重调优（内部用户）...")
     print("="*80)
-    internal_best = recommender.tune_weights_for_source('internal', n_val_users=200, n=10)
+    internal_best = recommender.tune_weights_for_source('internal', n_val_users=200, n=10, workers=workers)
     
     print("\n" + "="*80)
     print("开始权重调优（外部用户）...")
     print("="*80)
-    external_best = recommender.tune_weights_for_source('external', n_val_users=200, n=10)
+    external_best = recommender.tune_weights_for_source('external', n_val_users=200, n=10, workers=workers)
     
     # 使用调优后的权重进行评估
     print("\n" + "="*80)
@@ -1889,7 +2776,7 @@ def main_separated():
     results = evaluator.evaluate(n_users=300, k=10, save_recs=True,
                                   internal_weights=internal_weights,
                                   external_weights=external_weights,
-                                  min_interactions=5)
+                                  min_interactions=5, workers=workers)
     
     # 测试单个用户
     print("\n" + "="*80)
@@ -1909,4 +2796,9 @@ def main_separated():
     return recommender
 
 if __name__ == "__main__":
-    recommender = main_separated()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="分离式音乐推荐系统：调权与离线评估")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="权重调优与离线评估的并行进程数（默认1，顺序执行）")
+    args = parser.parse_args()
+    recommender = main_separated(workers=args.workers)
\ No newline at end of file
@@ -0,0 +1,290 @@
+# file: synthetic_data_generator.py
+"""
+合成数据生成器：在没有SQL Server的环境下按任意规模生成推荐系统的输入数据
+
+- 歌曲流行度、用户活跃度均服从幂律（Zipf）分布，用户偏好集中在少数流派
+- 输出目录结构与 music_data_processor_separated.py 一致，可直接用 FileDataLoader 加载：
+    all_song_features、internal/ 与 external/ 下的
+    user_features、interaction_matrix、train_interactions、test_interactions
+- 规模由交互数控制（1万 ~ 1000万，指合并同一用户-歌曲后的行数），用户数、歌曲数默认按比例推导
+
+用法:
+    python synthetic_data_generator.py --interactions 1000000 --output-dir synthetic_1m --format parquet
+    python benchmark_recommender.py --data-dir synthetic_1m
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from importlib.util import find_spec
+
+import numpy as np
+import pandas as pd
+
+GENRES = ['华语流行', '流行', '摇滚', '民谣', '电子', '说唱', '古典', '爵士', 'R&B', '轻音乐', '国风', '欧美']
+AUDIO_COLUMNS = ['danceability', 'energy', 'valence', 'tempo', 'loudness',
+                 'speechiness', 'acousticness', 'instrumentalness', 'liveness']
+# 行为权重：播放 / 喜欢 / 收藏，与交互表 total_weight 的量级一致
+BEHAVIOR_WEIGHTS = np.array([1.0, 3.0, 5.0], dtype=np.float32)
+BEHAVIOR_PROBS = np.array([0.8, 0.15, 0.05])
+# 每批采样的交互数，控制千万级生成时的峰值内存
+SAMPLE_BATCH = 2_000_000
+PARQUET_AVAILABLE = find_spec('pyarrow') is not None or find_spec('fastparquet') is not None
+
+
+def zipf_weights(n, exponent):
+    """按排名 1..n 的幂律概率（打乱后作为各实体的抽样概率）"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+class SyntheticDataGenerator:
+    """按来源生成歌曲、用户与交互数据"""
+
+    def __init__(self, n_interactions=100_000, n_users=None, n_songs=None, internal_ratio=0.3,
+                 song_exponent=1.05, user_exponent=0.8, genre_affinity=0.6,
+                 test_size=0.2, seed=42):
+        self.n_interactions = int(n_interactions)
+        self.n_users = int(n_users or max(100, self.n_interactions // 40))
+        self.n_songs = int(n_songs or max(200, self.n_interactions // 25))
+        self.internal_ratio = internal_ratio
+        self.song_exponent = song_exponent
+        self.user_exponent = user_exponent
+        self.genre_affinity = genre_affinity
+        self.test_size = test_size
+        self.rng = np.random.default_rng(seed)
+
+    # ------------------------ 歌曲 ------------------------
+    def generate_songs(self, source, n):
+        rng = self.rng
+        prefix = 'S' if source == 'internal' else 'TR'
+        song_ids = [f"{prefix}{i:08d}" for i in range(n)]
+        # 流行度排名随机分配给歌曲；final_popularity 为期望播放量的对数缩放（0~100）
+        prob = zipf_weights(n, self.song_exponent)[rng.permutation(n)]
+        log_prob = np.log(prob)
+        popularity = (log_prob - log_prob.min()) / max(log_prob.max() - log_prob.min(), 1e-12) * 100
+        genre = rng.choice(len(GENRES), size=n, p=zipf_weights(len(GENRES), 0.7))
+        n_artists = max(10, n // 12)
+        artist = rng.choice(n_artists, size=n, p=zipf_weights(n_artists, 0.9))
+        song_age = rng.integers(0, 30, size=n)
+
+        songs = pd.DataFrame({
+            'song_id': song_ids,
+            'song_name': [f"{source}_song_{i}" for i in range(n)],
+            'artists': [f"{source}_artist_{a}" for a in artist],
+            'genre': np.array(GENRES)[genre],
+            'source': source,
+            'popularity': popularity.round(2),
+            'final_popularity': popularity.round(2),
+            'final_popularity_norm': (popularity / 100).round(4),
+            'avg_sentiment': rng.beta(5, 3, size=n).round(4) if source == 'internal' else np.nan,
+            'song_age': song_age,
+            'recency_score': np.exp(-song_age / 15).round(4),
+        })
+        songs['genre_clean'] = songs['genre']
+        for col in AUDIO_COLUMNS:
+            songs[col] = rng.random(n).round(4)
+        songs['tempo'] = (songs['tempo'] * 120 + 60).round(1)
+        songs['loudness'] = (songs['loudness'] * -30).round(2)
+        return songs, prob, genre
+
+    # ------------------------ 交互 ------------------------
+    def _sample_songs(self, user_genre, song_prob, song_genre):
+        """每条交互以 genre_affinity 的概率取自用户偏好流派，否则取自全部歌曲（均按流行度抽样）"""
+        rng = self.rng
+        n = len(user_genre)
+        songs = rng.choice(len(song_prob), size=n, p=song_prob)
+        affine = rng.random(n) < self.genre_affinity
+        for g in np.unique(user_genre[affine]):
+            pool = np.flatnonzero(song_genre == g)
+            if len(pool) == 0:
+                continue
+            rows = np.flatnonzero(affine & (user_genre == g))
+            p = song_prob[pool] / song_prob[pool].sum()
+            songs[rows] = pool[rng.choice(len(pool), size=len(rows), p=p)]
+        return songs
+
+    def generate_interactions(self, n, n_users, song_prob, song_genre):
+        """生成 n 条合并后的用户-歌曲交互
+
+        幂律抽样的重复很多，按批抽样并合并，直到不同 (用户, 歌曲) 数达到 n，再按首次出现顺序截取前 n 条；
+        下一批的抽样数按上一批的去重产出率估算。
+        """
+        rng = self.rng
+        user_prob = zipf_weights(n_users, self.user_exponent)[rng.permutation(n_users)]
+        favourite = rng.choice(len(GENRES), size=n_users, p=zipf_weights(len(GENRES), 0.7))
+        n = min(n, n_users * len(song_prob))
+
+        inter = pd.DataFrame({'user': np.empty(0, np.int32), 'song': np.empty(0, np.int32),
+                              'total_weight': np.empty(0, np.float32)})
+        unique_rate = 1.0
+        while len(inter) < n:
+            size = int(min(SAMPLE_BATCH, max(1000, (n - len(inter)) / unique_rate * 1.1)))
+            users = rng.choice(n_users, size=size, p=user_prob)
+            songs = self._sample_songs(favourite[users], song_prob, song_genre)
+            weights = BEHAVIOR_WEIGHTS[rng.choice(len(BEHAVIOR_WEIGHTS), size=size, p=BEHAVIOR_PROBS)]
+            batch = pd.DataFrame({'user': users.astype(np.int32), 'song': songs.astype(np.int32),
+                                  'total_weight': weights})
+            before = len(inter)
+            # 同一用户-歌曲的多次行为合并为一条（与 interaction_matrix 的聚合口径一致）
+            inter = (pd.concat([inter, batch], ignore_index=True)
+                     .groupby(['user', 'song'], as_index=False, sort=False)['total_weight'].sum())
+            added = len(inter) - before
+            if added == 0:
+                print(f"    交互空间已饱和，只生成了 {len(inter):,} 条（目标 {n:,}）")
+                break
+            unique_rate = added / size
+        return inter.iloc[:n].reset_index(drop=True), favourite
+
+    def split_train_test(self, inter):
+        """与 music_data_processor_separated.split_train_test 相同的规则（向量化）：
+        交互≥5的用户留出20%（至少1条），2~4条的留出1条，1条的全部进训练集"""
+        order = self.rng.permutation(len(inter))
+        shuffled = inter.iloc[order]
+        rank = shuffled.groupby('user').cumcount().values
+        count = shuffled.groupby('user')['user'].transform('size').values
+        n_test = np.where(count >= 5, np.maximum(1, (count * self.test_size).astype(int)),
+                          np.where(count >= 2, 1, 0))
+        is_test = rank < n_test
+        return shuffled[~is_test].sort_index(), shuffled[is_test].sort_index()
+
+    # ------------------------ 用户 ------------------------
+    def build_user_features(self, source, user_ids, inter, favourite, songs):
+        stats = inter.groupby('user').agg(
+            unique_songs=('song', 'size'),
+            total_weight_sum=('total_weight', 'sum'),
+            avg_weight=('total_weight', 'mean'),
+            weight_std=('total_weight', 'std'),
+        )
+        song_pop = songs['final_popularity'].values
+        stats['avg_popularity_pref'] = (pd.Series(song_pop[inter['song'].values], index=inter.index)
+                                        .groupby(inter['user']).mean())
+        stats = stats.reindex(np.arange(len(user_ids)))
+        n = len(user_ids)
+        genres = np.array(GENRES)
+        users = pd.DataFrame({
+            'user_id': user_ids,
+            'source': source,
+            'unique_songs': stats['unique_songs'].fillna(0).astype(int).values,
+            'total_interactions': stats['unique_songs'].fillna(0).astype(int).values,
+            'total_weight_sum': stats['total_weight_sum'].fillna(0).round(2).values,
+            'avg_weight': stats['avg_weight'].fillna(0).round(4).values,
+            'weight_std': stats['weight_std'].fillna(0).round(4).values,
+            'avg_popularity_pref': stats['avg_popularity_pref'].fillna(50).round(2).values,
+            'popularity_bias': ((stats['avg_popularity_pref'].fillna(50) - 50) / 50).round(4).values,
+            'diversity_ratio': self.rng.beta(2, 3, size=n).round(4),
+            'age': self.rng.integers(16, 60, size=n),
+            'gender': self.rng.choice(['男', '女', '未知'], size=n),
+            'province': '未知',
+            'city': '未知',
+            'activity_level': pd.cut(stats['unique_songs'].fillna(0).values, [-1, 5, 30, np.inf],
+                                     labels=['低活跃', '中活跃', '高活跃']).astype(str),
+            'top_genre_1': genres[favourite],
+            'top_genre_2': genres[(favourite + 1) % len(genres)],
+            'top_genre_3': genres[(favourite + 2) % len(genres)],
+        })
+        return users
+
+    # ------------------------ 生成与保存 ------------------------
+    def source_interactions(self, source):
+        """该来源要生成的交互数"""
+        ratio = self.internal_ratio if source == 'internal' else 1 - self.internal_ratio
+        return max(1, int(self.n_interactions * ratio))
+
+    def generate(self):
+        data = {}
+        all_songs = []
+        for source in ('internal', 'external'):
+            ratio = self.internal_ratio if source == 'internal' else 1 - self.internal_ratio
+            n_inter = self.source_interactions(source)
+            n_users = max(10, int(self.n_users * ratio))
+            n_songs = max(20, int(self.n_songs * ratio))
+
+            start = time.time()
+            songs, song_prob, song_genre = self.generate_songs(source, n_songs)
+            inter, favourite = self.generate_interactions(n_inter, n_users, song_prob, song_genre)
+            # 内部用户ID形如 U000001（≤7位，与来源推断规则一致），外部用户使用长ID
+            if source == 'internal':
+                user_ids = np.array([f"U{i:06d}" for i in range(n_users)])
+            else:
+                user_ids = np.array([f"ext_{i:010d}" for i in range(n_users)])
+            users = self.build_user_features(source, user_ids, inter, favourite, songs)
+            train, test = self.split_train_test(inter)
+
+            def to_ids(df):
+                return pd.DataFrame({'user_id': user_ids[df['user'].values],
+                                     'song_id': songs['song_id'].values[df['song'].values],
+                                     'total_weight': df['total_weight'].values})
+
+            data[source] = {
+                'user_features': users,
+                'interaction_matrix': to_ids(inter),
+                'train_interactions': to_ids(train),
+                'test_interactions': to_ids(test),
+            }
+            all_songs.append(songs)
+            print(f"  {source}: 歌曲 {n_songs:,} | 用户 {n_users:,} | 交互 {len(inter):,} "
+                  f"(训练 {len(train):,} / 测试 {len(test):,}) | 耗时 {time.time() - start:.1f}s")
+        data['all_songs'] = pd.concat(all_songs, ignore_index=True)
+        return data
+
+    @staticmethod
+    def save(data, output_dir, fmt='csv'):
+        """按 FileDataLoader 读取的目录结构写出（csv 或 parquet，缺少 Parquet 引擎时回退为 csv）"""
+        if fmt == 'parquet' and not PARQUET_AVAILABLE:
+            print("  未安装 pyarrow/fastparquet，改为输出CSV")
+            fmt = 'csv'
+        def write(df, stem):
+            if fmt == 'parquet':
+                df.to_parquet(stem + '.parquet', index=False)
+            else:
+                df.to_csv(stem + '.csv', index=False, encoding='utf-8')
+
+        os.makedirs(output_dir, exist_ok=True)
+        write(data['all_songs'], os.path.join(output_dir, 'all_song_features'))
+        stats = {'total_songs': len(data['all_songs'])}
+        for source in ('internal', 'external'):
+            source_dir = os.path.join(output_dir, source)
+            os.makedirs(source_dir, exist_ok=True)
+            for name, df in data[source].items():
+                write(df, os.path.join(source_dir, name))
+            stats[f'{source}_users'] = len(data[source]['user_features'])
+            stats[f'{source}_interactions'] = len(data[source]['interaction_matrix'])
+        stats['created_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        stats['synthetic'] = True
+        with open(os.path.join(output_dir, 'data_stats.json'), 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成幂律分布的合成推荐数据")
+    parser.add_argument('--interactions', type=int, default=100_000, help="交互数（合并同一用户-歌曲后的行数）")
+    parser.add_argument('--users', type=int, default=None, help="用户数（默认 交互数/40）")
+    parser.add_argument('--songs', type=int, default=None, help="歌曲数（默认 交互数/25）")
+    parser.add_argument('--internal-ratio', type=float, default=0.3, help="内部来源所占比例")
+    parser.add_argument('--song-exponent', type=float, default=1.05, help="歌曲流行度Zipf指数")
+    parser.add_argument('--user-exponent', type=float, default=0.8, help="用户活跃度Zipf指数")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--output-dir', default=None, help="输出目录（默认 synthetic_data_<交互数>）")
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or f"synthetic_data_{args.interactions}"
+    print("=" * 80)
+    print(f"生成合成数据: 交互 {args.interactions:,} -> {output_dir} ({args.format})")
+    print("=" * 80)
+    start = time.time()
+    generator = SyntheticDataGenerator(args.interactions, n_users=args.users, n_songs=args.songs,
+                                       internal_ratio=args.internal_ratio,
+                                       song_exponent=args.song_exponent,
+                                       user_exponent=args.user_exponent, seed=args.seed)
+    data = generator.generate()
+    stats = SyntheticDataGenerator.save(data, output_dir, args.format)
+    print(f"✓ 已保存到 {output_dir}，总耗时 {time.time() - start:.1f}s")
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()